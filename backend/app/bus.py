@@ -0,0 +1,333 @@
+"""Cross-process pub/sub for broadcasts: one producer, any number of /ws worker processes.
+
+With ``SKETCH2FORM_ROLE=producer`` every message handed to the broadcaster is
+also published here; ``subscriber`` processes receive it and fan it out to
+their own WebSocket clients. The backend is picked from the URL scheme:
+
+- ``unix:///tmp/sketch2form.sock`` / ``tcp://127.0.0.1:8765``: the producer
+  listens and subscribers connect. Every subscriber connection gets its own
+  bounded queue and sender task (the same ClientChannel machinery as browser
+  clients), so a stalled worker only loses its own oldest frames.
+- ``redis://host:6379/0``: Redis pub/sub on ``BUS_CHANNEL`` (needs ``redis``).
+
+A frame carries the message kind, the JSON text every client can read and,
+when there is one, the binary encoding for binary clients (see
+app/utils/wire.py), so workers never re-serialise anything, plus the
+event's sequence number and device so each worker keeps the same recent
+history (app/utils/history.py) as the producer. Subscribers reconnect on
+their own when the producer restarts; a socket subscriber is first sent the
+producer's retained history, and events it already has are skipped.
+"""
+import asyncio
+import os
+import struct
+from urllib.parse import urlsplit
+
+from app import config
+from app.utils.broadcast import Broadcaster
+
+ROLES = ("all", "producer", "subscriber")
+
+_LENGTH = struct.Struct("<I")
+_HEADER = struct.Struct("<BBBIQ")  # flags, kind length, device length, message length, seq (0 = none)
+_MESSAGE_IS_BYTES = 1
+
+
+def encode_frame(kind, message, binary=None, seq=None, device=None):
+    """One bus frame for a broadcast (``message`` is str or bytes)."""
+    kind_bytes = (kind or "").encode()
+    device_bytes = b"" if device is None else str(device).encode()
+    flags = _MESSAGE_IS_BYTES if isinstance(message, bytes) else 0
+    body = message if isinstance(message, bytes) else message.encode()
+    header = _HEADER.pack(flags, len(kind_bytes), len(device_bytes), len(body), seq or 0)
+    return header + kind_bytes + device_bytes + body + (binary or b"")
+
+
+def decode_frame(frame):
+    """(kind, message, binary, seq, device) from encode_frame output, None where absent."""
+    flags, kind_len, device_len, body_len, seq = _HEADER.unpack_from(frame)
+    pos = _HEADER.size
+    kind = bytes(frame[pos:pos + kind_len]).decode() or None
+    pos += kind_len
+    device = bytes(frame[pos:pos + device_len]).decode() or None
+    pos += device_len
+    body = bytes(frame[pos:pos + body_len])
+    binary = bytes(frame[pos + body_len:]) or None
+    message = body if flags & _MESSAGE_IS_BYTES else body.decode()
+    return kind, message, binary, seq or None, device
+
+
+def _deliver(subscriber, on_message, frame):
+    """Hand one frame to ``on_message``; a frame that fails is logged and counted, never fatal."""
+    subscriber.received += 1
+    try:
+        on_message(*decode_frame(frame))
+    except Exception as e:
+        subscriber.errors += 1
+        print(f"[Bus] ⚠️ Dropped a frame from {subscriber.url}: {type(e).__name__}: {e}")
+
+
+class _StreamSink:
+    """Lets a subscriber connection sit in a Broadcaster like a WebSocket."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    async def send_bytes(self, frame):
+        self.writer.write(_LENGTH.pack(len(frame)) + frame)
+        await self.writer.drain()
+
+    async def send_text(self, text):
+        await self.send_bytes(text.encode())
+
+    async def close(self):
+        self.writer.close()
+
+
+class SocketPublisher:
+    """Producer side of the unix:// and tcp:// bus: listens for subscriber connections."""
+
+    def __init__(self, url, queue_size=config.BUS_QUEUE_SIZE):
+        self.url = url
+        self.hub = Broadcaster(queue_size=queue_size, policy="drop_oldest")
+        self.backlog = None  # () -> [(kind, message, binary, seq, device)] sent to each new subscriber
+        self._server = None
+        self._handlers = set()  # one task per connected subscriber
+
+    async def start(self):
+        parts = urlsplit(self.url)
+        if parts.scheme == "unix":
+            if os.path.exists(parts.path):
+                os.unlink(parts.path)  # left behind by a producer that did not shut down
+            self._server = await asyncio.start_unix_server(self._on_connect, parts.path)
+        else:
+            self._server = await asyncio.start_server(self._on_connect, parts.hostname, parts.port)
+        print(f"[Bus] 📡 Publishing on {self.url}")
+
+    async def _on_connect(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        sink = _StreamSink(writer)
+        channel = self.hub.register(sink)
+        for event in self.backlog() if self.backlog else ():
+            channel.offer(encode_frame(*event))
+        print(f"[Bus] ✅ Subscriber connected. Total subscribers: {len(self.hub)}")
+        try:
+            await reader.read()  # subscribers never send; EOF means they are gone
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            await self.hub.unregister(sink)
+            writer.close()
+            self._handlers.discard(asyncio.current_task())
+            print(f"[Bus] ❌ Subscriber disconnected. Total subscribers: {len(self.hub)}")
+
+    def publish(self, kind, message, binary=None, seq=None, device=None):
+        """Queue one broadcast for every subscriber; never blocks."""
+        self.hub.publish(encode_frame(kind, message, binary, seq, device), kind)
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for sink in list(self.hub.channels):
+            await self.hub.unregister(sink)
+            await sink.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)  # they see EOF and finish
+        await self._server.wait_closed()
+        self._server = None
+        parts = urlsplit(self.url)
+        if parts.scheme == "unix" and os.path.exists(parts.path):
+            os.unlink(parts.path)
+
+    def stats(self):
+        hub = self.hub.stats()
+        return {"url": self.url, "role": "publisher", "subscribers": hub["clients"],
+                "published": hub["published"], "dropped": hub["dropped_total"], "evicted": hub["evicted"]}
+
+
+class SocketSubscriber:
+    """Worker side of the unix:// and tcp:// bus; reconnects until stopped."""
+
+    def __init__(self, url, reconnect_interval=config.BUS_RECONNECT_INTERVAL):
+        self.url = url
+        self.reconnect_interval = reconnect_interval
+        self.connected = False
+        self.received = 0
+        self.errors = 0  # frames that could not be decoded or delivered
+        self.connects = 0
+        self._task = None
+
+    async def start(self, on_message):
+        """Call ``on_message(kind, message, binary, seq, device)`` for every frame, on the event loop."""
+        self._task = asyncio.create_task(self._run(on_message))
+
+    async def _open(self):
+        parts = urlsplit(self.url)
+        if parts.scheme == "unix":
+            return await asyncio.open_unix_connection(parts.path)
+        return await asyncio.open_connection(parts.hostname, parts.port)
+
+    async def _run(self, on_message):
+        warned = False
+        while True:
+            try:
+                reader, writer = await self._open()
+            except OSError as e:
+                if not warned:
+                    print(f"[Bus] ⚠️ Cannot reach producer at {self.url}: {e}; retrying")
+                    warned = True
+                await asyncio.sleep(self.reconnect_interval)
+                continue
+            self.connected, warned = True, False
+            self.connects += 1
+            print(f"[Bus] ✅ Subscribed to {self.url}")
+            try:
+                while True:
+                    (size,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                    _deliver(self, on_message, await reader.readexactly(size))
+            except (asyncio.IncompleteReadError, ConnectionError, OSError):
+                print(f"[Bus] 🔌 Lost the producer at {self.url}; reconnecting")
+            except Exception as e:
+                print(f"[Bus] 🔌 Subscription to {self.url} failed: {e}; reconnecting")
+            finally:
+                self.connected = False
+                writer.close()
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {"url": self.url, "role": "subscriber", "connected": self.connected,
+                "received": self.received, "errors": self.errors, "connects": self.connects}
+
+
+def _redis():
+    try:
+        import redis.asyncio
+    except ImportError:
+        raise RuntimeError("A redis:// bus needs the redis package (pip install redis)") from None
+    return redis.asyncio
+
+
+class RedisPublisher:
+    """Producer side of the redis:// bus."""
+
+    def __init__(self, url, channel=config.BUS_CHANNEL, queue_size=config.BUS_QUEUE_SIZE):
+        self.url = url
+        self.channel = channel
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self.subscribers = 0  # as reported by the last PUBLISH
+        self._client = None
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._client = _redis().from_url(self.url)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        print(f"[Bus] 📡 Publishing on {self.url} ({self.channel})")
+
+    async def _run(self):
+        while True:
+            frame = await self._queue.get()
+            try:
+                self.subscribers = await self._client.publish(self.channel, frame)
+            except Exception as e:  # redis down: drop the frame, keep the producer running
+                self.dropped += 1
+                print(f"[Bus] ⚠️ Redis publish failed: {e}")
+
+    def publish(self, kind, message, binary=None, seq=None, device=None):
+        if self._queue is None:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(encode_frame(kind, message, binary, seq, device))
+        self.published += 1
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {"url": self.url, "role": "publisher", "channel": self.channel, "subscribers": self.subscribers,
+                "published": self.published, "dropped": self.dropped}
+
+
+class RedisSubscriber:
+    """Worker side of the redis:// bus."""
+
+    def __init__(self, url, channel=config.BUS_CHANNEL, reconnect_interval=config.BUS_RECONNECT_INTERVAL):
+        self.url = url
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.connected = False
+        self.received = 0
+        self.errors = 0
+        self.connects = 0
+        self._task = None
+
+    async def start(self, on_message):
+        self._task = asyncio.create_task(self._run(on_message))
+
+    async def _run(self, on_message):
+        redis = _redis()
+        while True:
+            client = redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self.connected = True
+                    self.connects += 1
+                    print(f"[Bus] ✅ Subscribed to {self.url} ({self.channel})")
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            _deliver(self, on_message, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Bus] 🔌 Redis subscription lost: {e}; reconnecting")
+            finally:
+                self.connected = False
+                await client.aclose()
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {"url": self.url, "role": "subscriber", "channel": self.channel, "connected": self.connected,
+                "received": self.received, "errors": self.errors, "connects": self.connects}
+
+
+BACKENDS = {
+    "unix": (SocketPublisher, SocketSubscriber),
+    "tcp": (SocketPublisher, SocketSubscriber),
+    "redis": (RedisPublisher, RedisSubscriber),
+}
+
+
+def _backend(url):
+    scheme = urlsplit(url).scheme
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unsupported bus URL {url!r}, expected one of {sorted(BACKENDS)}://")
+    return BACKENDS[scheme]
+
+
+def create_publisher(url=config.BUS_URL):
+    return _backend(url)[0](url)
+
+
+def create_subscriber(url=config.BUS_URL):
+    return _backend(url)[1](url)
@@ -0,0 +1,120 @@
+"""Runtime settings for the backend, overridable with SKETCH2FORM_* env vars."""
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+# === INFERENCE ===
+# "auto" prefers the small tflite_runtime package and falls back to full TensorFlow;
+# "tflite_runtime" or "tensorflow" forces one.
+TFLITE_RUNTIME = os.environ.get("SKETCH2FORM_TFLITE_RUNTIME", "auto")
+# Where the model registry looks for .tflite files (and their .json label sidecars).
+MODEL_DIR = os.environ.get("SKETCH2FORM_MODEL_DIR", os.path.join("app", "ml"))
+# Load and prime the model in a background task at startup (otherwise on the first shape).
+MODEL_WARMUP = os.environ.get("SKETCH2FORM_MODEL_WARMUP", "1") == "1"
+# After the default model failed to load, incoming shapes retry at most this often
+# (seconds, doubling per failure up to 10x); POST /admin/models/load retries at once.
+MODEL_RETRY_INTERVAL = float(os.environ.get("SKETCH2FORM_MODEL_RETRY_INTERVAL", 30.0))
+# Each worker thread owns its own TFLite interpreter.
+INFERENCE_WORKERS = _env_int("SKETCH2FORM_INFERENCE_WORKERS", min(4, os.cpu_count() or 1))
+# Shapes allowed to wait for a free worker before callers start awaiting.
+INFERENCE_QUEUE_SIZE = _env_int("SKETCH2FORM_INFERENCE_QUEUE_SIZE", 32)
+
+# Results of recently classified inputs, keyed by a hash of the resampled tensor (0 disables).
+INFERENCE_CACHE_SIZE = _env_int("SKETCH2FORM_INFERENCE_CACHE_SIZE", 1024)
+INFERENCE_CACHE_TTL = float(os.environ.get("SKETCH2FORM_INFERENCE_CACHE_TTL", 3600))
+
+# Geometric fast path (app/ml/geometry.py): clear-cut shapes are answered without
+# invoking the model when its confidence reaches the threshold. Only FASTPATH_LABELS
+# are answered: on the production captures the model often labels near-perfect circles
+# and squares "rectangle", so only triangles agree with it reliably. Opt-in: answering
+# triangles alone saves little, and misses pay for the features. Check the held-out
+# captures of python -m benchmarks.eval_fastpath before changing any of these.
+FASTPATH = os.environ.get("SKETCH2FORM_FASTPATH", "0") == "1"
+FASTPATH_THRESHOLD = float(os.environ.get("SKETCH2FORM_FASTPATH_THRESHOLD", 0.9))
+FASTPATH_LABELS = tuple(filter(None, os.environ.get("SKETCH2FORM_FASTPATH_LABELS", "triangle").split(",")))
+
+# === MICRO-BATCHING ===
+# When enabled, concurrent shapes are gathered and classified with one invoke().
+INFERENCE_BATCHING = os.environ.get("SKETCH2FORM_INFERENCE_BATCHING", "0") == "1"
+BATCH_WINDOW_MS = float(os.environ.get("SKETCH2FORM_BATCH_WINDOW_MS", 5))
+BATCH_MAX_SIZE = _env_int("SKETCH2FORM_BATCH_MAX_SIZE", 16)
+
+# === LIVE CLASSIFICATION ===
+# Provisional "shape_partial" predictions while a stroke is still being drawn.
+LIVE_CLASSIFICATION = os.environ.get("SKETCH2FORM_LIVE", "1") == "1"
+# A provisional prediction runs every N new points or every N ms, whichever comes first.
+LIVE_EVERY_POINTS = _env_int("SKETCH2FORM_LIVE_EVERY_POINTS", 16)
+LIVE_EVERY_MS = float(os.environ.get("SKETCH2FORM_LIVE_EVERY_MS", 250))
+LIVE_MIN_POINTS = _env_int("SKETCH2FORM_LIVE_MIN_POINTS", 8)
+
+# === SERIAL ===
+# Print every received point; only useful when debugging the Arduino sketch.
+SERIAL_VERBOSE = os.environ.get("SKETCH2FORM_SERIAL_VERBOSE", "0") == "1"
+# "chunk": bulk read(in_waiting) into a reassembly buffer; "line": one readline() per line.
+SERIAL_READER_MODE = os.environ.get("SKETCH2FORM_SERIAL_READER", "chunk")
+# Comma-separated ports, optionally named ("left=COM3,right=COM4"), or "auto" to
+# pick up every attached Arduino via serial.tools.list_ports.
+SERIAL_PORTS = os.environ.get("SKETCH2FORM_SERIAL_PORTS", "COM3")
+SERIAL_BAUDRATE = _env_int("SKETCH2FORM_SERIAL_BAUDRATE", 9600)
+
+# === INGEST ===
+# Point reduction applied to every finished stroke before it is classified, stored
+# and broadcast: "off", "dedupe" (drop consecutive repeats of the same sample) or
+# "rdp" (dedupe, then Ramer-Douglas-Peucker within SIMPLIFY_EPSILON pixels).
+# Off by default: both modes change which points the model's index-based resampling
+# picks, and it was trained on unsimplified strokes. Enable one only after
+# python -m benchmarks.eval_simplify shows no label changes for it.
+SIMPLIFY = os.environ.get("SKETCH2FORM_SIMPLIFY", "off")
+SIMPLIFY_EPSILON = float(os.environ.get("SKETCH2FORM_SIMPLIFY_EPSILON", 1.0))
+
+# === PERSISTENCE ===
+SHAPES_DIR = os.environ.get("SKETCH2FORM_SHAPES_DIR", "shapes")
+SEGMENT_DIR = os.environ.get("SKETCH2FORM_SEGMENT_DIR", os.path.join(SHAPES_DIR, "segments"))
+SEGMENT_MAX_BYTES = _env_int("SKETCH2FORM_SEGMENT_MAX_BYTES", 16 * 1024 * 1024)
+PERSIST_FLUSH_RECORDS = _env_int("SKETCH2FORM_PERSIST_FLUSH_RECORDS", 64)
+PERSIST_FLUSH_INTERVAL = float(os.environ.get("SKETCH2FORM_PERSIST_FLUSH_INTERVAL", 1.0))
+PERSIST_QUEUE_SIZE = _env_int("SKETCH2FORM_PERSIST_QUEUE_SIZE", 10000)
+PERSIST_RETRIES = _env_int("SKETCH2FORM_PERSIST_RETRIES", 3)  # per batch, on I/O errors, with backoff
+# SQLite (WAL) index of every persisted shape, served by GET /shapes.
+STORE_ENABLED = os.environ.get("SKETCH2FORM_STORE", "1") == "1"
+STORE_PATH = os.environ.get("SKETCH2FORM_STORE_PATH", os.path.join(SHAPES_DIR, "shapes.db"))
+
+# === BROADCAST ===
+BROADCAST_QUEUE_SIZE = _env_int("SKETCH2FORM_BROADCAST_QUEUE_SIZE", 64)
+# What to do when a client's queue is full: drop_oldest, drop_newest, coalesce or disconnect.
+BROADCAST_POLICY = os.environ.get("SKETCH2FORM_BROADCAST_POLICY", "drop_oldest")
+BROADCAST_SEND_TIMEOUT = float(os.environ.get("SKETCH2FORM_BROADCAST_SEND_TIMEOUT", 10.0))
+# Recent shape_result/clear events kept in memory for clients that (re)connect to /ws;
+# 0 disables. Without a ?since= cursor a client gets at most HISTORY_SNAPSHOT of them.
+HISTORY_SIZE = _env_int("SKETCH2FORM_HISTORY_SIZE", 256)
+HISTORY_SNAPSHOT = _env_int("SKETCH2FORM_HISTORY_SNAPSHOT", 20)
+
+# === DEPLOYMENT ===
+# "all": one process reads the tablets, classifies, persists and serves /ws (default).
+# "producer": the only process that touches the serial ports, the model and the
+#   segment writer; every broadcast is also published on the bus.
+# "subscriber": serves /ws (and the read-only /shapes API) from what arrives on the
+#   bus; run any number of them, e.g. `uvicorn app.main:app --workers 4`.
+ROLE = os.environ.get("SKETCH2FORM_ROLE", "all")
+# unix:///path/to.sock, tcp://host:port or redis://host:port/db (needs the redis package).
+BUS_URL = os.environ.get("SKETCH2FORM_BUS_URL",
+                         "tcp://127.0.0.1:8765" if os.name == "nt" else "unix:///tmp/sketch2form.sock")
+BUS_CHANNEL = os.environ.get("SKETCH2FORM_BUS_CHANNEL", "sketch2form")  # redis pub/sub channel
+# Frames queued per subscriber before the oldest are dropped.
+BUS_QUEUE_SIZE = _env_int("SKETCH2FORM_BUS_QUEUE_SIZE", 1024)
+BUS_RECONNECT_INTERVAL = float(os.environ.get("SKETCH2FORM_BUS_RECONNECT_INTERVAL", 1.0))
+
+# === WEBSOCKET ===
+# permessage-deflate for /ws when started with `python -m app.main` (uvicorn's
+# --ws-per-message-deflate flag does the same when run through the uvicorn CLI).
+WS_DEFLATE = os.environ.get("SKETCH2FORM_WS_DEFLATE", "1") == "1"
+HOST = os.environ.get("SKETCH2FORM_HOST", "0.0.0.0")
+PORT = _env_int("SKETCH2FORM_PORT", 8000)
+
+# === DEBUG ===
+# Enables GET /debug/profile (cProfile / tracemalloc captures). Keep off in production.
+DEBUG_PROFILE = os.environ.get("SKETCH2FORM_DEBUG_PROFILE", "0") == "1"
+DEBUG_PROFILE_MAX_SECONDS = float(os.environ.get("SKETCH2FORM_DEBUG_PROFILE_MAX_SECONDS", 60))
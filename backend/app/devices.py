@@ -0,0 +1,201 @@
+"""Many tablets, one backend: multiplexes every serial device onto one reader thread.
+
+Each device gets a SerialListener used purely as its protocol state machine
+(it is never started); a single thread waits on all ports at once with
+``selectors`` and feeds whatever arrived through LineReader -> handle_line.
+Transports without a selectable file descriptor (Windows COM ports, replay
+files) are polled at ``poll_interval`` instead.
+"""
+import selectors
+import threading
+import time
+
+import serial
+from serial.tools import list_ports
+
+from app import config
+from app.metrics import observe_stage
+from app.serial_listener import SerialListener
+from app.transport import LineReader, open_transport
+
+# USB vendor ids of Arduino boards and the common CH340 / FTDI clones
+ARDUINO_VIDS = {0x2341, 0x2A03, 0x1A86, 0x0403}
+
+
+def discover_ports(vids=ARDUINO_VIDS):
+    """Serial ports that look like tablets (USB devices with a known vendor id)."""
+    return [p.device for p in list_ports.comports() if p.vid is not None and (not vids or p.vid in vids)]
+
+
+def parse_port_spec(spec):
+    """Turn "auto" or "id=port,port2" into a list of (device_id, port)."""
+    if spec.strip().lower() == "auto":
+        return [(port, port) for port in discover_ports()]
+    devices = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        device_id, _, port = item.rpartition("=")
+        devices.append((device_id or port, port))
+    return devices
+
+
+class Device:
+    """One tablet: its transport, reassembly buffer, protocol session and counters."""
+
+    def __init__(self, device_id, port, session):
+        self.device_id = device_id
+        self.port = port
+        self.session = session
+        self.transport = None
+        self.reader = None
+        self.connected_at = None
+        self.last_error = None
+        self.last_attempt = 0.0
+        self.errors = 0  # reads or lines that failed and dropped the connection
+
+    def stats(self, now):
+        counters = dict(self.session.counters)
+        counters["bytes"] = self.reader.bytes_read if self.reader else 0
+        counters["errors"] = self.errors
+        uptime = now - self.connected_at if self.connected_at else 0.0
+        rate = (lambda n: n / uptime) if uptime > 0 else (lambda n: 0.0)
+        return {
+            "device": self.device_id,
+            "port": self.port,
+            "connected": self.transport is not None,
+            "uptime_s": round(uptime, 1),
+            "last_error": self.last_error,
+            **counters,
+            "points_per_s": round(rate(counters["points"]), 2),
+            "shapes_per_s": round(rate(counters["shapes"]), 4),
+            "bytes_per_s": round(rate(counters["bytes"]), 1),
+        }
+
+
+class DeviceManager:
+    def __init__(self, ports=None, baudrate=config.SERIAL_BAUDRATE, loop=None,
+                 poll_interval=0.005, reconnect_interval=5.0, transports=None):
+        """``ports``: list of (device_id, port) or port names; ``transports``
+        optionally maps device_id -> an already-open transport (replay, pty...)."""
+        self.baudrate = baudrate
+        self.loop = loop
+        self.poll_interval = poll_interval
+        self.reconnect_interval = reconnect_interval
+        self._transports = transports or {}
+        self.devices = {}
+        for entry in ports or []:
+            device_id, port = entry if isinstance(entry, tuple) else (entry, entry)
+            self.add(device_id, port)
+        for device_id in self._transports:
+            if device_id not in self.devices:
+                self.add(device_id, device_id)
+        self.running = False
+        self.thread = None
+
+    def add(self, device_id, port):
+        session = SerialListener(port=port, baudrate=self.baudrate, loop=self.loop, device_id=device_id)
+        self.devices[device_id] = Device(device_id, port, session)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="serial-devices", daemon=True)
+        self.thread.start()
+        print(f"[Devices] 🚀 Reading {len(self.devices)} device(s): {', '.join(self.devices) or 'none'}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        for dev in self.devices.values():
+            self._close(dev)
+
+    def stats(self):
+        now = time.monotonic()
+        return [dev.stats(now) for dev in self.devices.values()]
+
+    # --- reader thread ---
+    def _connect(self, dev, selector):
+        dev.last_attempt = time.monotonic()
+        try:
+            transport = self._transports.get(dev.device_id) or open_transport(dev.port, self.baudrate, timeout=0)
+        except (serial.SerialException, OSError) as e:
+            dev.last_error = str(e)
+            print(f"[Devices] ⚠️ {dev.device_id}: cannot open {dev.port}: {e}")
+            return
+        dev.transport = transport
+        dev.reader = LineReader(transport)
+        dev.connected_at = time.monotonic()
+        dev.last_error = None
+        try:
+            selector.register(transport.fileno(), selectors.EVENT_READ, dev)
+        except (AttributeError, ValueError, OSError, PermissionError):
+            pass  # not selectable: polled in _run
+        print(f"[Devices] ✅ {dev.device_id} connected on {dev.port}")
+
+    def _close(self, dev, selector=None):
+        if dev.transport is None:
+            return
+        if selector is not None:
+            try:
+                selector.unregister(dev.transport.fileno())
+            except (AttributeError, KeyError, ValueError, OSError):
+                pass
+        try:
+            dev.transport.close()
+        except Exception:
+            pass
+        dev.transport = None
+        self._transports.pop(dev.device_id, None)
+
+    def _drain(self, dev, selector):
+        try:
+            started = time.perf_counter()
+            lines = dev.reader.read_lines()
+            read = time.perf_counter()
+            for line in lines:
+                dev.session.handle_line(line)
+            if lines:
+                observe_stage("serial_read", read - started)
+                observe_stage("serial_handle", time.perf_counter() - read)
+        except (serial.SerialException, OSError) as e:
+            self._fail(dev, selector, e)
+        except Exception as e:
+            # a bad line must only cost this tablet its connection, never the shared thread
+            self._fail(dev, selector, e, f"failed on input ({type(e).__name__})")
+
+    def _poll(self, dev, selector):
+        try:
+            waiting = dev.transport.in_waiting
+        except Exception as e:  # e.g. a COM port unplugged on Windows
+            self._fail(dev, selector, e)
+            return
+        if waiting:
+            self._drain(dev, selector)
+
+    def _fail(self, dev, selector, error, what="disconnected"):
+        dev.errors += 1
+        dev.last_error = str(error)
+        print(f"[Devices] ❌ {dev.device_id} {what}: {error}")
+        self._close(dev, selector)
+
+    def _run(self):
+        with selectors.DefaultSelector() as selector:
+            while self.running:
+                now = time.monotonic()
+                for dev in self.devices.values():
+                    if dev.transport is None and now - dev.last_attempt >= self.reconnect_interval:
+                        self._connect(dev, selector)
+
+                registered = {key.data for key in selector.get_map().values()}
+                polled = [d for d in self.devices.values() if d.transport is not None and d not in registered]
+                timeout = self.poll_interval if polled else 0.5
+                if registered:
+                    ready = selector.select(timeout)
+                else:
+                    time.sleep(timeout)
+                    ready = []
+
+                for key, _ in ready:
+                    self._drain(key.data, selector)
+                for dev in polled:
+                    if dev.transport is not None:
+                        self._poll(dev, selector)
@@ -1,8 +1,22 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
-from app.serial_listener import SerialListener
-from app.utils.broadcast import clients  # shared clients list
+import json
+from app.devices import DeviceManager, parse_port_spec
+from app import config
+from app.utils.broadcast import broadcaster  # shared fan-out to /ws clients
+from app.utils.wire import SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON
+from app.ml.executor import executor, warm_up
+from app.ml.registry import registry
+from app.ml.batcher import batcher
+from app.persistence import writer
+from app.store import store
+from app.ml.cache import result_cache
+from app.simplify import simplifier
+from app.ml.geometry import geometric
+from app import metrics, profiling
+from app import bus as bus_module
 
 app = FastAPI(title="Sketch2Form Backend")
 
@@ -15,40 +29,316 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-listener = None  # will be initialized on startup
+devices = None  # will be initialized on startup
+warmup_task = None  # background model load, see /health
+bus = None  # publisher (producer role) or subscriber (subscriber role), see app/bus.py
+
+
+# --- /metrics: totals already kept by the pipeline, read at scrape time ---
+def _device_counter(key):
+    return lambda: {dev["device"]: dev[key] for dev in (devices.stats() if devices else [])}
+
+
+for _key, _help in (("lines", "Serial lines read"), ("points", "Points received"),
+                    ("shapes", "END_SHAPE markers received"), ("clears", "CLEARED markers received"),
+                    ("invalid", "Unparseable serial lines"), ("bytes", "Serial bytes read"),
+                    ("errors", "Reader errors that dropped the connection")):
+    metrics.Counter(f"sketch2form_serial_{_key}_total", f"{_help}, by device.", labels=("device",),
+                    fn=_device_counter(_key))
+metrics.Gauge("sketch2form_devices_connected", "Tablets with an open serial connection.",
+              fn=lambda: sum(dev["connected"] for dev in (devices.stats() if devices else [])))
+metrics.Gauge("sketch2form_ws_clients", "Connected /ws clients.", fn=lambda: len(broadcaster))
+metrics.Counter("sketch2form_broadcast_published_total", "Messages published to /ws clients.",
+                fn=lambda: broadcaster.published)
+metrics.Counter("sketch2form_broadcast_dropped_total", "Messages dropped by the overflow policy.",
+                fn=lambda: broadcaster.stats()["dropped_total"])
+metrics.Counter("sketch2form_broadcast_evicted_total", "Clients evicted as dead or lagging.",
+                fn=lambda: broadcaster.evicted)
+metrics.Gauge("sketch2form_queue_depth", "Items waiting per internal queue.", labels=("queue",),
+              fn=lambda: {"broadcast": broadcaster.stats()["queued_total"],
+                          "persist": writer.queued(),
+                          "batcher": batcher.stats()["queued"],
+                          "inference": executor.in_flight})
+metrics.Counter("sketch2form_persist_failed_total", "Shapes that could not be written to a segment.",
+                fn=lambda: writer.failed)
+metrics.Counter("sketch2form_ingest_points_in_total", "Points in finished strokes before simplification.",
+                fn=lambda: simplifier.points_in)
+metrics.Counter("sketch2form_ingest_points_out_total", "Points kept after simplification.",
+                fn=lambda: simplifier.points_out)
+metrics.Counter("sketch2form_fastpath_hits_total", "Shapes answered by the geometric fast path.",
+                fn=lambda: geometric.hits)
+metrics.Counter("sketch2form_fastpath_misses_total", "Shapes the fast path left to the model.",
+                fn=lambda: geometric.misses)
+metrics.Counter("sketch2form_inference_cache_hits_total", "Result cache hits.", fn=lambda: result_cache.hits)
+metrics.Counter("sketch2form_inference_cache_misses_total", "Result cache misses.", fn=lambda: result_cache.misses)
+metrics.Gauge("sketch2form_inference_cache_entries", "Entries in the result cache.", fn=lambda: len(result_cache))
+metrics.Counter("sketch2form_bus_frames_total",
+                "Frames published (producer), or received and failed to deliver (subscriber), on the bus.",
+                labels=("direction",),
+                fn=lambda: {} if bus is None else {"published": bus.stats()["published"]} if config.ROLE == "producer"
+                else {"received": bus.received, "failed": bus.errors})
+metrics.Gauge("sketch2form_bus_connected", "1 while a subscriber worker is connected to the producer.",
+              fn=lambda: {} if bus is None or config.ROLE != "subscriber" else {(): int(bus.connected)})
+metrics.Gauge("sketch2form_model_info", "The active model version (value is always 1).", labels=("model", "runtime"),
+              fn=lambda: {(registry.status["active"], registry.status["runtime"]): 1} if registry.active else {})
 
 
 @app.on_event("startup")
 async def startup_event():
-    global listener
+    global devices, warmup_task, bus
+    if config.ROLE not in bus_module.ROLES:
+        raise ValueError(f"Unknown SKETCH2FORM_ROLE {config.ROLE!r}, expected one of {bus_module.ROLES}")
+    if config.ROLE == "subscriber":
+        # no tablets, model or writer here: everything arrives from the producer
+        bus = bus_module.create_subscriber(config.BUS_URL)
+        await bus.start(lambda kind, message, binary, seq, device: broadcaster.publish(
+            message, kind, binary, seq, device))
+        print(f"[Backend] 🚀 Subscriber worker started on {config.BUS_URL}.")
+        return
+    if config.ROLE == "producer":
+        bus = bus_module.create_publisher(config.BUS_URL)
+        bus.backlog = broadcaster.history.backlog
+        await bus.start()
+        broadcaster.relay = bus.publish
     loop = asyncio.get_running_loop()  # ✅ get the active FastAPI loop
-    listener = SerialListener(port="COM3", baudrate=9600, loop=loop)
-    listener.start()
-    print("[Backend] 🚀 Serial listener started.")
+    if config.MODEL_WARMUP:
+        warmup_task = asyncio.create_task(warm_up())
+    if config.STORE_ENABLED:
+        writer.add_sink(store.insert_many, max_id=store.max_id)
+    await writer.start()
+    devices = DeviceManager(ports=parse_port_spec(config.SERIAL_PORTS),
+                            baudrate=config.SERIAL_BAUDRATE, loop=loop)
+    devices.start()
+    print("[Backend] 🚀 Serial device manager started.")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    if listener:
-        listener.stop()
-        print("[Backend] 🛑 Serial listener stopped.")
+    if bus is not None:
+        broadcaster.relay = None
+        await bus.stop()
+        print(f"[Backend] 🛑 Bus {config.ROLE} stopped.")
+    if config.ROLE == "subscriber":
+        return
+    if devices:
+        devices.stop()
+        print("[Backend] 🛑 Serial devices stopped.")
+    executor.shutdown(wait=False)
+    await batcher.stop()
+    await writer.stop()
+    print(f"[Backend] 💾 Shape writer flushed ({writer.written} shapes this run).")
 
 
 @app.get("/health")
-async def health_check():
-    return {"status": "ok", "message": "Sketch2Form backend is running"}
+async def health_check(response: Response):
+    """Liveness plus model readiness; 503 while the startup warm-up is still loading (or failed).
+    Subscriber workers are ready while connected to the producer."""
+    if config.ROLE == "subscriber":
+        ready = bus is not None and bus.connected
+        if not ready:
+            response.status_code = 503
+        return {
+            "status": "ok" if ready else "waiting for producer",
+            "ready": ready,
+            "role": config.ROLE,
+            "bus": bus.stats() if bus else None,
+            "message": "Sketch2Form backend is running",
+        }
+    model = dict(registry.status)
+    ready = model["state"] == "ready"
+    if not ready and (config.MODEL_WARMUP or model["state"] == "failed"):
+        response.status_code = 503
+    return {
+        "status": "ok" if ready else model["state"],
+        "ready": ready,
+        "role": config.ROLE,
+        "model": model,
+        "message": "Sketch2Form backend is running",
+    }
+
+
+@app.get("/devices")
+async def device_stats():
+    """Per-tablet connection state and throughput counters."""
+    return devices.stats() if devices else []
+
+
+@app.get("/ingest/stats")
+async def ingest_stats():
+    """Simplification mode and the share of received points it dropped, plus the segment writer's counters."""
+    return {**simplifier.stats(), "persist": writer.stats()}
+
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Micro-batcher latency percentiles and batch sizes, result-cache and fast-path hit rates."""
+    return {**batcher.stats(), "fastpath": geometric.stats()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Counters, gauges and per-stage latency histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 5.0, mode: str = "cpu", limit: int = 30):
+    """Capture a cProfile (``cpu``) or tracemalloc (``memory``) report for ``seconds``.
+
+    Disabled unless SKETCH2FORM_DEBUG_PROFILE=1.
+    """
+    if not config.DEBUG_PROFILE:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set SKETCH2FORM_DEBUG_PROFILE=1)")
+    if not 0 < seconds <= config.DEBUG_PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400,
+                            detail=f"seconds must be in (0, {config.DEBUG_PROFILE_MAX_SECONDS:g}]")
+    try:
+        report = await profiling.capture(seconds, mode=mode, limit=limit)
+    except profiling.ProfileBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PlainTextResponse(report)
+
+
+# --- model registry admin ---
+@app.get("/admin/models")
+async def list_models():
+    """Loaded model versions with per-version latency, plus the active and shadow routing."""
+    return registry.stats()
+
+
+@app.post("/admin/models/load")
+async def load_model(file: str, labels: str = None, activate: bool = False):
+    """Load, validate and warm up ``file`` (relative to MODEL_DIR) without interrupting traffic.
+
+    ``labels`` is an optional comma-separated override of the sidecar/default labels.
+    """
+    try:
+        path = registry.resolve(file)
+        version = await registry.load(path, labels=labels.split(",") if labels else None, activate=activate)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return version.stats()
+
+
+@app.post("/admin/models/{name}/activate")
+async def activate_model(name: str):
+    """Switch all new shapes to ``name``; shapes already in flight finish on the old version."""
+    try:
+        return registry.activate(name).stats()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/admin/models/shadow")
+async def shadow_model(name: str = None, percent: float = 0.0):
+    """Also classify ``percent`` % of shapes with candidate ``name`` (omit name or use 0 to stop)."""
+    try:
+        registry.set_shadow(name, percent)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return registry.stats()
+
+
+@app.delete("/admin/models/{name}")
+async def unload_model(name: str):
+    try:
+        registry.unload(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return registry.stats()
+
+
+@app.get("/shapes")
+async def list_shapes(label: str = None, device: str = None, color: str = None,
+                      since: str = None, until: str = None, min_confidence: float = None,
+                      max_confidence: float = None, cursor: str = None, limit: int = 100,
+                      points: bool = False):
+    """Stored shapes, newest first. Pass back ``next_cursor`` as ``cursor`` for the next page.
+
+    ``since``/``until`` take epoch seconds or ISO 8601 timestamps.
+    """
+    try:
+        return await asyncio.to_thread(
+            store.query, label=label, device=device, color=color, since=since, until=until,
+            min_confidence=min_confidence, max_confidence=max_confidence,
+            cursor=cursor, limit=limit, points=points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/shapes/export")
+async def export_shapes(label: str = None, device: str = None, since: str = None,
+                        until: str = None, points: bool = True):
+    """Stream every matching shape as NDJSON without building the whole result in memory."""
+    pages = store.iter_all(label=label, device=device, since=since, until=until, points=points)
+
+    async def body():
+        while True:
+            items = await asyncio.to_thread(next, pages, None)
+            if not items:
+                break
+            yield "".join(json.dumps(item) + "\n" for item in items)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@app.get("/shapes/{shape_id}")
+async def get_shape(shape_id: int):
+    shape = await asyncio.to_thread(store.get, shape_id)
+    if shape is None:
+        raise HTTPException(status_code=404, detail="Shape not found")
+    return shape
+
+
+@app.get("/broadcast/stats")
+async def broadcast_stats():
+    """Per-client queue depth, sent and dropped message counts, plus the bus in split deployments."""
+    return {**broadcaster.stats(), "bus": bus.stats() if bus else None}
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await ws.accept()
-    clients.append(ws)
-    print(f"[WebSocket] ✅ Client connected. Total clients: {len(clients)}")
-    
+    """Live shape events. JSON by default; binary shape_result frames with the
+    ``sketch2form.binary`` subprotocol or ``?format=binary``.
+
+    Starts with a ``snapshot`` message and the recent events: everything after
+    ``?since=<seq>`` (the last ``seq`` the client saw) when still retained,
+    else a compact snapshot of what is on screen (``"complete": false``)."""
+    offered = ws.scope.get("subprotocols") or []
+    if SUBPROTOCOL_BINARY in offered:
+        subprotocol, binary = SUBPROTOCOL_BINARY, True
+    elif SUBPROTOCOL_JSON in offered:
+        subprotocol, binary = SUBPROTOCOL_JSON, False
+    else:
+        subprotocol, binary = None, ws.query_params.get("format") == "binary"
+    try:
+        since = int(ws.query_params["since"])
+    except (KeyError, ValueError):
+        since = None
+    await ws.accept(subprotocol=subprotocol)
+    broadcaster.register(ws, binary=binary, replay=True, since=since)
+    print(f"[WebSocket] ✅ Client connected ({'binary' if binary else 'json'}). Total clients: {len(broadcaster)}")
+
     try:
         while True:
             # Keep connection alive by receiving messages
             await ws.receive_text()
     except WebSocketDisconnect:
-        clients.remove(ws)
-        print(f"[WebSocket] ❌ Client disconnected. Total clients: {len(clients)}")
\ No newline at end of file
+        pass
+    finally:
+        await broadcaster.unregister(ws)
+        print(f"[WebSocket] ❌ Client disconnected. Total clients: {len(broadcaster)}")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=config.HOST, port=config.PORT, ws_per_message_deflate=config.WS_DEFLATE)
@@ -0,0 +1,147 @@
+"""Counters, gauges and latency histograms, served as Prometheus text at /metrics.
+
+Dependency-free on purpose: a few lock-protected classes that render the
+Prometheus text exposition format (0.0.4). Hot paths only touch a histogram
+(one bisect and two additions under a lock); totals that the pipeline already
+keeps (device counters, cache hits, broadcast drops, queue depths) are read
+through callbacks at scrape time instead of being counted twice.
+
+    with stage_timer("inference"):
+        ...
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; spans a sub-millisecond parse up to a backed-up multi-second pipeline
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn  # callback returning a value, or {label values: value}
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _samples(self):
+        if self.fn is None:
+            with self._lock:
+                return list(self._values.items())
+        value = self.fn()
+        if isinstance(value, dict):
+            return [(k if isinstance(k, tuple) else (k,), v) for k, v in value.items()]
+        return [((), value)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        names = self.labels + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+def render():
+    """Every registered metric in Prometheus text format."""
+    lines = []
+    for metric in _metrics:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:  # a broken callback must not take the endpoint down
+            lines.append(f"# {metric.name} unavailable: {type(e).__name__}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# --- pipeline metrics ---
+stage_seconds = Histogram(
+    "sketch2form_stage_seconds",
+    "Time spent per pipeline stage (serial_read, serial_handle, simplify, dispatch, inference, "
+    "serialize, persist, broadcast, total).",
+    labels=("stage",),
+)
+inference_seconds = Histogram(
+    "sketch2form_inference_seconds", "TFLite invoke() time per call, by model version.", labels=("model",))
+shapes_processed = Counter(
+    "sketch2form_shapes_processed_total", "Shapes classified and broadcast, by label.", labels=("label",))
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
+
+
+def observe_stage(stage, seconds):
+    stage_seconds.observe(seconds, stage)
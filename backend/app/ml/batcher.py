@@ -0,0 +1,211 @@
+"""Micro-batching scheduler: many concurrent shapes, one TFLite invoke()."""
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import config
+from app.ml.preprocess import Preprocessor
+from app.ml.cache import result_cache, fingerprint
+from app.ml.ml import quantize_input, dequantize_output
+from app.ml.registry import registry
+from app.stroke import as_array
+
+
+class MicroBatcher:
+    """Gathers pending shapes for up to ``window_ms`` (or ``max_batch`` items)
+    and classifies them together.
+
+    The input tensor is resized to ``[B, seq_len, feat_dim]`` where B is the
+    batch size rounded up to a power of two, so only a handful of allocations
+    ever happen; unused rows are zero padding. Models that refuse the resize
+    are driven at their fixed batch size instead, padding (or splitting) each
+    gathered batch to fit. Rows already in the result cache never reach the model.
+    """
+
+    def __init__(self, max_batch=config.BATCH_MAX_SIZE, window_ms=config.BATCH_WINDOW_MS,
+                 history=2048, cache=result_cache):
+        self.cache = cache
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue = None
+        self._task = None
+        self._current = []  # the batch being classified, failed by stop() if it never finishes
+        # a single thread owns every batch interpreter, so none is ever shared
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tflite-batch")
+        self._interpreters = {}  # (version name, padded batch size) -> allocated interpreter
+        self._fixed_batch = {}  # version name -> batch size, for models that cannot be resized
+        self._preprocessors = {}  # seq_len -> Preprocessor
+
+        self._latencies = deque(maxlen=history)  # seconds, enqueue -> result
+        self._batch_sizes = Counter()
+        self.items = 0
+        self.batches = 0
+
+    # --- interpreter management (batch thread only) ---
+    def _interpreter_for(self, version, n):
+        fixed = self._fixed_batch.get(version.name)
+        if fixed is not None:
+            return fixed, self._interpreters[version.name, fixed]
+
+        bucket = 1
+        while bucket < n:
+            bucket *= 2
+        interp = self._interpreters.get((version.name, bucket))
+        if interp is not None:
+            return bucket, interp
+
+        interp = version.create_interpreter()
+        details = interp.get_input_details()[0]
+        try:
+            interp.resize_tensor_input(details["index"], [bucket, version.seq_len, version.feat_dim], strict=False)
+            interp.allocate_tensors()
+        except (RuntimeError, ValueError) as e:
+            fixed = int(details["shape"][0]) or 1
+            print(f"[ML] ⚠️ {version.name} input cannot be resized ({e}); using fixed batch of {fixed}")
+            interp = version.create_interpreter()
+            self._interpreters = {key: i for key, i in self._interpreters.items() if key[0] != version.name}
+            self._interpreters[version.name, fixed] = interp
+            self._fixed_batch[version.name] = fixed
+            return fixed, interp
+        self._interpreters[version.name, bucket] = interp
+        return bucket, interp
+
+    def _infer(self, jobs):
+        """Classify [(points, version), ...]; each version's rows go through its own model."""
+        if any(name not in registry.versions for name, _ in self._interpreters):
+            self._interpreters = {key: i for key, i in self._interpreters.items() if key[0] in registry.versions}
+        results = [None] * len(jobs)
+        by_version = {}
+        for i, (_, version) in enumerate(jobs):
+            by_version.setdefault(version, []).append(i)
+        for version, indexes in by_version.items():
+            for i, result in zip(indexes, self._infer_version(version, [jobs[i][0] for i in indexes])):
+                results[i] = result
+        return results
+
+    def _infer_version(self, version, point_lists):
+        preprocess = self._preprocessors.get(version.seq_len)
+        if preprocess is None:
+            preprocess = self._preprocessors[version.seq_len] = Preprocessor(version.seq_len)
+        n = len(point_lists)
+        inputs = np.empty((n, version.seq_len, version.feat_dim), dtype=np.float32)
+        results = [None] * n
+        misses = []  # (row in inputs, cache key)
+        for row, points in enumerate(point_lists):
+            preprocess(as_array(points), out=inputs[row])
+            key = fingerprint(inputs[row], version.name)
+            results[row] = self.cache.get(key)
+            if results[row] is None:
+                misses.append((row, key))
+
+        start = 0
+        while start < len(misses):
+            wanted = min(len(misses) - start, self._fixed_batch.get(version.name) or self.max_batch)
+            size, interp = self._interpreter_for(version, wanted)
+            chunk = misses[start:start + min(size, wanted)]
+            start += len(chunk)
+            batch = np.zeros((size, version.seq_len, version.feat_dim), dtype=np.float32)
+            batch[:len(chunk)] = inputs[[row for row, _ in chunk]]
+
+            in_details = interp.get_input_details()[0]
+            out_details = interp.get_output_details()[0]
+            began = time.perf_counter()
+            interp.set_tensor(in_details["index"], quantize_input(in_details, batch))
+            interp.invoke()
+            output = dequantize_output(out_details, interp.get_tensor(out_details["index"]))
+            version.record(time.perf_counter() - began, len(chunk))
+            for i, (row, key) in enumerate(chunk):
+                results[row] = self.cache.put(key, version.decode(output[i]))
+        return results
+
+    # --- scheduling (event loop) ---
+    async def predict(self, points, version):
+        """Queue one shape for ``version``'s next batch and await its (label, confidence)."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((points, version), future, time.perf_counter()))
+        return await future
+
+    async def _gather(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # anything already waiting rides along for free
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._current = await self._gather()
+            try:
+                results = await loop.run_in_executor(self._pool, self._infer, [b[0] for b in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            self.batches += 1
+            self.items += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            for (_, future, queued), result in zip(batch, results):
+                self._latencies.append(done - queued)
+                if not future.done():
+                    future.set_result(result)
+            self._current = []
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # callers still awaiting a result must not hang across shutdown
+        pending = list(self._current)
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._current = []
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped before classifying this shape"))
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        """Latency percentiles (ms) and batch-size distribution for tuning."""
+        lat = np.fromiter(self._latencies, dtype=np.float64) * 1000.0
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "fixed_batch": dict(self._fixed_batch),
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            "latency_ms": {
+                "p50": float(np.percentile(lat, 50)) if lat.size else None,
+                "p99": float(np.percentile(lat, 99)) if lat.size else None,
+                "max": float(lat.max()) if lat.size else None,
+            },
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "cache": self.cache.stats(),
+        }
+
+
+batcher = MicroBatcher()
@@ -0,0 +1,122 @@
+"""Pooled TFLite inference that keeps predict_shape off the event loop."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import config
+from app.ml.geometry import geometric
+from app.ml.preprocess import Preprocessor
+from app.ml.registry import registry
+from app.stroke import as_array
+from app.ml.batcher import batcher
+
+
+class InferenceExecutor:
+    """Thread pool where every worker owns private TFLite interpreters.
+
+    TFLite releases the GIL inside invoke(), so shapes classified on separate
+    workers really run in parallel. At most ``workers + queue_size`` shapes are
+    admitted at once; further callers wait on the semaphore, which gives the
+    serial side natural backpressure instead of an unbounded backlog. Each
+    worker keeps one interpreter per model version it has been asked to run.
+    """
+
+    def __init__(self, workers=config.INFERENCE_WORKERS, queue_size=config.INFERENCE_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tflite")
+        self._local = threading.local()
+        self._slots = None  # created on first use, inside the running loop
+        self.in_flight = 0  # admitted shapes, queued or running
+
+    def _worker_state(self, version):
+        models = getattr(self._local, "models", None)
+        if models is None:
+            models = self._local.models = {}
+        state = models.get(version.name)
+        if state is None:
+            # forget interpreters of versions unloaded since this worker last ran
+            for name in [name for name in models if name not in registry.versions]:
+                del models[name]
+            # one intra-op thread each; parallelism comes from the pool itself
+            state = models[version.name] = (version.create_interpreter(num_threads=1),
+                                            Preprocessor(version.seq_len))
+        return state
+
+    def _predict(self, points, version):
+        interp, preprocess = self._worker_state(version)
+        return version.run(interp, preprocess(as_array(points)))
+
+    def _predict_input(self, input_data, version):
+        interp, _ = self._worker_state(version)
+        # provisional inputs of a growing stroke never repeat; keep them out of the cache
+        return version.run(interp, input_data, cache=None)
+
+    async def _submit(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+        self.in_flight += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def predict(self, points, version):
+        """Classify one shape with ``version`` on a pooled interpreter, returns (label, confidence)."""
+        return await self._submit(self._predict, points, version)
+
+    async def fastpath(self, points, version):
+        """Geometric fast-path answer for one shape, or None; computed on the pool too."""
+        return await self._submit(geometric, as_array(points), version.labels)
+
+    async def predict_input(self, input_data, version):
+        """Classify an already preprocessed (1, seq_len, 5) float32 tensor."""
+        return await self._submit(self._predict_input, input_data, version)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+executor = InferenceExecutor()
+
+
+async def predict_shape_async(points):
+    """Awaitable counterpart of ml.predict_shape, answered by the active model version.
+
+    With SKETCH2FORM_FASTPATH=1, clear-cut shapes are answered by the geometric
+    fast path without invoking the model. The rest go through the
+    micro-batcher when SKETCH2FORM_INFERENCE_BATCHING=1, otherwise through the
+    per-thread interpreter pool. When a shadow candidate is set, a share of
+    shapes, fast-path answers included, is also classified by it in the
+    background.
+    """
+    version, shadow = await registry.route()
+    result = await executor.fastpath(points, version) if geometric.enabled else None
+    if result is None and config.INFERENCE_BATCHING:
+        result = await batcher.predict(points, version)
+    elif result is None:
+        result = await executor.predict(points, version)
+    if shadow is not None:
+        registry.shadow(executor.predict(points, shadow), shadow, result[0])
+    return result
+
+
+async def warm_up():
+    """Load the default model and prime one pooled interpreter, off the event loop.
+
+    Started as a background task at startup so the first real shape doesn't
+    pay for importing the runtime and allocating tensors.
+    """
+    start = time.perf_counter()
+    try:
+        version = await registry.ensure_active()
+        await executor.predict_input(np.zeros((1, version.seq_len, version.feat_dim), dtype=np.float32), version)
+    except Exception as e:
+        print(f"[ML] ❌ Model warm-up failed: {e}")
+        return
+    print(f"[ML] ✅ Model ready in {time.perf_counter() - start:.2f}s ({version.name})")
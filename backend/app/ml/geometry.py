@@ -0,0 +1,141 @@
+"""Cheap geometric classifier that answers clear-cut shapes without invoking TFLite.
+
+The stroke is resampled to ``n`` points evenly spaced along its length,
+scaled by its larger side (so the aspect ratio survives) and smoothed with a
+circular moving average that removes touch-panel jitter. From that outline:
+
+- circularity ``4πA / P²``: 1 for a circle, π/4 for a square, less for thin shapes
+- corners: peaks of the turning angle summed over a small window
+- aspect ratio of the bounding box
+- fill: enclosed area over bounding-box area (π/4 circle, ~1 box, ~½ triangle)
+- closure: gap between the first and last point relative to the length
+
+Each label scores the product of linear ramps over the features it depends
+on. The result is only used when the best label is one of ``labels`` and its
+score, discounted by how much the runner-up competes with it, reaches
+``threshold``; anything else is left to the model. Everything is a handful of NumPy operations on ``n`` points.
+"""
+import threading
+
+import numpy as np
+
+from app import config
+
+CORNER_ANGLE = np.deg2rad(35.0)  # turning within the window that counts as a corner
+MAX_CLOSURE = 0.2  # open strokes are never answered here
+
+
+def _ramp(value, lo, hi):
+    """0 at ``lo``, 1 at ``hi`` (either direction), linear in between."""
+    return float(np.clip((value - lo) / (hi - lo), 0.0, 1.0))
+
+
+def shape_features(rows, n=64, smooth=2, window=2):
+    """Geometric features of an (N, 4) stroke array, or None if it is degenerate."""
+    xy = rows[:, :2].astype(np.float64)
+    steps = np.hypot(*np.diff(xy, axis=0).T)
+    length = steps.sum()
+    if len(xy) < 3 or length <= 0:
+        return None
+    span = np.ptp(xy, axis=0)
+    if span.min() <= 0:
+        return None
+    closure = float(np.hypot(*(xy[-1] - xy[0]))) / length
+    xy = (xy - xy.min(axis=0)) / span.max()
+
+    # evenly spaced along the stroke, then a circular moving average
+    along = np.concatenate(([0.0], np.cumsum(steps)))
+    at = np.linspace(0.0, length, n, endpoint=False)
+    outline = np.column_stack((np.interp(at, along, xy[:, 0]), np.interp(at, along, xy[:, 1])))
+    kernel = np.full(2 * smooth + 1, 1.0 / (2 * smooth + 1))
+    padded = np.concatenate((outline[-smooth:], outline, outline[:smooth]))
+    outline = np.column_stack([np.convolve(padded[:, i], kernel, "valid") for i in (0, 1)])
+
+    x, y = outline[:, 0], outline[:, 1]
+    edges = np.roll(outline, -1, axis=0) - outline
+    perimeter = np.hypot(edges[:, 0], edges[:, 1]).sum()
+    area = 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+    width, height = np.ptp(x), np.ptp(y)
+
+    heading = np.arctan2(edges[:, 1], edges[:, 0])
+    turn = np.angle(np.exp(1j * (np.roll(heading, -1) - heading)))
+    bend = np.abs(sum(np.roll(turn, k) for k in range(-window, window + 1)))
+    corners = int(np.count_nonzero((bend > CORNER_ANGLE) & (bend >= np.roll(bend, 1)) & (bend > np.roll(bend, -1))))
+
+    return {
+        "circularity": 4.0 * np.pi * area / perimeter ** 2 if perimeter > 0 else 0.0,
+        "corners": corners,
+        "aspect": max(width, height) / max(min(width, height), 1e-9),
+        "fill": area / max(width * height, 1e-9),
+        "closure": closure,
+    }
+
+
+def label_scores(f):
+    """Per-label fit in [0, 1] for the four shapes the model knows."""
+    four = 1.0 if f["corners"] == 4 else 0.3 if f["corners"] == 5 else 0.0
+    boxy = _ramp(f["fill"], 0.72, 0.8)
+    return {
+        "circle": _ramp(f["circularity"], 0.9, 0.95) * _ramp(f["aspect"], 1.35, 1.2)
+                  * _ramp(f["fill"], 0.88, 0.83),
+        "square": four * boxy * _ramp(f["aspect"], 1.35, 1.2) * _ramp(f["circularity"], 0.95, 0.92),
+        "rectangle": four * boxy * _ramp(f["aspect"], 1.2, 1.35),
+        "triangle": (1.0 if f["corners"] == 3 else 0.0) * _ramp(f["fill"], 0.7, 0.62)
+                    * _ramp(f["fill"], 0.25, 0.32) * _ramp(f["aspect"], 4.0, 3.0),
+    }
+
+
+class GeometricClassifier:
+    """Fast path in front of the model; counts how often it answered."""
+
+    def __init__(self, threshold=config.FASTPATH_THRESHOLD, enabled=config.FASTPATH,
+                 labels=config.FASTPATH_LABELS):
+        self.threshold = threshold
+        self.enabled = enabled
+        self.labels = tuple(labels)  # labels it may answer; the rest always go to the model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def score(self, rows):
+        """(label, confidence) of the best geometric match, or (None, 0.0)."""
+        f = shape_features(rows)
+        if f is None or f["closure"] > MAX_CLOSURE:
+            return None, 0.0
+        scores = label_scores(f)
+        label = max(scores, key=scores.get)
+        best = scores[label]
+        if best <= 0:
+            return None, 0.0
+        return label, best * best / sum(scores.values())
+
+    def __call__(self, rows, labels=None):
+        """(label, confidence) when confident enough, else None (ask the model).
+
+        ``labels`` further restricts answers to what the model in use could say.
+        """
+        if not self.enabled:
+            return None
+        label, confidence = self.score(rows)
+        hit = (label in self.labels and confidence >= self.threshold
+               and (labels is None or label in labels))
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return (label, confidence) if hit else None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "labels": list(self.labels),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+geometric = GeometricClassifier()
@@ -1,42 +1,98 @@
 import os
 import json
 import time
+import threading
 import numpy as np
 import asyncio
 from datetime import datetime
-from collections import Counter
+from app import config
 from app.utils.broadcast import broadcast_message
-import tensorflow as tf  # for TFLite model inference
-
-SAVE_DIR = "shapes"
-os.makedirs(SAVE_DIR, exist_ok=True)
+from app.utils.colors import stroke_color_hex
+from app.ml.preprocess import Preprocessor
+from app.ml.cache import result_cache, fingerprint
+from app.stroke import as_array, as_stroke
+from app.persistence import writer, shape_record
 
 # === MODEL SETUP ===
+# Nothing heavy happens at import: the TFLite runtime and the model are loaded
+# on first use (or by the startup warm-up task, see app.ml.executor.warm_up).
 MODEL_PATH = os.path.join("app", "ml", "shape_classifier.tflite")
-
-# --- paste at top of ml.py where model is loaded (replace previous input_details usage) ---
-interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-
 LABELS = ["square", "rectangle", "triangle", "circle"]
 
-# print actual model input shape for debugging
-print("[ML] TFLite input details:", input_details)
-# input_details[0]['shape'] is often like [1, 64, 5] or [1, -1, 5] (if dynamic)
-shape_expected = input_details[0].get("shape", None)
-if shape_expected is None:
-    # fallback
-    seq_len = 64
-    feat_dim = 5
-else:
-    # shape_expected likely [1, seq_len, feat_dim] (0:batch,1:seq,2:feat)
-    # if some dimension is 0/1/-1, fallback to defaults
-    seq_len = int(shape_expected[1]) if len(shape_expected) > 1 and shape_expected[1] > 0 else 64
-    feat_dim = int(shape_expected[2]) if len(shape_expected) > 2 and shape_expected[2] > 0 else 5
-
-print(f"[ML] Model expects seq_len={seq_len}, feat_dim={feat_dim}")
+RUNTIME = None  # "tflite_runtime" or "tensorflow", once resolved
+_Interpreter = None
+_load_lock = threading.Lock()
+
+
+def _interpreter_class():
+    """The standalone tflite_runtime Interpreter when installed, else the one in full TensorFlow."""
+    global _Interpreter, RUNTIME
+    if _Interpreter is None:
+        Interpreter = None
+        if config.TFLITE_RUNTIME in ("auto", "tflite_runtime"):
+            try:
+                from tflite_runtime.interpreter import Interpreter
+                RUNTIME = "tflite_runtime"
+            except ImportError:
+                if config.TFLITE_RUNTIME == "tflite_runtime":
+                    raise
+        if Interpreter is None:
+            import tensorflow as tf  # for TFLite model inference
+            Interpreter = tf.lite.Interpreter
+            RUNTIME = "tensorflow"
+        _Interpreter = Interpreter
+    return _Interpreter
+
+
+def create_interpreter(model_path=MODEL_PATH, num_threads=None):
+    """Build and allocate a fresh TFLite interpreter (interpreters are not thread-safe)."""
+    interp = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+    interp.allocate_tensors()
+    return interp
+
+
+def load_model(model_path=MODEL_PATH):
+    """Load the shared interpreter and the model's input geometry, once.
+
+    Safe to call from any thread; later calls return the same interpreter.
+    """
+    global interpreter, input_details, output_details, seq_len, feat_dim
+    with _load_lock:
+        if "interpreter" in globals():
+            return globals()["interpreter"]
+        interp = create_interpreter(model_path)
+        input_details = interp.get_input_details()
+        output_details = interp.get_output_details()
+
+        # print actual model input shape for debugging
+        print("[ML] TFLite input details:", input_details)
+        # input_details[0]['shape'] is often like [1, 64, 5] or [1, -1, 5] (if dynamic)
+        shape_expected = input_details[0].get("shape", None)
+        if shape_expected is None:
+            # fallback
+            seq_len = 64
+            feat_dim = 5
+        else:
+            # shape_expected likely [1, seq_len, feat_dim] (0:batch,1:seq,2:feat)
+            # if some dimension is 0/1/-1, fallback to defaults
+            seq_len = int(shape_expected[1]) if len(shape_expected) > 1 and shape_expected[1] > 0 else 64
+            feat_dim = int(shape_expected[2]) if len(shape_expected) > 2 and shape_expected[2] > 0 else 5
+
+        print(f"[ML] Model expects seq_len={seq_len}, feat_dim={feat_dim} ({RUNTIME})")
+        interpreter = interp  # set last: its presence marks the model as loaded
+        return interp
+
+
+_LAZY_ATTRS = ("interpreter", "input_details", "output_details", "seq_len", "feat_dim")
+
+
+def __getattr__(name):
+    """``ml.interpreter``, ``ml.seq_len`` etc. load the model on first access."""
+    if name in _LAZY_ATTRS:
+        load_model()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # --- helper functions for resampling and feature building ---
 import math
@@ -86,88 +142,111 @@ def build_features_from_xyxy_t(xy, times=None):
 
 # --- replacement normalize_points + predict_shape ---
 def normalize_points(points, num_samples=64):
-    """Normalize coordinates to [0,1] and resample to fixed length, matching model input shape (1, 64, 5)."""
-    xs = np.array([p.get("x", 0) for p in points], dtype=np.float32)
-    ys = np.array([p.get("y", 0) for p in points], dtype=np.float32)
-    ts = np.array([p.get("t", 0) for p in points], dtype=np.float32)
-    cs = np.array([p.get("c", 0) for p in points], dtype=np.float32)
-
-    # Normalize x and y
-    min_x, max_x = xs.min(), xs.max()
-    min_y, max_y = ys.min(), ys.max()
-    width, height = max_x - min_x or 1, max_y - min_y or 1
-    xs = (xs - min_x) / width
-    ys = (ys - min_y) / height
+    """Normalize coordinates to [0,1] and resample to fixed length, matching model input shape (1, 64, 5).
 
-    # Normalize time to [0,1]
-    ts = (ts - ts.min()) / (ts.max() - ts.min() + 1e-6)
-
-    # Normalize color to [0,1] using max 16-bit RGB565 value
-    cs = cs / 65535.0
+    Accepts a Stroke or a list of point dicts. Thin wrapper over app.ml.preprocess;
+    the hot path reuses a per-thread Preprocessor instead of allocating a new tensor.
+    """
+    return Preprocessor(num_samples)(as_array(points)).copy()
 
-    # Stack features: (x, y, t, c, pen_down=1)
-    features = np.stack([xs, ys, ts, cs, np.ones_like(xs)], axis=1)
 
-    # Resample to fixed number of points
-    indices = np.linspace(0, len(features) - 1, num_samples).astype(int)
-    resampled = features[indices]
+def run_inference(interp, input_data, cache=result_cache, labels=LABELS, model=""):
+    """Classify one preprocessed (1, seq_len, 5) tensor on the given interpreter.
 
-    # Add batch dimension
-    return resampled.reshape(1, num_samples, 5).astype(np.float32)
+    Inputs seen recently are answered from ``cache`` without invoking the model;
+    ``model`` names the model version so versions never share cache entries.
+    """
+    if cache is not None and cache.enabled:
+        key = fingerprint(input_data, model)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        return cache.put(key, run_inference(interp, input_data, cache=None, labels=labels))
+
+    in_details = interp.get_input_details()[0]
+    out_details = interp.get_output_details()[0]
+    interp.set_tensor(in_details["index"], quantize_input(in_details, input_data))
+    interp.invoke()
+    output_data = dequantize_output(out_details, interp.get_tensor(out_details["index"]))[0]
+    return decode_prediction(output_data, labels)
+
+
+def quantize_input(details, input_data):
+    """The float features as the model's input tensor wants them.
+
+    Float (and float16-weight) models take them unchanged; full-integer models
+    take ``round(x / scale) + zero_point`` clipped to the integer type.
+    """
+    dtype = details["dtype"]
+    if dtype == np.float32:
+        return input_data
+    scale, zero_point = details["quantization"]
+    if not scale:
+        return input_data.astype(dtype)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(input_data / scale) + zero_point, info.min, info.max).astype(dtype)
+
+
+def dequantize_output(details, output_data):
+    """Class scores as float32, undoing ``(q - zero_point) * scale`` for integer outputs."""
+    if output_data.dtype == np.float32:
+        return output_data
+    scale, zero_point = details["quantization"]
+    if not scale:
+        return output_data.astype(np.float32)
+    return (output_data.astype(np.float32) - zero_point) * scale
+
+
+def decode_prediction(output_data, labels=LABELS):
+    """Turn one row of class scores into (label, confidence)."""
+    pred_idx = int(np.argmax(output_data))
+    confidence = float(output_data[pred_idx])
+    label = labels[pred_idx] if pred_idx < len(labels) else "unknown"
+    return label, confidence
 
 
 def predict_shape(points):
-    """Run TFLite model inference (uses normalize_points above)."""
+    """Run TFLite model inference (uses normalize_points above).
+
+    Uses the shared module-level interpreter, so it must not be called from
+    several threads at once; the server goes through app.ml.executor instead.
+    """
+    interp = load_model()
     # produce input matching model expected seq_len and feat_dim
     input_data = normalize_points(points, num_samples=seq_len)
     # debug print:
     # print("[ML] input_data.shape:", input_data.shape, " dtype:", input_data.dtype)
-    interpreter.set_tensor(input_details[0]["index"], input_data)
-    interpreter.invoke()
-    output_data = interpreter.get_tensor(output_details[0]["index"])[0]
-    pred_idx = int(np.argmax(output_data))
-    confidence = float(np.max(output_data))
-    label = LABELS[pred_idx] if pred_idx < len(LABELS) else "unknown"
-    return label, confidence
+    return run_inference(interp, input_data)
 
 
 # === MAIN SHAPE PROCESSOR ===
-async def process_shape(points):
-    """Process one completed shape batch from Arduino."""
+async def process_shape(points, device_id=None):
+    """Process one completed shape batch from Arduino (a Stroke or point dicts)."""
     if not points:
         return
+    stroke = as_stroke(points)
 
     # Step 1: Get dominant color
-    colors = [p.get("c", 0) for p in points if "c" in p]
-    if colors:
-        color_value = Counter(colors).most_common(1)[0][0]
-        color_hex = rgb565_to_hex(color_value)
-    else:
-        color_hex = "#FFFFFF"
+    color_hex = stroke_color_hex(stroke) or "#FFFFFF"
 
     # Step 2: Predict shape and confidence
-    print(f"[ML] 🔍 Received {len(points)} points for classification")
-    label, confidence = predict_shape(points)
+    print(f"[ML] 🔍 Received {len(stroke)} points for classification")
+    from app.ml.executor import predict_shape_async  # executor imports this module
+    label, confidence = await predict_shape_async(stroke)
 
-    # Step 3: Save results locally
-    shape_data = {
-        "timestamp": datetime.now().isoformat(),
-        "label": label,
-        "confidence": confidence,
-        "color": color_hex,
-        "points": points
-    }
-    filename = os.path.join(SAVE_DIR, f"shape_{int(time.time())}.json")
-    with open(filename, "w") as f:
-        json.dump(shape_data, f, indent=2)
+    # Step 3: Save results (write-behind, appended to a segment file off the loop)
+    shape_id = await writer.write(shape_record(stroke, label, confidence, time.time(), color_hex, device_id))
 
     # Step 4: Broadcast to clients
     message = {
         "type": "shape_result",
+        "id": shape_id,
         "label": label,
         "confidence": confidence,
-        "color": color_hex
+        "color": color_hex,
+        "device": device_id
     }
-    await broadcast_message(json.dumps(message))
+    await broadcast_message(message)
 
     print(f"[ML] ✅ Shape predicted: {label} ({confidence:.2f}) | Color: {color_hex}")
+    return shape_id
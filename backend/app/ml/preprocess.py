@@ -0,0 +1,123 @@
+"""Single-pass stroke preprocessing straight into the model input tensor.
+
+Produces exactly what dataset_collection/preprocess_dataset.normalize_and_resample
+produced for training: per-axis min/max normalisation of x and y, time scaled
+to [0, 1], colour divided by the RGB565 maximum, a constant pen-down flag,
+and index-based resampling to ``seq_len`` rows. Only the ``seq_len`` sampled
+rows are ever converted to float; the full stroke is only scanned for its
+min/max.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# column order of a stroke buffer
+X, Y, T, C = range(4)
+FEAT_DIM = 5
+COLOR_MAX = 65535.0  # max 16-bit RGB565 value
+
+
+@lru_cache(maxsize=1024)
+def resample_indices(n, seq_len):
+    """Row indices picked when resampling n points to seq_len (cached, read-only)."""
+    idx = np.linspace(0, n - 1, seq_len).astype(np.int32)
+    idx.flags.writeable = False
+    return idx
+
+
+def points_to_buffer(points):
+    """Pack a list of {"x","y","t","c"} dicts into a contiguous (N, 4) int64 array."""
+    flat = np.fromiter(
+        (p.get(k, 0) for p in points for k in ("x", "y", "t", "c")),
+        dtype=np.int64,
+        count=4 * len(points),
+    )
+    return flat.reshape(-1, 4)
+
+
+class Preprocessor:
+    """Reusable preprocessing stage with its own scratch and input buffers.
+
+    Not thread-safe: keep one per worker thread. ``input`` is the (1, seq_len, 5)
+    float32 tensor handed to ``set_tensor``; it is overwritten on every call.
+    """
+
+    __slots__ = ("seq_len", "input", "_rows", "_lo", "_hi", "_lo32", "_hi32")
+
+    def __init__(self, seq_len=64):
+        self.seq_len = seq_len
+        self.input = np.zeros((1, seq_len, FEAT_DIM), dtype=np.float32)
+        self._rows = np.empty((seq_len, 4), dtype=np.int64)
+        self._lo = np.empty(4, dtype=np.int64)
+        self._hi = np.empty(4, dtype=np.int64)
+        self._lo32 = np.empty(4, dtype=np.float32)
+        self._hi32 = np.empty(4, dtype=np.float32)
+
+    def __call__(self, stroke, out=None, bounds=None):
+        """Fill ``out`` (default ``self.input``) from a non-empty (N, 4) int64 stroke.
+
+        ``bounds`` optionally supplies the per-column ``(min, max)`` of the whole
+        stroke (e.g. kept up to date while it is drawn), which skips the only
+        O(N) step and makes the call O(seq_len).
+        """
+        if out is None:
+            out = self.input
+        feats = out.reshape(self.seq_len, FEAT_DIM)  # view, never a copy
+
+        np.take(stroke, resample_indices(len(stroke), self.seq_len), axis=0, out=self._rows)
+        lo, hi = self._lo32, self._hi32
+        if bounds is None:
+            np.minimum.reduce(stroke, axis=0, out=self._lo)
+            np.maximum.reduce(stroke, axis=0, out=self._hi)
+            lo[:] = self._lo
+            hi[:] = self._hi
+        else:
+            lo[:], hi[:] = bounds
+
+        # same float32 expressions as training, applied only to the kept rows
+        for col in (X, Y):
+            span = hi[col] - lo[col]
+            np.subtract(self._rows[:, col], lo[col], out=feats[:, col], dtype=np.float32)
+            np.divide(feats[:, col], span if span > 0 else 1, out=feats[:, col])
+
+        np.subtract(self._rows[:, T], lo[T], out=feats[:, T], dtype=np.float32)
+        np.divide(feats[:, T], hi[T] - lo[T] + 1e-6, out=feats[:, T])
+
+        np.divide(self._rows[:, C], COLOR_MAX, out=feats[:, C], dtype=np.float32)
+        feats[:, 4] = 1.0  # pen_down
+        return out
+
+
+def preprocess_batch(strokes, seq_len=64, out=None):
+    """Preprocess many (N_i, 4) integer strokes at once into an (n, seq_len, 5) float32 array.
+
+    Bit-for-bit what Preprocessor produces for each stroke, but the strokes are
+    concatenated so every step is one NumPy operation for the whole batch (for
+    offline jobs; the live path keeps the per-stroke Preprocessor).
+    """
+    n = len(strokes)
+    if out is None:
+        out = np.empty((n, seq_len, FEAT_DIM), dtype=np.float32)
+    if not n:
+        return out
+    lengths = np.fromiter((len(s) for s in strokes), dtype=np.int64, count=n)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    flat = np.concatenate(strokes).astype(np.int64, copy=False)
+    lo = np.minimum.reduceat(flat, starts, axis=0).astype(np.float32)
+    hi = np.maximum.reduceat(flat, starts, axis=0).astype(np.float32)
+
+    # np.linspace(0, n - 1, seq_len) per stroke, computed the way linspace does
+    at = np.arange(seq_len, dtype=np.float64)[None, :] * ((lengths - 1) / max(seq_len - 1, 1))[:, None]
+    at[:, -1] = lengths - 1
+    rows = flat[starts[:, None] + at.astype(np.int32)]  # (n, seq_len, 4)
+
+    span = hi - lo
+    for col in (X, Y):
+        scale = np.where(span[:, col] > 0, span[:, col], np.float32(1))
+        np.subtract(rows[:, :, col], lo[:, col, None], out=out[:, :, col], dtype=np.float32)
+        np.divide(out[:, :, col], scale[:, None], out=out[:, :, col])
+    np.subtract(rows[:, :, T], lo[:, T, None], out=out[:, :, T], dtype=np.float32)
+    np.divide(out[:, :, T], (span[:, T] + 1e-6)[:, None], out=out[:, :, T])
+    np.divide(rows[:, :, C], COLOR_MAX, out=out[:, :, C], dtype=np.float32)
+    out[:, :, 4] = 1.0
+    return out
@@ -0,0 +1,308 @@
+"""Versioned TFLite models that can be loaded, compared and swapped at runtime.
+
+A version is one ``.tflite`` file under ``config.MODEL_DIR``, named
+``<stem>@<first 8 hex digits of its sha256>``, plus optional metadata from a
+JSON sidecar with the same stem:
+
+    app/ml/shape_classifier_v2.tflite
+    app/ml/shape_classifier_v2.json    {"labels": [...], "seq_len": 64, "feat_dim": 5}
+
+Loading, validation and warm-up run off the event loop. Activation is a single
+reference swap: shapes already being classified finish on the version they
+started with, every later shape uses the new one, and no client is
+disconnected. A candidate can also shadow a percentage of shapes; its
+predictions are only compared with the active version's, never broadcast.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+
+import numpy as np
+
+from app import config
+from app.ml import ml
+from app.ml.cache import result_cache, fingerprint
+from app.ml.preprocess import Preprocessor, FEAT_DIM
+from app.metrics import inference_seconds
+
+
+def _polygon(vertices, n=96):
+    """A closed stroke through ``vertices`` as (n, 4) int64 rows (x, y, t, c)."""
+    vertices = np.asarray(vertices + vertices[:1], dtype=np.float64)
+    seg = np.linspace(0, len(vertices) - 1, n)
+    i = np.minimum(seg.astype(int), len(vertices) - 2)
+    frac = (seg - i)[:, None]
+    xy = vertices[i] * (1 - frac) + vertices[i + 1] * frac
+    rows = np.zeros((n, 4), dtype=np.int64)
+    rows[:, :2] = np.rint(xy)
+    rows[:, 2] = np.arange(n) * 10
+    rows[:, 3] = 0xF800
+    return rows
+
+
+def sample_strokes():
+    """Synthetic square, rectangle, triangle and circle used to warm a version up."""
+    angles = np.linspace(0, 2 * np.pi, 32, endpoint=False)
+    return [
+        _polygon([(60, 40), (200, 40), (200, 180), (60, 180)]),
+        _polygon([(30, 70), (290, 70), (290, 170), (30, 170)]),
+        _polygon([(160, 30), (280, 210), (40, 210)]),
+        _polygon([(160 + 90 * np.cos(a), 120 + 90 * np.sin(a)) for a in angles]),
+    ]
+
+
+class ModelVersion:
+    """One loaded model file, its metadata and its latency history."""
+
+    def __init__(self, name, path, labels, seq_len, feat_dim, history=2048):
+        self.name = name
+        self.path = path
+        self.labels = list(labels)
+        self.seq_len = seq_len
+        self.feat_dim = feat_dim
+        self.loaded_at = time.time()
+        self.warmup_ms = None
+        self.dtype = "float32"  # input tensor type: int8/uint8 for fully quantized models
+        self.variant = None  # quantization variant from the export sidecar, when known
+        self.predictions = 0
+        self._latencies = deque(maxlen=history)  # seconds per invoke()
+        self.shadow_compared = 0
+        self.shadow_agreed = 0
+
+    def create_interpreter(self, num_threads=None):
+        return ml.create_interpreter(self.path, num_threads=num_threads)
+
+    def run(self, interp, input_data, cache=result_cache):
+        """Classify one (1, seq_len, 5) tensor on an interpreter of this version."""
+        if cache is not None and cache.enabled:
+            key = fingerprint(input_data, self.name)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            return cache.put(key, self.run(interp, input_data, cache=None))
+        start = time.perf_counter()
+        result = ml.run_inference(interp, input_data, cache=None, labels=self.labels)
+        self.record(time.perf_counter() - start)
+        return result
+
+    def decode(self, output_row):
+        return ml.decode_prediction(output_row, self.labels)
+
+    def record(self, seconds, items=1):
+        self.predictions += items
+        self._latencies.append(seconds)
+        inference_seconds.observe(seconds, self.name)
+
+    def stats(self):
+        lat = np.fromiter(self._latencies, dtype=np.float64) * 1000.0
+        return {
+            "name": self.name,
+            "path": self.path,
+            "labels": self.labels,
+            "seq_len": self.seq_len,
+            "feat_dim": self.feat_dim,
+            "dtype": self.dtype,
+            "variant": self.variant,
+            "loaded_at": self.loaded_at,
+            "warmup_ms": self.warmup_ms,
+            "predictions": self.predictions,
+            "latency_ms": {
+                "p50": float(np.percentile(lat, 50)) if lat.size else None,
+                "p99": float(np.percentile(lat, 99)) if lat.size else None,
+                "max": float(lat.max()) if lat.size else None,
+            },
+            "shadow": {
+                "compared": self.shadow_compared,
+                "agreement": self.shadow_agreed / self.shadow_compared if self.shadow_compared else None,
+            },
+        }
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_version(path, labels=None):
+    """Build, validate and warm up a ModelVersion (blocking; run it off the loop)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"{stem}@{_file_digest(path)[:8]}"
+    meta = {}
+    sidecar = os.path.splitext(path)[0] + ".json"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            meta = json.load(f)
+
+    interp = ml.create_interpreter(path)
+    shape = interp.get_input_details()[0].get("shape")
+    seq_len = meta.get("seq_len") or (int(shape[1]) if shape is not None and len(shape) > 1 and shape[1] > 0 else 64)
+    feat_dim = meta.get("feat_dim") or (int(shape[2]) if shape is not None and len(shape) > 2 and shape[2] > 0 else FEAT_DIM)
+    if feat_dim != FEAT_DIM:
+        raise ValueError(f"{name} expects {feat_dim} features per point, the preprocessing produces {FEAT_DIM}")
+    version = ModelVersion(name, path, labels or meta.get("labels") or ml.LABELS, seq_len, feat_dim)
+    in_details = interp.get_input_details()[0]
+    version.dtype = np.dtype(in_details["dtype"]).name
+    version.variant = meta.get("variant")
+
+    # warm up on sample shapes; this also checks the output width against the labels
+    preprocess = Preprocessor(seq_len)
+    out_details = interp.get_output_details()[0]
+    start = time.perf_counter()
+    for stroke in sample_strokes():
+        interp.set_tensor(in_details["index"], ml.quantize_input(in_details, preprocess(stroke)))
+        interp.invoke()
+        classes = interp.get_tensor(out_details["index"]).shape[-1]
+        if classes != len(version.labels):
+            raise ValueError(f"{name} outputs {classes} classes but has {len(version.labels)} labels")
+    version.warmup_ms = (time.perf_counter() - start) * 1000.0
+    return version
+
+
+class ModelRegistry:
+    """Loaded model versions, the active one and an optional shadow candidate.
+
+    All mutation happens on the event loop; worker threads only read the
+    version object they were handed.
+    """
+
+    def __init__(self, model_dir=config.MODEL_DIR, default_path=ml.MODEL_PATH):
+        self.model_dir = model_dir
+        self.default_path = default_path
+        self.versions = {}  # name -> ModelVersion
+        self.active = None
+        self.candidate = None
+        self.shadow_percent = 0.0
+        # readiness of the active model, reported by /health
+        self.status = {"state": "idle", "active": None, "runtime": None, "error": None}
+        self._lock = None  # asyncio.Lock, created inside the running loop
+        self._shadow_tasks = set()
+        self._failures = 0  # consecutive failed loads of the default model by ensure_active
+        self._retry_at = 0.0  # monotonic time before which ensure_active does not try again
+
+    def resolve(self, filename):
+        """Path of a model file inside ``model_dir``; anything outside it is refused."""
+        root = os.path.realpath(self.model_dir)
+        path = os.path.realpath(os.path.join(root, filename))
+        if os.path.commonpath([root, path]) != root or not path.endswith(".tflite"):
+            raise ValueError(f"Model files must be .tflite files inside {self.model_dir}")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No model file {filename!r} in {self.model_dir}")
+        return path
+
+    async def load(self, path, labels=None, activate=False, if_idle=False):
+        """Load (or reuse) the version stored at ``path``; the first one loaded becomes active.
+
+        With ``if_idle`` nothing is loaded if a version became active while waiting.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if if_idle and self.active is not None:
+                return self.active
+            if self.active is None:
+                self.status.update(state="loading", error=None)
+            try:
+                version = await asyncio.to_thread(load_version, path, labels)
+            except Exception as e:
+                if self.active is None:
+                    self.status.update(state="failed", error=f"{type(e).__name__}: {e}")
+                raise
+            version = self.versions.setdefault(version.name, version)
+            print(f"[Models] 📦 Loaded {version.name} (seq_len={version.seq_len}, "
+                  f"labels={version.labels}, warm-up {version.warmup_ms:.1f} ms)")
+            if activate or self.active is None:
+                self.activate(version.name)
+            return version
+
+    async def ensure_active(self, retry_interval=config.MODEL_RETRY_INTERVAL):
+        """The active version, loading the default model first if nothing is loaded yet.
+
+        A failed load is not retried for every shape (each attempt hashes the
+        file and builds an interpreter under the lock): until the backoff
+        expires the stored error is raised straight away."""
+        if self.active is None:
+            if self.status["state"] == "failed" and time.monotonic() < self._retry_at:
+                raise RuntimeError(f"No model loaded ({self.status['error']}); "
+                                   f"retrying in {self._retry_at - time.monotonic():.0f}s")
+            try:
+                await self.load(self.default_path, activate=True, if_idle=True)
+            except Exception:
+                self._failures += 1
+                self._retry_at = time.monotonic() + retry_interval * min(2 ** (self._failures - 1), 10)
+                raise
+            self._failures = 0
+        return self.active
+
+    def get(self, name):
+        version = self.versions.get(name)
+        if version is None:
+            raise KeyError(f"Unknown model version {name!r}")
+        return version
+
+    def activate(self, name):
+        version = self.get(name)
+        previous, self.active = self.active, version  # the atomic switch
+        if self.candidate is version:
+            self.candidate, self.shadow_percent = None, 0.0
+        self.status.update(state="ready", active=version.name, runtime=ml.RUNTIME, error=None)
+        print(f"[Models] 🔁 Active model: {previous.name if previous else None} -> {version.name}")
+        return version
+
+    def set_shadow(self, name=None, percent=0.0):
+        """Route ``percent`` % of shapes to ``name`` as well, for comparison only."""
+        if name is None or percent <= 0:
+            self.candidate, self.shadow_percent = None, 0.0
+            return
+        version = self.get(name)
+        if version is self.active:
+            raise ValueError(f"{name} is already the active version")
+        self.candidate, self.shadow_percent = version, min(float(percent), 100.0)
+
+    def unload(self, name):
+        version = self.get(name)
+        if version is self.active:
+            raise ValueError(f"{name} is active; activate another version first")
+        if version is self.candidate:
+            self.candidate, self.shadow_percent = None, 0.0
+        del self.versions[name]
+
+    async def route(self):
+        """(version to answer with, shadow version or None) for the next shape."""
+        active = await self.ensure_active()
+        candidate = self.candidate
+        if candidate is not None and random.random() * 100.0 < self.shadow_percent:
+            return active, candidate
+        return active, None
+
+    def shadow(self, prediction, version, primary_label):
+        """Run a shadow prediction in the background and record whether it agreed."""
+        async def compare():
+            try:
+                label, _ = await prediction
+            except Exception as e:
+                print(f"[Models] ⚠️ Shadow prediction on {version.name} failed: {e}")
+                return
+            version.shadow_compared += 1
+            version.shadow_agreed += label == primary_label
+
+        task = asyncio.create_task(compare())
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    def stats(self):
+        return {
+            "active": self.active.name if self.active else None,
+            "candidate": self.candidate.name if self.candidate else None,
+            "shadow_percent": self.shadow_percent,
+            "versions": [v.stats() for v in self.versions.values()],
+        }
+
+
+registry = ModelRegistry()
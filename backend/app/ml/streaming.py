@@ -0,0 +1,144 @@
+"""Live (provisional) classification of a stroke while it is still being drawn.
+
+Per point we only update running min/max, arc length and timing, which is
+O(1). Every ``every_points`` points or ``every_ms`` milliseconds (and never
+with a previous provisional call still running) the stroke is resampled with
+those running bounds, an O(seq_len) step independent of stroke length, and
+classified on the inference pool; the result goes out as a ``shape_partial``
+message so the frontend can start morphing before DONE is pressed.
+"""
+import asyncio
+import math
+import time
+
+import numpy as np
+
+from app import config
+from app.ml.executor import executor
+from app.ml.registry import registry
+from app.ml.preprocess import Preprocessor, FEAT_DIM
+from app.utils.broadcast import broadcast_message
+
+
+class RunningStrokeStats:
+    """Bounding box, arc length and time span of a stroke, updated per point in O(1)."""
+
+    __slots__ = ("n", "min_x", "max_x", "min_y", "max_y", "min_t", "max_t",
+                 "arc_length", "_last_x", "_last_y")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.min_x = self.max_x = self.min_y = self.max_y = self.min_t = self.max_t = 0
+        self.arc_length = 0.0
+        self._last_x = self._last_y = 0
+
+    def update(self, x, y, t):
+        if self.n == 0:
+            self.min_x = self.max_x = x
+            self.min_y = self.max_y = y
+            self.min_t = self.max_t = t
+        else:
+            if x < self.min_x:
+                self.min_x = x
+            elif x > self.max_x:
+                self.max_x = x
+            if y < self.min_y:
+                self.min_y = y
+            elif y > self.max_y:
+                self.max_y = y
+            if t < self.min_t:
+                self.min_t = t
+            elif t > self.max_t:
+                self.max_t = t
+            self.arc_length += math.hypot(x - self._last_x, y - self._last_y)
+        self._last_x, self._last_y = x, y
+        self.n += 1
+
+    def bounds(self):
+        """Per-column (min, max) in stroke-buffer order (x, y, t, c); c is unused."""
+        return ((self.min_x, self.min_y, self.min_t, 0), (self.max_x, self.max_y, self.max_t, 0))
+
+
+class LiveClassifier:
+    """Throttled provisional predictions for one device's in-progress stroke.
+
+    ``on_point`` runs on the serial reader thread; predictions and broadcasts
+    run on the event loop. A generation counter drops results that arrive
+    after their stroke was finished or restarted.
+    """
+
+    def __init__(self, device_id, loop, every_points=config.LIVE_EVERY_POINTS,
+                 every_ms=config.LIVE_EVERY_MS, min_points=config.LIVE_MIN_POINTS):
+        self.device_id = device_id
+        self.loop = loop
+        self.every_points = max(1, every_points)
+        self.every_s = every_ms / 1000.0
+        self.min_points = max(1, min_points)
+        self.stats = RunningStrokeStats()
+        self._preprocess = None  # built for the active model version's seq_len
+        self._generation = 0
+        self._in_flight = False
+        self._last_n = 0
+        self._last_time = 0.0
+        self.predictions = 0
+
+    def start_stroke(self):
+        self._generation += 1
+        self.stats.reset()
+        self._last_n = 0
+
+    end_stroke = start_stroke  # a finished stroke's late partials are dropped the same way
+
+    def on_point(self, stroke, x, y, t):
+        stats = self.stats
+        stats.update(x, y, t)
+        n = stats.n
+        # never stall the serial thread on a model that is still loading
+        if n < self.min_points or self._in_flight or registry.active is None:
+            return
+        now = time.monotonic()
+        if n - self._last_n < self.every_points and now - self._last_time < self.every_s:
+            return
+        self._last_n, self._last_time = n, now
+        self._launch(stroke)
+
+    def _launch(self, stroke):
+        version = registry.active
+        if self._preprocess is None or self._preprocess.seq_len != version.seq_len:
+            self._preprocess = Preprocessor(version.seq_len)
+        # gather seq_len rows with the running bounds, then let go of the view
+        # before the reader appends again (an exported array cannot grow)
+        view = stroke.view()
+        tensor = self._preprocess(view, out=np.empty((1, version.seq_len, FEAT_DIM), dtype=np.float32),
+                                  bounds=self.stats.bounds())
+        del view
+        stats = self.stats
+        summary = {
+            "points": stats.n,
+            "arc_length": round(stats.arc_length, 1),
+            "duration_ms": stats.max_t - stats.min_t,
+        }
+        self._in_flight = True
+        asyncio.run_coroutine_threadsafe(self._classify(tensor, version, self._generation, summary), self.loop)
+
+    async def _classify(self, tensor, version, generation, summary):
+        try:
+            label, confidence = await executor.predict_input(tensor, version)
+        except Exception as e:
+            print(f"[Live] ⚠️ Provisional prediction failed: {e}")
+            return
+        finally:
+            self._in_flight = False
+        if generation != self._generation:
+            return
+        self.predictions += 1
+        await broadcast_message({
+            "type": "shape_partial",
+            "device": self.device_id,
+            "label": label,
+            "confidence": confidence,
+            **summary,
+        })
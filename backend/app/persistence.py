@@ -0,0 +1,220 @@
+"""Write-behind persistence of classified shapes into rotating JSON Lines segments.
+
+process_shape only enqueues a record; a background task batches records and
+appends them from a worker thread, so the event loop never touches the disk.
+Every record gets a unique, monotonically increasing integer ``id`` (resumed
+from the newest segment on restart), which also names the segments:
+``segment_<first id>.jsonl``. A batch that hits an I/O error is retried with
+backoff; a record that cannot be serialised is dropped on its own. Either way
+lost records are counted in ``stats()``. One compact line per shape:
+
+    {"id":42,"ts":1762390000.1,"label":"circle","confidence":0.98,
+     "color":"#F80000","device":"COM3","points":[[x,y,t,c],...]}
+"""
+import asyncio
+import glob
+import json
+import os
+
+from app import config
+
+SEGMENT_GLOB = "segment_*.jsonl"
+
+
+def segment_paths(directory=config.SEGMENT_DIR):
+    """All segment files, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, SEGMENT_GLOB)))
+
+
+def read_segment(path):
+    """Yield the records of one segment, skipping a torn last line."""
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def read_segments(directory=config.SEGMENT_DIR):
+    for path in segment_paths(directory):
+        yield from read_segment(path)
+
+
+def _last_id(directory):
+    for path in reversed(segment_paths(directory)):
+        last = None
+        for record in read_segment(path):
+            last = record.get("id", last)
+        if last is not None:
+            return last
+    return 0
+
+
+class ShapeWriter:
+    """Async queue plus background writer; flushes every ``flush_records`` records
+    or ``flush_interval`` seconds, whichever comes first, and on stop()."""
+
+    def __init__(self, directory=config.SEGMENT_DIR, segment_bytes=config.SEGMENT_MAX_BYTES,
+                 flush_records=config.PERSIST_FLUSH_RECORDS, flush_interval=config.PERSIST_FLUSH_INTERVAL,
+                 queue_size=config.PERSIST_QUEUE_SIZE, retries=config.PERSIST_RETRIES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_records = max(1, flush_records)
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.retries = max(0, retries)
+        self._queue = None
+        self._task = None
+        self._start_lock = None  # asyncio.Lock, created inside the running loop
+        self._next_id = None
+        self._file = None  # only touched from the writer thread
+        self._sinks = []
+        self._id_floors = []
+        self.written = 0
+        self.flushes = 0
+        self.retried = 0
+        self.failed = 0  # records whose id was handed out but that never reached a segment
+
+    def add_sink(self, sink, max_id=None):
+        """Also hand every flushed batch to ``sink(records)`` (called on the writer
+        thread); ``max_id()`` reports ids the sink already holds so new ids stay unique."""
+        self._sinks.append(sink)
+        if max_id is not None:
+            self._id_floors.append(max_id)
+
+    def _resume_id(self):
+        return max([_last_id(self.directory)] + [floor() for floor in self._id_floors])
+
+    async def start(self):
+        if self._task is not None:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:  # concurrent first writes must not start two writers
+            if self._task is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._next_id = await asyncio.to_thread(self._resume_id) + 1
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, record):
+        """Enqueue one record and return the id assigned to it (waits only when the queue is full)."""
+        if self._task is None:
+            await self.start()
+        record_id = self._next_id
+        self._next_id += 1
+        await self._queue.put({"id": record_id, **record})
+        return record_id
+
+    async def stop(self):
+        """Flush everything still queued and close the current segment."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._close)
+
+    def queued(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        return {"written": self.written, "flushes": self.flushes, "retried": self.retried,
+                "failed": self.failed, "queued": self.queued(), "directory": self.directory}
+
+    # --- background task ---
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_records:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        """Append one batch; never raises, so the writer outlives any bad batch."""
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.to_thread(self._append, batch)
+                return
+            except OSError as e:  # disk full, directory gone...: worth another try
+                error = e
+                if attempt < self.retries:
+                    self.retried += 1
+                    print(f"[Persist] ⚠️ Failed to write {len(batch)} shapes ({e}); retrying")
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 5.0))
+            except Exception as e:  # e.g. a field json cannot encode: drop just those records
+                good = [record for record in batch if _serialisable(record)]
+                self.failed += len(batch) - len(good)
+                print(f"[Persist] ❌ Dropped {len(batch) - len(good)} shape(s) that cannot be written: {e!r}")
+                if len(good) == len(batch):  # not the records after all: give up on the batch
+                    error = e
+                    break
+                batch = good
+                if not batch:
+                    return
+        self.failed += len(batch)
+        print(f"[Persist] ❌ Failed to write {len(batch)} shapes: {error}")
+
+    # --- writer thread ---
+    def _append(self, batch):
+        data = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in batch).encode()
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self._close()
+            path = os.path.join(self.directory, f"segment_{batch[0]['id']:012d}.jsonl")
+            self._file = open(path, "ab")
+        self._file.write(data)
+        self._file.flush()
+        self.written += len(batch)
+        self.flushes += 1
+        for sink in self._sinks:
+            try:
+                sink(batch)
+            except Exception as e:
+                print(f"[Persist] ⚠️ Sink {getattr(sink, '__qualname__', sink)} failed: {e}")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _serialisable(record):
+    try:
+        json.dumps(record, separators=(",", ":"))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def shape_record(stroke, label, confidence, ts, color=None, device_id=None):
+    """Build the persisted record for one classified Stroke."""
+    return {
+        "ts": ts,
+        "label": label,
+        "confidence": confidence,
+        "color": color,
+        "device": device_id,
+        "points": stroke.view().tolist(),
+    }
+
+
+writer = ShapeWriter()
@@ -1,60 +1,61 @@
 import json
-import os
-import asyncio
-from datetime import datetime
-import numpy as np
+import time
 
-# ✅ Import both process_shape and predict_shape from ml.py
-from app.ml.ml import process_shape as ml_process_shape, predict_shape
-from app.utils.broadcast import broadcast_message  # if not imported, keep your existing async broadcast function
+from app.ml.executor import predict_shape_async
+from app.utils.broadcast import broadcast_message, broadcaster  # if not imported, keep your existing async broadcast function
+from app.stroke import as_stroke
+from app.utils.colors import stroke_color_hex
+from app.utils.wire import encode_shape_result
+from app.persistence import writer, shape_record
+from app.metrics import stage_timer, observe_stage, shapes_processed
 
-SAVE_DIR = "shapes"
-os.makedirs(SAVE_DIR, exist_ok=True)
 
+async def process_shape(points, device_id=None, received_at=None):
+    """Process incoming shape data from Arduino (a Stroke or a list of point dicts).
 
-def normalize_points(points):
-    xs = [p["x"] for p in points]
-    ys = [p["y"] for p in points]
-    min_x, max_x = min(xs), max(xs)
-    min_y, max_y = min(ys), max(ys)
-    width = max_x - min_x or 1
-    height = max_y - min_y or 1
-
-    norm = [{"x": (p["x"] - min_x) / width,
-             "y": (p["y"] - min_y) / height,
-             "t": p.get("t", 0)} for p in points]
-    return norm
-
-
-async def process_shape(points):
-    """Process incoming shape data from Arduino."""
+    ``device_id`` identifies the tablet the shape came from and is carried into
+    the saved record and the broadcast. ``received_at`` is the perf_counter()
+    time END_SHAPE was read, for the dispatch/total stage timings. Returns the
+    persisted record id.
+    """
     if not points:
         return
-
-    # Step 1: Normalize
-    norm_points = normalize_points(points)
-
-    # Step 2: Predict shape using ML model
-    label, confidence = predict_shape(norm_points)
-
-    # Step 3: Save locally
-    shape_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    save_path = os.path.join(SAVE_DIR, f"shape_{shape_id}.json")
-    with open(save_path, "w") as f:
-        json.dump({
-            "points": points,
+    if received_at is not None:
+        observe_stage("dispatch", time.perf_counter() - received_at)
+    stroke = as_stroke(points)
+
+    # Step 1: Predict shape using ML model (pooled interpreters, off the event loop).
+    # Normalization happens once, inside the inference worker, on a zero-copy view.
+    with stage_timer("inference"):
+        label, confidence = await predict_shape_async(stroke)
+
+    # Step 2: Queue for the background segment writer (no disk I/O on the loop)
+    with stage_timer("persist"):
+        color_hex = stroke_color_hex(stroke)
+        shape_id = await writer.write(shape_record(stroke, label, confidence, time.time(), color_hex, device_id))
+
+    # Step 3: Broadcast result
+    with stage_timer("serialize"):
+        points = stroke.to_dicts()  # JSON file / WebSocket format
+        seq = broadcaster.history.next_seq()  # resume cursor for reconnecting clients
+        payload = json.dumps({
+            "type": "shape_result",
+            "seq": seq,
+            "id": shape_id,
             "label": label,
-            "confidence": confidence
-        }, f, indent=2)
-
-    # Step 4: Broadcast result
-    await broadcast_message(json.dumps({
-        "type": "shape_result",
-        "label": label,
-        "confidence": confidence,
-        "points": points
-    }))
-
-    print(f"[Processor] ✅ Shape: {label} ({confidence:.2f}) | Color: {points[0].get('c', 'N/A')}")
+            "confidence": confidence,
+            "device": device_id,
+            "points": points
+        })
+    with stage_timer("broadcast"):
+        # binary /ws clients get the packed encoding, built only if one is connected
+        await broadcast_message(payload, kind="shape_result", binary=lambda: encode_shape_result(
+            shape_id, label, confidence, device_id, stroke.view(), seq), seq=seq, device=device_id)
+    shapes_processed.inc(1, label)
+    if received_at is not None:
+        observe_stage("total", time.perf_counter() - received_at)
+
+    print(f"[Processor] ✅ Shape: {label} ({confidence:.2f}) | Color: {points[0].get('c', 'N/A')} | Device: {device_id}")
+    return shape_id
 
 
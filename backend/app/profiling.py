@@ -0,0 +1,68 @@
+"""On-demand cProfile / tracemalloc captures for GET /debug/profile.
+
+Both capture for a fixed number of seconds while the server keeps running,
+then return a plain-text report. Only one capture runs at a time.
+"""
+import asyncio
+import cProfile
+import io
+import pstats
+import tracemalloc
+
+MODES = ("cpu", "memory")
+
+_running = False
+
+
+class ProfileBusy(RuntimeError):
+    pass
+
+
+async def capture(seconds, mode="cpu", limit=30):
+    """Profile the running server for ``seconds`` and return a text report."""
+    global _running
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected one of {MODES}")
+    if _running:
+        raise ProfileBusy("A profile capture is already running")
+    _running = True
+    try:
+        if mode == "cpu":
+            return await _cpu(seconds, limit)
+        return await _memory(seconds, limit)
+    finally:
+        _running = False
+
+
+async def _cpu(seconds, limit):
+    # cProfile hooks the calling thread: the event loop, where parsing,
+    # dispatch, serialisation and broadcast run (inference shows as awaits).
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return f"# cpu profile, {seconds:g}s, top {limit} by cumulative time\n" + out.getvalue()
+
+
+async def _memory(seconds, limit):
+    # tracemalloc sees allocations from every thread (readers, workers, writer)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    lines = [f"# memory growth over {seconds:g}s, top {limit} by size difference",
+             f"# traced: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB"]
+    lines += [str(stat) for stat in after.compare_to(before, "lineno")[:limit]]
+    return "\n".join(lines) + "\n"
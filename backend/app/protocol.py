@@ -0,0 +1,71 @@
+"""Parser for the serial line protocol of arduino/sketch2Form_final.ino.
+
+The sketch only ever prints three control tokens and points of the fixed form
+``{"x":12,"y":34,"t":5678,"c":63488}``, so points are matched with a single
+precompiled regex instead of a json.loads per line. Anything that does not
+match exactly (reordered keys, extra spaces, ...) falls back to JSON. Values
+must fit the int64 point buffer; anything larger is INVALID.
+"""
+import json
+import re
+
+# event kinds returned by parse_line
+POINT = "point"
+START_SHAPE = "START_SHAPE"
+END_SHAPE = "END_SHAPE"
+CLEARED = "CLEARED"
+INVALID = "invalid"
+
+_CONTROL = {
+    b"START_SHAPE": START_SHAPE, "START_SHAPE": START_SHAPE,
+    b"END_SHAPE": END_SHAPE, "END_SHAPE": END_SHAPE,
+    b"CLEARED": CLEARED, "CLEARED": CLEARED,
+}
+
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+# up to 18 digits always fits int64; longer numbers take the range-checked JSON path
+_POINT_PATTERN = r'\{"x":(-?\d{1,18}),"y":(-?\d{1,18}),"t":(-?\d{1,18}),"c":(-?\d{1,18})\}'
+_POINT_BYTES = re.compile(_POINT_PATTERN.encode()).fullmatch
+_POINT_TEXT = re.compile(_POINT_PATTERN).fullmatch
+
+
+def _parse_json_point(line):
+    try:
+        point = json.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        return INVALID, line
+    if not isinstance(point, dict) or "x" not in point or "y" not in point:
+        return INVALID, line
+    try:
+        values = (int(point["x"]), int(point["y"]), int(point.get("t", 0)), int(point.get("c", 0)))
+    except (TypeError, ValueError, OverflowError):
+        return INVALID, line
+    if not all(INT64_MIN <= v <= INT64_MAX for v in values):
+        return INVALID, line
+    return POINT, values
+
+
+def parse_line(line):
+    """Classify one serial line (bytes or str; surrounding whitespace is ignored).
+
+    Returns ``(kind, payload)``: ``(POINT, (x, y, t, c))`` for a point,
+    ``(START_SHAPE | END_SHAPE | CLEARED, None)`` for control tokens, and
+    ``(INVALID, line)`` for anything else, including empty lines and values
+outside int64.
+    """
+    line = line.strip()
+    kind = _CONTROL.get(line)
+    if kind is not None:
+        return kind, None
+    m = (_POINT_BYTES if isinstance(line, bytes) else _POINT_TEXT)(line)
+    if m is not None:
+        return POINT, (int(m[1]), int(m[2]), int(m[3]), int(m[4]))
+    if not line:
+        return INVALID, line
+    return _parse_json_point(line)
+
+
+def format_point(x, y, t, c):
+    """Serialise a point exactly as the Arduino prints it (without line ending)."""
+    return f'{{"x":{x},"y":{y},"t":{t},"c":{c}}}'
@@ -0,0 +1,238 @@
+"""Offline bulk reclassification of the stored shape history.
+
+After a model update, re-labels every stored shape (the segment files and the
+legacy shapes/*.json captures) without going through the server:
+
+    cd backend && python -m app.reclassify --model app/ml/shape_classifier_int8.tflite
+    cd backend && python -m app.reclassify --workers 8 --batch 1024 --out shapes/reclassify.db
+
+A pool of processes reads the files and preprocesses their strokes in one
+vectorised pass per task (see preprocess_batch); the parent feeds them to a
+single batched interpreter and writes one row per shape to a SQLite results
+table:
+
+    results(key, id, source, old_label, old_confidence, new_label, new_confidence, agree)
+
+Every file is marked done, with its size and mtime, in the same transaction
+as its rows. An interrupted run therefore resumes where it stopped, and a
+later run only processes new segments and the one still being written.
+``--restart`` starts over; resuming with a different model is refused.
+Progress and the final summary report shapes/s.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app import config
+from app.ml import ml
+from app.ml.preprocess import preprocess_batch
+from app.ml.registry import load_version
+from app.persistence import read_segment, segment_paths
+from app.store import legacy_paths, legacy_record
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key             TEXT PRIMARY KEY,   -- "id:<shape id>", or the legacy file path
+    id              INTEGER,
+    source          TEXT,
+    old_label       TEXT,
+    old_confidence  REAL,
+    new_label       TEXT NOT NULL,
+    new_confidence  REAL NOT NULL,
+    agree           INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path    TEXT PRIMARY KEY,
+    size    INTEGER NOT NULL,
+    mtime   REAL NOT NULL,
+    shapes  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+LEGACY_PER_TASK = 256  # legacy captures hold one shape each, so they travel in groups
+
+
+def _signature(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def _prepare(paths, seq_len):
+    """Worker: parse some files and preprocess all their strokes in one batch."""
+    keys, ids, sources, old_labels, old_confidences, strokes = [], [], [], [], [], []
+    files = []  # (path, size, mtime, shapes)
+    for path in paths:
+        size, mtime = _signature(path)  # before reading: a file growing meanwhile is redone next run
+        before = len(keys)
+        if path.endswith(".jsonl"):
+            records = ((record, None) for record in read_segment(path))
+        else:
+            record = legacy_record(path)
+            records = [(record, os.path.abspath(path))] if record is not None else []
+        for record, source in records:
+            points = record.get("points")
+            points = np.asarray(points if points is not None else (), dtype=np.int64).reshape(-1, 4)
+            if not len(points):
+                continue
+            shape_id = record.get("id")
+            keys.append(f"id:{shape_id}" if source is None else source)
+            ids.append(shape_id)
+            sources.append(source)
+            old_labels.append(record.get("label"))
+            old_confidences.append(record.get("confidence"))
+            strokes.append(points)
+        files.append((path, size, mtime, len(keys) - before))
+    features = preprocess_batch(strokes, seq_len)
+    return {"keys": keys, "ids": ids, "sources": sources, "old_labels": old_labels,
+            "old_confidences": old_confidences, "features": features, "files": files}
+
+
+class BatchClassifier:
+    """One interpreter driven at a fixed batch size; the last batch is zero-padded."""
+
+    def __init__(self, version, batch, num_threads=None):
+        self.version = version
+        self.labels = np.array(version.labels)
+        self.interp = version.create_interpreter(num_threads=num_threads)
+        details = self.interp.get_input_details()[0]
+        try:
+            self.interp.resize_tensor_input(details["index"], [batch, version.seq_len, version.feat_dim], strict=False)
+            self.interp.allocate_tensors()
+            self.batch = batch
+        except (RuntimeError, ValueError) as e:
+            self.interp = version.create_interpreter(num_threads=num_threads)
+            self.batch = int(details["shape"][0]) or 1
+            print(f"[Reclassify] ⚠️ {version.name} input cannot be resized ({e}); using batches of {self.batch}")
+        self.input = np.zeros((self.batch, version.seq_len, version.feat_dim), dtype=np.float32)
+
+    def __call__(self, features):
+        """(labels, confidences) for an (n, seq_len, feat_dim) array."""
+        in_details = self.interp.get_input_details()[0]
+        out_details = self.interp.get_output_details()[0]
+        labels, confidences = [], []
+        for start in range(0, len(features), self.batch):
+            chunk = features[start:start + self.batch]
+            self.input[:len(chunk)] = chunk
+            self.input[len(chunk):] = 0.0
+            self.interp.set_tensor(in_details["index"], ml.quantize_input(in_details, self.input))
+            self.interp.invoke()
+            scores = ml.dequantize_output(out_details, self.interp.get_tensor(out_details["index"]))[:len(chunk)]
+            best = scores.argmax(axis=1)
+            labels.append(self.labels[best])
+            confidences.append(scores[np.arange(len(chunk)), best])
+        if not labels:
+            return np.array([], dtype=str), np.array([], dtype=np.float32)
+        return np.concatenate(labels), np.concatenate(confidences)
+
+
+def open_results(path, model, restart=False):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    if restart:
+        db.executescript("DROP TABLE IF EXISTS results; DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS meta;")
+    db.executescript(SCHEMA)
+    row = db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+    if row is None:
+        db.execute("INSERT INTO meta VALUES ('model', ?)", (model,))
+        db.commit()
+    elif row[0] != model:
+        sys.exit(f"{path} holds results of {row[0]}, not {model}; pass --restart or another --out")
+    return db
+
+
+def pending_tasks(db, shapes_dir, segment_dir):
+    """Files not yet processed in their current state, grouped into pool tasks."""
+    done = {path: (size, mtime) for path, size, mtime in db.execute("SELECT path, size, mtime FROM files")}
+
+    def changed(path):
+        return done.get(path) != _signature(path)
+
+    tasks = [[path] for path in segment_paths(segment_dir) if changed(path)]
+    legacy = [path for path in legacy_paths(shapes_dir) if changed(path)]
+    tasks += [legacy[i:i + LEGACY_PER_TASK] for i in range(0, len(legacy), LEGACY_PER_TASK)]
+    return tasks
+
+
+def write_results(db, prepared, new_labels, new_confidences):
+    old_labels = prepared["old_labels"]
+    rows = [(key, shape_id, source, old, old_conf, new, float(conf), int(old == new))
+            for key, shape_id, source, old, old_conf, new, conf in zip(
+                prepared["keys"], prepared["ids"], prepared["sources"], old_labels,
+                prepared["old_confidences"], new_labels.tolist(), new_confidences)]
+    with db:
+        db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", prepared["files"])
+    return sum(row[7] for row in rows)
+
+
+def summary(db):
+    total, agree = db.execute("SELECT COUNT(*), COALESCE(SUM(agree), 0) FROM results").fetchone()
+    changes = db.execute(
+        "SELECT old_label, new_label, COUNT(*) FROM results WHERE agree = 0 "
+        "GROUP BY old_label, new_label ORDER BY COUNT(*) DESC LIMIT 10").fetchall()
+    return total, agree, changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-label every stored shape with a model, offline.")
+    parser.add_argument("--model", default=ml.MODEL_PATH)
+    parser.add_argument("--out", default=os.path.join(config.SHAPES_DIR, "reclassify.db"))
+    parser.add_argument("--shapes-dir", default=config.SHAPES_DIR)
+    parser.add_argument("--segment-dir", default=config.SEGMENT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="preprocessing processes")
+    parser.add_argument("--batch", type=int, default=512, help="shapes per model invoke")
+    parser.add_argument("--threads", type=int, default=None, help="TFLite interpreter threads")
+    parser.add_argument("--restart", action="store_true", help="discard earlier results in --out")
+    args = parser.parse_args()
+
+    version = load_version(args.model)
+    db = open_results(args.out, version.name, args.restart)
+    tasks = pending_tasks(db, args.shapes_dir, args.segment_dir)
+    print(f"[Reclassify] {version.name} | {len(tasks)} task(s) to process | results in {args.out}")
+    classify = BatchClassifier(version, args.batch, args.threads)
+
+    shapes = agreed = 0
+    start = last_report = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        pending = deque()
+        tasks = iter(tasks)
+        while True:
+            # keep a bounded number of tasks in flight so parsed strokes never pile up
+            while len(pending) < 2 * max(1, args.workers):
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append(pool.submit(_prepare, task, version.seq_len))
+            if not pending:
+                break
+            prepared = pending.popleft().result()
+            new_labels, new_confidences = classify(prepared["features"])
+            agreed += write_results(db, prepared, new_labels, new_confidences)
+            shapes += len(prepared["keys"])
+            now = time.perf_counter()
+            if now - last_report >= 5.0:
+                last_report = now
+                print(f"[Reclassify] {shapes:,} shapes | {shapes / (now - start):,.0f} shapes/s | "
+                      f"agreement {agreed / max(shapes, 1):.1%}")
+
+    elapsed = time.perf_counter() - start
+    print(f"[Reclassify] ✅ {shapes:,} shapes this run in {elapsed:.1f}s "
+          f"({shapes / elapsed if elapsed else 0:,.0f} shapes/s)")
+    total, agree, changes = summary(db)
+    print(f"[Reclassify] {total:,} shapes in {args.out}, {agree / max(total, 1):.1%} keep their label")
+    for old, new, count in changes:
+        print(f"  {old} -> {new}: {count:,}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
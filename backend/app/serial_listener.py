@@ -1,21 +1,37 @@
 import serial
 import time
-import json
 import threading
 import asyncio
 from fastapi import WebSocket
 from app.processor import process_shape
+from app.ml.streaming import LiveClassifier
+from app.utils.broadcast import broadcast_message
+from app.stroke import Stroke
+from app.protocol import parse_line, POINT, START_SHAPE, END_SHAPE, CLEARED
+from app.transport import LineReader, open_transport
+from app import config
+from app.metrics import observe_stage
+from app.simplify import simplifier
 
 
 class SerialListener:
-    def __init__(self, port="COM3", baudrate=9600, loop=None):
+    def __init__(self, port="COM3", baudrate=9600, loop=None, verbose=config.SERIAL_VERBOSE,
+                 transport=None, reader_mode=config.SERIAL_READER_MODE, device_id=None):
         self.port = port
+        self.device_id = device_id or port  # tags every shape from this tablet
         self.baudrate = baudrate
         self.running = False
         self.clients = set()  # WebSocket clients
         self.thread = None
         self.loop = loop or asyncio.get_event_loop()  # ✅ store FastAPI’s main event loop
         self.last_shape_time = 0  # ✅ Track last END_SHAPE time
+        self.verbose = verbose  # log every point (slow at full serial rate)
+        self.transport = transport  # pre-opened transport (replay, loopback, pty) instead of port
+        self.reader_mode = reader_mode  # "chunk" (bulk reads) or "line" (readline per line)
+        self._buffer = Stroke()
+        self.counters = {"lines": 0, "points": 0, "shapes": 0, "clears": 0, "invalid": 0}
+        # provisional predictions while drawing (None when disabled)
+        self.live = LiveClassifier(self.device_id, self.loop) if config.LIVE_CLASSIFICATION else None
 
     def start(self):
         self.running = True
@@ -34,60 +50,90 @@ class SerialListener:
     #     self.clients.discard(websocket)
 
     async def _broadcast(self, message: dict):
-        """Broadcast JSON message to all WebSocket clients."""
-        to_remove = []
-        for ws in list(self.clients):
-            try:
-                await ws.send_json(message)
-            except Exception:
-                to_remove.append(ws)
-        for ws in to_remove:
-            self.clients.remove(ws)
+        """Broadcast JSON message to all WebSocket clients (the shared /ws list)."""
+        await broadcast_message(message)
+
+    def handle_line(self, raw):
+        """Feed one raw serial line through the protocol state machine."""
+        kind, payload = parse_line(raw)
+        counters = self.counters
+        counters["lines"] += 1
+
+        if kind == POINT:
+            self._buffer.append(*payload)
+            counters["points"] += 1
+            if self.live is not None:
+                self.live.on_point(self._buffer, payload[0], payload[1], payload[2])
+            if self.verbose:
+                print(f"[SerialListener] ➕ Point: {payload}")
+
+        elif kind == START_SHAPE:
+            self._buffer = Stroke()
+            if self.live is not None:
+                self.live.start_stroke()
+            print("[SerialListener] 🟢 START_SHAPE detected")
+
+        elif kind == END_SHAPE:
+            now = time.time()
+            if now - self.last_shape_time < 1.0:
+                return
+            self.last_shape_time = now
+
+            buffer = self._buffer
+            if buffer:
+                received_at = time.perf_counter()
+                stroke = simplifier(buffer)
+                observe_stage("simplify", time.perf_counter() - received_at)
+                print(f"[SerialListener] 🔵 END_SHAPE received — {len(buffer)} points collected"
+                      + (f", {len(stroke)} kept" if stroke is not buffer else ""))
+                # ✅ Always use the main FastAPI loop; the stroke is handed
+                # off as-is and a fresh one collects the next shape
+                asyncio.run_coroutine_threadsafe(
+                    process_shape(stroke, device_id=self.device_id, received_at=received_at), self.loop)
+                self._buffer = Stroke()
+                if self.live is not None:
+                    self.live.end_stroke()
+                counters["shapes"] += 1
+
+        elif kind == CLEARED:
+            print("[SerialListener] 🧹 CLEARED signal received")
+            asyncio.run_coroutine_threadsafe(
+                self._broadcast({"type": "clear", "device": self.device_id}), self.loop)
+            counters["clears"] += 1
+
+        elif payload:
+            counters["invalid"] += 1
+            print(f"[SerialListener] ⚠️ Skipped invalid line: {payload!r}")
+
+    def _open(self):
+        if self.transport is not None:
+            return self.transport
+        return open_transport(self.port, self.baudrate, timeout=1)
 
     def _read_serial(self):
         """Read and process lines from the serial port."""
-        buffer = []
-        last_line = None
+        self._buffer = Stroke()
+        if self.live is not None:
+            self.live.start_stroke()
 
         try:
-            with serial.Serial(self.port, self.baudrate, timeout=1) as ser:
-                print(f"[SerialListener] ✅ Connected to {self.port}")
-
-                while self.running:
-                    line = ser.readline().decode(errors="ignore").strip()
-                    if not line:
-                        continue
-
-                    print(f"[SerialListener] RAW: {line}")
-
-                    if line == "START_SHAPE":
-                        buffer = []
-                        print("[SerialListener] 🟢 START_SHAPE detected")
-                        
-                    elif line == "END_SHAPE":
-                        now = time.time()
-                        if now - self.last_shape_time < 1.0:
-                            continue
-                        self.last_shape_time = now
-
-                        if buffer:
-                            print(f"[SerialListener] 🔵 END_SHAPE received — {len(buffer)} points collected")
-                            # ✅ Always use the main FastAPI loop
-                            asyncio.run_coroutine_threadsafe(process_shape(buffer), self.loop)
-                            buffer = []
-
-
-                    elif line == "CLEARED":
-                        print("[SerialListener] 🧹 CLEARED signal received")
-                        asyncio.run_coroutine_threadsafe(self._broadcast({"type": "clear"}), self.loop)
-
-                    else:
-                        try:
-                            point = json.loads(line)
-                            buffer.append(point)
-                            print(f"[SerialListener] ➕ Point: {point}")
-                        except json.JSONDecodeError:
-                            print(f"[SerialListener] ⚠️ Skipped invalid JSON: {line}")
+            with self._open() as ser:
+                print(f"[SerialListener] ✅ Connected to {self.port} ({self.reader_mode} reads)")
+
+                if self.reader_mode == "line":
+                    while self.running:
+                        self.handle_line(ser.readline())
+                else:
+                    reader = LineReader(ser)
+                    while self.running:
+                        started = time.perf_counter()
+                        lines = reader.read_lines()
+                        if lines:
+                            read = time.perf_counter()
+                            for line in lines:
+                                self.handle_line(line)
+                            observe_stage("serial_read", read - started)
+                            observe_stage("serial_handle", time.perf_counter() - read)
 
         except serial.SerialException as e:
             print(f"[SerialListener] Serial error: {e}")
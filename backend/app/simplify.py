@@ -0,0 +1,115 @@
+"""Point reduction for finished strokes, applied before classification, storage and broadcast.
+
+The Arduino reports every touch poll, so a resting pen produces runs of the
+same sample and straight edges carry far more points than their shape needs.
+
+- ``dedupe`` drops consecutive repeats of the same (x, y, colour).
+- ``rdp`` also applies Ramer–Douglas–Peucker with a tolerance of ``epsilon``
+  pixels. It is vectorised level by level: each pass measures every point
+  against the chord of the kept segment it lies in and splits all segments at
+  once, so the number of Python iterations is the recursion depth, not the
+  number of points.
+
+The first and last points are always kept, so a stroke keeps its duration.
+"""
+import threading
+
+import numpy as np
+
+from app import config
+from app.stroke import Stroke
+
+MODES = ("off", "dedupe", "rdp")
+
+
+def dedupe_mask(rows):
+    """Boolean mask keeping the first point of each run of identical x, y, c."""
+    keep = np.ones(len(rows), dtype=bool)
+    if len(rows) > 1:
+        np.any(rows[1:, [0, 1, 3]] != rows[:-1, [0, 1, 3]], axis=1, out=keep[1:])
+        keep[-1] = True
+    return keep
+
+
+def rdp_mask(xy, epsilon):
+    """Boolean mask of the points Ramer–Douglas–Peucker keeps for an (N, 2) polyline."""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3:
+        return keep
+    xy = np.asarray(xy, dtype=np.float64)
+    positions = np.arange(n)
+    while True:
+        kept = np.flatnonzero(keep)
+        # segment k spans kept[k]..kept[k + 1]; every point is measured against its chord
+        seg = np.minimum(np.searchsorted(kept, positions, side="right") - 1, len(kept) - 2)
+        start, end = xy[kept[seg]], xy[kept[seg + 1]]
+        chord = end - start
+        rel = xy - start
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        cross = np.abs(chord[:, 0] * rel[:, 1] - chord[:, 1] * rel[:, 0])
+        dist = np.where(length > 0, cross / np.where(length > 0, length, 1.0), np.hypot(rel[:, 0], rel[:, 1]))
+        dist[kept] = 0.0
+
+        worst = np.maximum.reduceat(dist, kept[:-1])
+        split = worst > epsilon
+        if not split.any():
+            return keep
+        # the farthest point of each segment that is still too far from its chord
+        candidates = np.flatnonzero(split[seg] & (dist == worst[seg]))
+        _, first = np.unique(seg[candidates], return_index=True)
+        keep[candidates[first]] = True
+
+
+class Simplifier:
+    """Configured reduction plus running totals for the reduction ratio."""
+
+    def __init__(self, mode=config.SIMPLIFY, epsilon=config.SIMPLIFY_EPSILON):
+        if mode not in MODES:
+            raise ValueError(f"Unknown simplify mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.epsilon = epsilon
+        self.points_in = 0
+        self.points_out = 0
+        self._lock = threading.Lock()  # called from every device reader thread
+
+    def mask(self, rows):
+        """Keep-mask for an (N, 4) int64 stroke array, or None when nothing is dropped."""
+        if self.mode == "off" or len(rows) < 2:
+            return None
+        keep = dedupe_mask(rows)
+        if self.mode == "rdp" and self.epsilon > 0:
+            unique = np.flatnonzero(keep)
+            keep[unique] = rdp_mask(rows[unique, :2], self.epsilon)
+        return None if keep.all() else keep
+
+    def __call__(self, stroke):
+        """The reduced stroke (the same object when nothing is dropped)."""
+        rows = stroke.view()
+        keep = self.mask(rows)
+        out = stroke if keep is None else Stroke.from_array(rows[keep])
+        del rows  # release the buffer export so the caller's stroke stays growable
+        with self._lock:
+            self.points_in += len(stroke)
+            self.points_out += len(out)
+        return out
+
+    @property
+    def ratio(self):
+        """Fraction of received points that were dropped."""
+        return 1.0 - self.points_out / self.points_in if self.points_in else 0.0
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "epsilon": self.epsilon,
+            "points_in": self.points_in,
+            "points_out": self.points_out,
+            "reduction": self.ratio,
+        }
+
+
+simplifier = Simplifier()
@@ -0,0 +1,283 @@
+"""Indexed shape history in SQLite (WAL mode), fed by the segment writer.
+
+The segment files stay the write-ahead source of truth; this store is the
+queryable index on top of them and can be rebuilt from them at any time:
+
+    cd backend && python -m app.store import        # segments + legacy shape_*.json
+
+Segment records keep the ids the writer gave them. Legacy captures have none
+and are numbered downwards from -1, a range the writer never issues, so an
+import can run while the server is writing.
+
+Points are kept as a packed (N, 4) BLOB and only decoded on request: int32,
+or int64 for strokes whose ``t`` no longer fits (tablets up for weeks).
+Results come newest first and are keyset-paginated on ``(ts, id)`` through
+the (column, ts) indexes, so deep pages cost the same as the first one.
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app import config
+from app.persistence import read_segments
+from app.stroke import Stroke
+from app.utils.colors import stroke_color_hex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shapes (
+    id          INTEGER PRIMARY KEY,
+    ts          REAL NOT NULL,
+    label       TEXT,
+    confidence  REAL,
+    color       TEXT,
+    device      TEXT,
+    n_points    INTEGER NOT NULL,
+    points      BLOB NOT NULL,
+    source      TEXT UNIQUE          -- legacy file path, NULL for live shapes
+);
+CREATE INDEX IF NOT EXISTS idx_shapes_ts ON shapes(ts);
+CREATE INDEX IF NOT EXISTS idx_shapes_label ON shapes(label, ts);
+CREATE INDEX IF NOT EXISTS idx_shapes_device ON shapes(device, ts);
+CREATE INDEX IF NOT EXISTS idx_shapes_color ON shapes(color, ts);
+CREATE INDEX IF NOT EXISTS idx_shapes_confidence ON shapes(confidence);
+"""
+
+COLUMNS = "id, ts, label, confidence, color, device, n_points"
+MAX_LIMIT = 1000
+
+
+def parse_time(value):
+    """Epoch seconds from a float/int or an ISO 8601 string; None passes through."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def encode_cursor(item):
+    return f"{item['ts']!r}:{item['id']}"
+
+
+def decode_cursor(cursor):
+    ts, _, shape_id = str(cursor).partition(":")
+    if not shape_id:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return float(ts), int(shape_id)
+
+
+_INT32 = np.iinfo(np.int32)
+
+
+def _pack(points):
+    points = np.asarray(points).reshape(-1, 4)
+    narrow = not points.size or (points.min() >= _INT32.min and points.max() <= _INT32.max)
+    return np.ascontiguousarray(points, dtype="<i4" if narrow else "<i8").tobytes()
+
+
+def _unpack(blob, n_points):
+    """The BLOB's item size follows from its length, so both widths read back."""
+    dtype = "<i8" if n_points and len(blob) == n_points * 32 else "<i4"
+    return np.frombuffer(blob, dtype=dtype).reshape(-1, 4)
+
+
+class ShapeStore:
+    """Thread-safe handle; every thread gets its own SQLite connection."""
+
+    def __init__(self, path=config.STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    # --- writes ---
+    def insert_many(self, records):
+        """Insert persisted records (see app.persistence); existing ids/sources are skipped.
+
+        Records without an id get the next negative one: SQLite's default of
+        MAX(id) + 1 would take ids the live writer is about to issue. Returns
+        how many rows were actually inserted."""
+        rows = [
+            (r.get("id"), r["ts"], r.get("label"), r.get("confidence"), r.get("color"),
+             r.get("device"), len(r["points"]), _pack(r["points"]), r.get("source"))
+            for r in records
+        ]
+        conn = self._conn()
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO shapes (id, ts, label, confidence, color, device, n_points, points, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [row for row in rows if row[0] is not None])
+            conn.executemany(
+                "INSERT OR IGNORE INTO shapes (id, ts, label, confidence, color, device, n_points, points, source) "
+                "VALUES ((SELECT MIN(COALESCE(MIN(id), 0), 0) - 1 FROM shapes), ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row[1:] for row in rows if row[0] is None])
+        return conn.total_changes - before
+
+    def max_id(self):
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM shapes").fetchone()[0]
+
+    # --- reads ---
+    def query(self, label=None, device=None, color=None, since=None, until=None,
+              min_confidence=None, max_confidence=None, cursor=None, limit=100, points=False):
+        """One page of shapes, newest first.
+
+        Returns ``{"items": [...], "next_cursor": str | None}``; pass
+        ``next_cursor`` back as ``cursor`` to fetch the following page.
+        """
+        clauses, args = [], []
+        for column, value in (("label", label), ("device", device), ("color", color)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        for clause, value in (("ts >= ?", parse_time(since)), ("ts < ?", parse_time(until)),
+                              ("confidence >= ?", min_confidence), ("confidence <= ?", max_confidence)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        if cursor is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            args.extend(decode_cursor(cursor))
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = COLUMNS + (", points" if points else "")
+        rows = self._conn().execute(
+            f"SELECT {columns} FROM shapes {where} ORDER BY ts DESC, id DESC LIMIT ?", (*args, limit + 1)
+        ).fetchall()
+
+        items = [self._row(row, points) for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get(self, shape_id):
+        row = self._conn().execute(f"SELECT {COLUMNS}, points FROM shapes WHERE id = ?", (shape_id,)).fetchone()
+        return self._row(row, True) if row else None
+
+    def iter_all(self, page_size=1000, **filters):
+        """Every matching shape, page by page (for streamed exports)."""
+        cursor = None
+        while True:
+            page = self.query(cursor=cursor, limit=page_size, **filters)
+            yield page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def counts(self):
+        return dict(self._conn().execute("SELECT label, COUNT(*) FROM shapes GROUP BY label").fetchall())
+
+    @staticmethod
+    def _row(row, points):
+        item = dict(zip(("id", "ts", "label", "confidence", "color", "device", "n_points"), row))
+        if points:
+            item["points"] = Stroke.from_array(_unpack(row[7], row[6])).to_dicts()
+        return item
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# --- rebuilding from disk ---
+def _legacy_ts(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return datetime.strptime(stem[-15:], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return os.path.getmtime(path)
+
+
+def legacy_paths(shapes_dir):
+    return sorted(glob.glob(os.path.join(shapes_dir, "*.json")))
+
+
+def legacy_record(path):
+    """One old one-file-per-shape capture as a store record, or None if it has no points."""
+    with open(path) as f:
+        data = json.load(f)
+    stroke = Stroke.from_dicts(data.get("points", []))
+    if not stroke:
+        return None
+    return {
+        "ts": _legacy_ts(path),
+        "label": data.get("label"),
+        "confidence": data.get("confidence"),
+        "color": data.get("color") or stroke_color_hex(stroke),
+        "device": data.get("device"),
+        "points": stroke.view(),
+        "source": os.path.abspath(path),
+    }
+
+
+def legacy_records(shapes_dir):
+    """Old one-file-per-shape captures (shapes/shape_*.json) as store records."""
+    for path in legacy_paths(shapes_dir):
+        record = legacy_record(path)
+        if record is not None:
+            yield record
+
+
+def import_all(store, shapes_dir=config.SHAPES_DIR, segment_dir=config.SEGMENT_DIR, batch=1000):
+    """Index every segment record plus the legacy JSON files; safe to re-run.
+
+    Returns how many records were new."""
+    total = 0
+    pending = []
+    for record in read_segments(segment_dir):
+        pending.append(record)
+        if len(pending) >= batch:
+            total += store.insert_many(pending)
+            pending = []
+    total += store.insert_many(pending)
+    # legacy captures have no id: they get negative ones, see insert_many
+    total += store.insert_many(list(legacy_records(shapes_dir)))
+    return total
+
+
+store = ShapeStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the shape history store.")
+    parser.add_argument("command", choices=["import", "stats"])
+    parser.add_argument("--db", default=config.STORE_PATH)
+    parser.add_argument("--shapes-dir", default=config.SHAPES_DIR)
+    parser.add_argument("--segment-dir", default=config.SEGMENT_DIR)
+    args = parser.parse_args()
+
+    db = ShapeStore(args.db)
+    if args.command == "import":
+        start = time.perf_counter()
+        n = import_all(db, args.shapes_dir, args.segment_dir)
+        print(f"[Store] Indexed {n} records into {args.db} in {time.perf_counter() - start:.1f}s")
+    print(f"[Store] {db.counts()}")
+
+
+if __name__ == "__main__":
+    main()
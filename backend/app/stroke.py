@@ -0,0 +1,115 @@
+"""Compact stroke storage used from serial ingestion through to the ML stage.
+
+A stroke is one flat ``array('q')`` of ``x, y, t, c`` per point (32 bytes a
+point instead of a ~200 byte dict). 64-bit because ``t`` is the Arduino's
+``millis()``, which passes 2**31 after about 24.8 days of uptime. The JSON/WebSocket format is still the
+list of ``{"x", "y", "t", "c"}`` dicts, produced on demand by ``to_dicts``.
+"""
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from app.ml.preprocess import points_to_buffer
+
+FIELDS = ("x", "y", "t", "c")
+_TYPECODE = "q"  # C long long: 64-bit everywhere, same layout as np.int64
+
+
+class Stroke:
+    """Growable sequence of (x, y, t, c) int64 points."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data=None):
+        self._data = array(_TYPECODE) if data is None else array(_TYPECODE, data)
+
+    # --- ingestion ---
+    def append(self, x, y, t=0, c=0):
+        """Append one point in place (amortised O(1), no per-point objects kept)."""
+        self._data.extend((x, y, t, c))
+
+    def clear(self):
+        del self._data[:]
+
+    # --- access ---
+    def __len__(self):
+        return len(self._data) // 4
+
+    def __bool__(self):
+        return bool(self._data)
+
+    def __getitem__(self, i):
+        x, y, t, c = self.view()[i]
+        return {"x": int(x), "y": int(y), "t": int(t), "c": int(c)}
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __eq__(self, other):
+        return isinstance(other, Stroke) and self._data == other._data
+
+    def __repr__(self):
+        return f"Stroke({len(self)} points)"
+
+    @property
+    def nbytes(self):
+        return self._data.itemsize * len(self._data)
+
+    def view(self):
+        """Zero-copy (N, 4) int64 NumPy view of the points.
+
+        While a view is alive the stroke cannot grow (the buffer is exported),
+        so only take one once ingestion of the stroke has finished.
+        """
+        return np.frombuffer(self._data, dtype=np.int64).reshape(-1, 4)
+
+    def column(self, name):
+        """One field as a strided (N,) view, e.g. ``stroke.column("c")``."""
+        return self.view()[:, FIELDS.index(name)]
+
+    def dominant_color(self):
+        """Most frequent colour value in the stroke, or None if it is empty."""
+        if not self:
+            return None
+        return Counter(self._data[3::4]).most_common(1)[0][0]
+
+    # --- JSON interop ---
+    def to_dicts(self):
+        """Points in the saved-file / WebSocket format: a list of x/y/t/c dicts.
+
+        Every point gets all four fields, so a stroke built with ``from_dicts``
+        from points without ``c`` comes back with ``"c": 0``."""
+        d = self._data
+        return [{"x": d[i], "y": d[i + 1], "t": d[i + 2], "c": d[i + 3]}
+                for i in range(0, len(d), 4)]
+
+    @classmethod
+    def from_dicts(cls, points):
+        """Build a stroke from x/y/t/c dicts; missing fields default to 0."""
+        return cls(p.get(k, 0) for p in points for k in FIELDS)
+
+    @classmethod
+    def from_array(cls, arr):
+        """Copy an (N, 4) integer array into a new stroke."""
+        stroke = cls()
+        stroke._data.frombytes(np.ascontiguousarray(arr, dtype=np.int64).tobytes())
+        return stroke
+
+
+def as_stroke(points):
+    """Accept a Stroke, an (N, 4) array, or a list of point dicts."""
+    if isinstance(points, Stroke):
+        return points
+    if isinstance(points, np.ndarray):
+        return Stroke.from_array(points)
+    return Stroke.from_dicts(points)
+
+
+def as_array(points):
+    """(N, 4) int64 array for the ML stage; zero-copy when given a Stroke."""
+    if isinstance(points, Stroke):
+        return points.view()
+    if isinstance(points, np.ndarray):
+        return np.ascontiguousarray(points, dtype=np.int64)
+    return points_to_buffer(points)
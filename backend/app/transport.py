@@ -0,0 +1,152 @@
+"""Serial transports and the chunked line reader that feeds app.protocol.
+
+Any object with pyserial's ``read(n)``, ``readline()``, ``in_waiting`` and
+``close()`` can be a transport. Besides real ports this gives us stand-ins to
+benchmark ingestion without hardware:
+
+- ``open_transport("loop://")``: pyserial's in-process loopback
+- ``open_pty_pair()``: a POSIX pseudo-terminal, the far end behaves like a tablet
+- ``ReplayTransport(path)``: replays a recorded serial capture file
+"""
+import os
+import time
+from collections import deque
+
+import serial
+
+MAX_LINE = 64 * 1024  # drop runaway garbage rather than grow forever
+
+
+def open_transport(url, baudrate=9600, timeout=1.0):
+    """Open a real port ("COM3", "/dev/ttyACM0") or any pyserial URL ("loop://", "socket://...")."""
+    return serial.serial_for_url(url, baudrate=baudrate, timeout=timeout)
+
+
+def open_pty_pair():
+    """Create a pseudo-terminal; returns (master_fd, slave_path).
+
+    Write Arduino output to ``master_fd`` and open ``slave_path`` like any
+    serial port. POSIX only.
+    """
+    master_fd, slave_fd = os.openpty()
+    path = os.ttyname(slave_fd)
+    os.close(slave_fd)  # the reader reopens it by path
+    return master_fd, path
+
+
+class ReplayTransport:
+    """Serves a recorded serial capture as if it were arriving on a port.
+
+    ``bytes_per_sec`` throttles delivery (9600 baud is ~960 B/s); ``None``
+    replays as fast as the reader can consume. At end of file reads block for
+    ``timeout`` and return b"", like an idle port.
+    """
+
+    def __init__(self, path, bytes_per_sec=None, timeout=1.0, loop=False):
+        self.path = path
+        self.bytes_per_sec = bytes_per_sec
+        self.timeout = timeout
+        self.loop = loop
+        self._f = open(path, "rb")
+        self._size = os.fstat(self._f.fileno()).st_size
+        self._start = time.monotonic()
+        self._sent = 0
+        self.is_open = True
+
+    def _allowed(self):
+        remaining = self._size - self._f.tell()
+        if self.bytes_per_sec is None:
+            return remaining
+        budget = int((time.monotonic() - self._start) * self.bytes_per_sec) - self._sent
+        return max(0, min(remaining, budget))
+
+    @property
+    def in_waiting(self):
+        return self._allowed()
+
+    def _wait_for_data(self):
+        if self._f.tell() >= self._size and self.loop:
+            self._f.seek(0)
+        if self._allowed():
+            return True
+        time.sleep(self.timeout if self._f.tell() >= self._size else 0.001)
+        return bool(self._allowed())
+
+    def read(self, size=1):
+        if not self._wait_for_data():
+            return b""
+        data = self._f.read(min(size, self._allowed()))
+        self._sent += len(data)
+        return data
+
+    def readline(self):
+        if not self._wait_for_data():
+            return b""
+        line = self._f.readline(self._allowed())  # a partial line when the budget runs out, like a slow port
+        self._sent += len(line)
+        return line
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def close(self):
+        self.is_open = False
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LineReader:
+    """Bulk reads into a reusable bytearray and splits out complete lines.
+
+    Each call to ``read_lines`` does a single ``read(in_waiting or 1)``: it
+    blocks (up to the transport timeout) only while nothing is pending, then
+    drains everything that has arrived in one syscall. Partial lines stay in
+    the buffer until their newline arrives; consumed bytes are dropped once
+    per chunk instead of once per line.
+    """
+
+    def __init__(self, transport, max_chunk=4096):
+        self.transport = transport
+        self.max_chunk = max_chunk
+        self._buf = bytearray()
+        self._pending = deque()
+        self.bytes_read = 0
+
+    def readline(self):
+        """Drop-in for pyserial's readline(): next line, or b"" on timeout."""
+        if not self._pending:
+            self._pending.extend(self.read_lines())
+        return self._pending.popleft() if self._pending else b""
+
+    def read_lines(self):
+        """Read one chunk and return the complete lines in it (without newline)."""
+        data = self.transport.read(min(self.transport.in_waiting or 1, self.max_chunk))
+        if not data:
+            return []
+        self.bytes_read += len(data)
+        return self.feed(data)
+
+    def feed(self, data):
+        """Append raw bytes and return any lines they complete."""
+        buf = self._buf
+        buf += data
+        lines = []
+        start = 0
+        find = buf.find
+        with memoryview(buf) as view:  # one copy per line, straight out of the buffer
+            while True:
+                end = find(b"\n", start)
+                if end < 0:
+                    break
+                lines.append(bytes(view[start:end]))
+                start = end + 1
+        if start:
+            del buf[:start]
+        if len(buf) > MAX_LINE:  # the unterminated tail, whether or not lines came before it
+            buf.clear()
+        return lines
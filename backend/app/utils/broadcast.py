@@ -1,14 +1,218 @@
 # app/utils/broadcast.py
+"""Fan-out of shape events to every WebSocket client.
 
-clients = []
+Each message is serialised once; every client then gets it through its own
+bounded queue drained by a dedicated sender task, so a slow browser only ever
+delays itself. When a client's queue is full the overflow policy decides:
 
-async def broadcast_message(message: str):
-    """Send message to all connected WebSocket clients."""
-    to_remove = []
-    for client in clients:
+- ``drop_oldest`` (default): discard the oldest queued message
+- ``drop_newest``: discard the incoming message
+- ``coalesce``: replace the queued message of the same type (e.g. an older
+  ``shape_partial``), else discard the oldest
+- ``disconnect``: evict the lagging client
+
+Sockets that error or stay stuck past ``send_timeout`` are evicted. All
+bookkeeping happens on the event loop, so no locking is needed.
+
+Clients registered with ``binary=True`` get the compact encoding of a
+message (see app/utils/wire.py) when the publisher provides one, built at
+most once per message and only if such a client is connected.
+
+``relay`` (see app/bus.py) is called with every published message, for a
+producer process that forwards broadcasts to /ws workers elsewhere.
+
+Recent ``shape_result``/``clear`` events are numbered and kept in ``history``
+(see app/utils/history.py) so a client registered with ``replay=True`` starts
+with a snapshot, or with what it missed since its ``since`` cursor.
+"""
+import asyncio
+import functools
+import json
+from collections import deque
+
+from app import config
+from app.utils.history import EventHistory
+
+POLICIES = ("drop_oldest", "drop_newest", "coalesce", "disconnect")
+
+
+class ClientChannel:
+    """Outbound queue and sender task for one WebSocket."""
+
+    def __init__(self, ws, maxsize, policy, send_timeout, binary=False):
+        self.ws = ws
+        self.binary = binary  # wants binary frames where a message has them
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.pending = deque()  # (payload, kind)
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, payload, kind=None):
+        """Queue a message without ever blocking the publisher."""
+        if self.closed:
+            return
+        if len(self.pending) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return
+            if self.policy == "disconnect":
+                self.close()
+                return
+            if self.policy == "coalesce" and kind is not None:
+                for i, (_, queued_kind) in enumerate(self.pending):
+                    if queued_kind == kind:
+                        del self.pending[i]
+                        break
+                else:
+                    self.pending.popleft()
+            else:
+                self.pending.popleft()
+        self.pending.append((payload, kind))
+        self.wakeup.set()
+
+    async def run(self):
+        ws, pending = self.ws, self.pending
+        while not self.closed:
+            if not pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            payload, _ = pending.popleft()
+            send = ws.send_bytes(payload) if isinstance(payload, bytes) else ws.send_text(payload)
+            await asyncio.wait_for(send, self.send_timeout)
+            self.sent += 1
+
+    def close(self):
+        self.closed = True
+        self.pending.clear()
+        self.wakeup.set()
+
+    def stats(self):
+        return {"queued": len(self.pending), "sent": self.sent, "dropped": self.dropped,
+                "format": "binary" if self.binary else "json"}
+
+
+class Broadcaster:
+    def __init__(self, queue_size=config.BROADCAST_QUEUE_SIZE, policy=config.BROADCAST_POLICY,
+                 send_timeout=config.BROADCAST_SEND_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown broadcast policy {policy!r}, expected one of {POLICIES}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.channels = {}  # ws -> ClientChannel
+        self.published = 0
+        self.evicted = 0
+        self.dropped_closed = 0  # drops counted on channels that have since gone away
+        self.relay = None  # relay(kind, message, binary, seq, device) for cross-process fan-out
+        self.history = EventHistory(config.HISTORY_SIZE, config.HISTORY_SNAPSHOT)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def register(self, ws, binary=False, replay=False, since=None):
+        """Start sending to ``ws``. With ``replay`` its queue first gets a ``snapshot``
+        header and the recent events (see EventHistory.replay), in the same step as
+        registering, so nothing published meanwhile is missed or sent twice."""
+        backlog = []
+        if replay:
+            events, complete = self.history.replay(since)
+            backlog.append((json.dumps({"type": "snapshot", "seq": self.history.seq, "since": since,
+                                        "count": len(events), "complete": complete}), "snapshot"))
+            for event in events:
+                payload = self.history.binary(event) if binary and event[4] is not None else event[3]
+                backlog.append((payload, event[1]))
+        # room for the whole replay on top of the live queue
+        channel = ClientChannel(ws, max(self.queue_size, len(backlog)), self.policy, self.send_timeout, binary)
+        channel.pending.extend(backlog)
+        channel.task = asyncio.create_task(self._sender(channel))
+        self.channels[ws] = channel
+        return channel
+
+    async def unregister(self, ws):
+        channel = self.channels.pop(ws, None)
+        if channel is None:
+            return
+        self.dropped_closed += channel.dropped
+        channel.close()
+        if channel.task is not None and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    async def _sender(self, channel):
         try:
-            await client.send_text(message)
-        except Exception:
-            to_remove.append(client)
-    for r in to_remove:
-        clients.remove(r)
+            await channel.run()
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"[Broadcast] ❌ Evicting client: {type(e).__name__}: {e}")
+        # dead, stuck or evicted by the overflow policy
+        if self.channels.get(channel.ws) is channel:
+            self.evicted += 1
+            await self.unregister(channel.ws)
+            try:
+                await channel.ws.close()
+            except Exception:
+                pass
+
+    def publish(self, message, kind=None, binary=None, seq=None, device=None):
+        """Serialise once and queue for every client. Dicts are JSON-encoded and
+        their ``type`` is used as ``kind`` for coalescing. ``binary`` (bytes, or a
+        callable returning them) is what binary clients get instead.
+
+        Events with a ``seq`` (given, or assigned here to dicts of a history kind)
+        go into ``history``; one already there is not sent again."""
+        if isinstance(message, dict):
+            kind = kind or message.get("type")
+            device = device or message.get("device")
+            if seq is None and kind in self.history.kinds:
+                seq = message["seq"] = self.history.next_seq()
+            message = json.dumps(message)
+        if callable(binary):
+            binary = functools.cache(binary)  # built at most once, whoever asks first
+        if seq is not None and not self.history.append(seq, kind, device, message, binary):
+            return
+        self.published += 1
+        encoded = None
+        if self.relay is not None:
+            if binary is not None:
+                encoded = binary() if callable(binary) else binary
+            self.relay(kind, message, encoded, seq, device)
+        for channel in list(self.channels.values()):
+            if channel.binary and binary is not None:
+                if encoded is None:
+                    encoded = binary() if callable(binary) else binary
+                channel.offer(encoded, kind)
+            else:
+                channel.offer(message, kind)
+
+    def stats(self):
+        per_client = [c.stats() for c in self.channels.values()]
+        return {
+            "clients": len(per_client),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "evicted": self.evicted,
+            "queued_total": sum(c["queued"] for c in per_client),
+            "queued_max": max((c["queued"] for c in per_client), default=0),
+            "dropped_total": self.dropped_closed + sum(c["dropped"] for c in per_client),
+            "history": self.history.stats(),
+            "per_client": per_client,
+        }
+
+
+broadcaster = Broadcaster()
+
+
+async def broadcast_message(message, kind=None, binary=None, seq=None, device=None):
+    """Send message (str, bytes or dict) to all connected WebSocket clients.
+
+    Never waits on a client: messages are queued per client and sent by their
+    own tasks. Kept async so existing ``await broadcast_message(...)`` callers work.
+    """
+    broadcaster.publish(message, kind, binary, seq, device)
@@ -0,0 +1,15 @@
+# app/utils/colors.py
+
+
+def rgb565_to_hex(value):
+    """Convert an Arduino RGB565 colour to a #RRGGBB string."""
+    r = ((value >> 11) & 0x1F) << 3
+    g = ((value >> 5) & 0x3F) << 2
+    b = (value & 0x1F) << 3
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def stroke_color_hex(stroke):
+    """Hex colour of the stroke's dominant RGB565 value, or None for an empty stroke."""
+    value = stroke.dominant_color()
+    return rgb565_to_hex(value) if value is not None else None
@@ -0,0 +1,79 @@
+# app/utils/history.py
+"""Ring buffer of recent broadcast events for late-joining /ws clients.
+
+Every ``shape_result`` and ``clear`` gets a sequence number, carried in the
+message itself (``"seq"`` in JSON, a varint in the binary frame), and the
+last ``size`` of them are kept in memory together with their already
+serialised payloads. On connect a client gets either:
+
+- the events after the ``since=<seq>`` cursor it passes, when the buffer
+  still covers it, so a reconnect neither misses nor repeats anything; or
+- a compact snapshot: the newest ``snapshot`` events that are still on
+  screen, i.e. without clears and without shapes a later clear of the same
+  device wiped.
+
+Sequence numbers start from the startup time in milliseconds, so a cursor
+from before a restart reads as a gap instead of silently matching new events.
+"""
+import time
+from collections import deque
+
+
+class EventHistory:
+    def __init__(self, size, snapshot, kinds=("shape_result", "clear")):
+        self.kinds = kinds
+        self.snapshot = snapshot
+        self.events = deque(maxlen=size)  # [seq, kind, device, message, binary]
+        self.seq = int(time.time() * 1000)  # last sequence number assigned or seen
+
+    def __len__(self):
+        return len(self.events)
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def append(self, seq, kind, device, message, binary=None):
+        """Keep one published event; ``binary`` may be a callable, resolved on first replay.
+        False if the event is already here (relayed again after a bus reconnect)."""
+        if self.events and seq <= self.events[-1][0]:
+            return False
+        self.seq = seq
+        if self.events.maxlen:
+            self.events.append([seq, kind, device, message, binary])
+        return True
+
+    def binary(self, event):
+        if callable(event[4]):
+            event[4] = event[4]()
+        return event[4]
+
+    def replay(self, since=None):
+        """(events to send a new client, whether they continue ``since`` exactly)."""
+        events = self.events
+        if since is not None:
+            oldest = events[0][0] if events else self.seq + 1
+            if oldest - 1 <= since <= self.seq:
+                return [e for e in events if e[0] > since], True
+        return self.compact(), since is None
+
+    def compact(self):
+        kept, cleared = [], set()
+        for event in reversed(self.events):
+            if len(kept) >= self.snapshot:
+                break
+            kind, device = event[1], event[2]
+            if kind == "clear":
+                cleared.add(device)
+            elif device not in cleared:
+                kept.append(event)
+        kept.reverse()
+        return kept
+
+    def backlog(self):
+        """Every retained event as (kind, message, binary, seq, device), for a new bus subscriber."""
+        return [(e[1], e[3], self.binary(e), e[0], e[2]) for e in self.events]
+
+    def stats(self):
+        return {"size": self.events.maxlen, "retained": len(self.events), "snapshot": self.snapshot,
+                "seq": self.seq, "oldest": self.events[0][0] if self.events else None}
@@ -0,0 +1 @@
+"""Offline benchmarks for the Sketch2Form backend (run from backend/: python -m benchmarks.<name>)."""
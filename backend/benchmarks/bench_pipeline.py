@@ -0,0 +1,355 @@
+"""Stage-by-stage and end-to-end pipeline benchmark over the recorded corpora.
+
+Replays backend/shapes/*.json (production captures) and
+dataset_collection/raw_data/*.json (hand-labelled recordings) through:
+
+- ``parse``:     parse_line over each stroke's serial lines
+- ``normalize``: ml.normalize_points
+- ``predict``:   ml.predict_shape (result cache off, so every stroke hits invoke())
+- ``persist``:   ShapeWriter.write into a temporary segment dir, including the final flush
+- ``broadcast``: one shape_result to ``--clients`` fake WebSocket clients
+- ``e2e``:       fake serial port -> SerialListener -> inference -> writer -> fake clients
+
+Everything runs offline. Each stage reports throughput and latency
+percentiles. Results are saved as JSON and compared against
+benchmarks/baseline.json, or another ``--baseline``. The exit status is 1 if a
+stage regressed by more than ``--tolerance``, or if an explicit ``--baseline``
+does not exist; without benchmarks/baseline.json the check is skipped.
+Baselines are per machine, so none ships with the repository: record one on
+the machine that runs the check:
+
+    cd backend && python -m benchmarks.bench_pipeline --save-baseline
+    cd backend && python -m benchmarks.bench_pipeline
+    cd backend && python -m benchmarks.bench_pipeline --no-baseline --stages parse normalize
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from app.ml import ml
+from app.ml.cache import result_cache
+from app.persistence import ShapeWriter, shape_record
+from app.protocol import format_point, parse_line
+from app.stroke import Stroke
+from app.transport import LineReader, ReplayTransport
+from app.utils.broadcast import Broadcaster
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPORA = {
+    "captures": os.path.join(BACKEND_DIR, "shapes"),
+    "raw": os.path.join(BACKEND_DIR, "..", "dataset_collection", "raw_data"),
+}
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+STAGES = ("parse", "normalize", "predict", "persist", "broadcast", "e2e")
+P99_NOISE_MS = 1.0  # p99 growth below this is scheduler noise, never a regression
+
+
+# --- corpus ---
+def load_corpus(names=tuple(CORPORA), limit=None):
+    """Every recorded stroke of the named corpora as Stroke objects."""
+    strokes = []
+    for name in names:
+        for path in sorted(glob.glob(os.path.join(CORPORA[name], "*.json"))):
+            with open(path) as f:
+                stroke = Stroke.from_dicts(json.load(f).get("points", []))
+            if stroke:
+                strokes.append(stroke)
+    return strokes[:limit] if limit else strokes
+
+
+def serial_lines(stroke):
+    """The raw lines the Arduino sends for one stroke."""
+    lines = [b"START_SHAPE\r\n"]
+    lines.extend((format_point(x, y, t, c) + "\r\n").encode() for x, y, t, c in stroke.view().tolist())
+    lines.append(b"END_SHAPE\r\n")
+    return lines
+
+
+class FakeWebSocket:
+    """Stands in for a browser: records when each message arrives."""
+
+    def __init__(self, on_message=None):
+        self.received = 0
+        self.on_message = on_message
+
+    async def send_text(self, text):
+        self.received += 1
+        if self.on_message is not None:
+            self.on_message(text)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self):
+        pass
+
+
+def summarize(latencies, elapsed, items):
+    lat = np.asarray(latencies, dtype=np.float64) * 1000.0
+    return {
+        "items": items,
+        "seconds": elapsed,
+        "throughput_per_s": items / elapsed if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": float(np.percentile(lat, 50)) if lat.size else None,
+            "p90": float(np.percentile(lat, 90)) if lat.size else None,
+            "p99": float(np.percentile(lat, 99)) if lat.size else None,
+            "max": float(lat.max()) if lat.size else None,
+        },
+    }
+
+
+def _timed_each(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        began = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - start, len(latencies))
+
+
+# --- stages ---
+def bench_parse(strokes, args):
+    per_stroke = [serial_lines(s) for s in strokes]
+    return _timed_each(lambda lines: [parse_line(line) for line in lines], per_stroke)
+
+
+def bench_normalize(strokes, args):
+    # a fixed length, not ml.seq_len: that would load the model and tie this stage to a runtime
+    return _timed_each(lambda s: ml.normalize_points(s, num_samples=args.seq_len), strokes)
+
+
+def bench_predict(strokes, args):
+    ml.load_model()
+    max_entries, result_cache.max_entries = result_cache.max_entries, 0
+    try:
+        return _timed_each(ml.predict_shape, strokes)
+    finally:
+        result_cache.max_entries = max_entries
+
+
+def bench_persist(strokes, args):
+    async def run(directory):
+        writer = ShapeWriter(directory=directory)
+        await writer.start()
+        latencies = []
+        start = time.perf_counter()
+        for stroke in strokes:
+            began = time.perf_counter()
+            await writer.write(shape_record(stroke, "circle", 0.9, time.time(), "#F80000", "bench"))
+            latencies.append(time.perf_counter() - began)
+        await writer.stop()  # includes the final flush to disk
+        return summarize(latencies, time.perf_counter() - start, len(latencies))
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(directory))
+
+
+def bench_broadcast(strokes, args):
+    async def run():
+        hub = Broadcaster(queue_size=len(strokes) + 1, policy="drop_newest")
+        published = {}  # message text -> publish time
+        arrivals = defaultdict(int)
+        latencies = []
+
+        def on_message(text):
+            arrivals[text] += 1
+            if arrivals[text] == args.clients:  # the last client just got it
+                latencies.append(time.perf_counter() - published[text])
+
+        for _ in range(args.clients):
+            hub.register(FakeWebSocket(on_message))
+        start = time.perf_counter()
+        for i, stroke in enumerate(strokes):
+            text = json.dumps({"type": "shape_result", "id": i, "points": stroke.to_dicts()})
+            published[text] = time.perf_counter()
+            hub.publish(text)
+            await asyncio.sleep(0)
+        while len(latencies) < len(strokes):
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        for ws in list(hub.channels):
+            await hub.unregister(ws)
+        return summarize(latencies, elapsed, len(latencies))
+
+    return asyncio.run(run())
+
+
+def bench_e2e(strokes, args):
+    """Serial bytes in, shape_result out at every fake client."""
+    from app import processor
+    from app.serial_listener import SerialListener
+    from app.utils.broadcast import broadcaster
+
+    def key(stroke_or_points):
+        # first and last points survive ingest simplification, the point count does not
+        first, last = stroke_or_points[0], stroke_or_points[-1]  # Stroke or list of dicts
+        return first["x"], first["y"], first["t"], last["t"]
+
+    async def run(directory, capture_path):
+        loop = asyncio.get_running_loop()
+        # shapes go to a writer of our own; the process-wide one is put back afterwards
+        writer, shared_writer = ShapeWriter(directory=directory), processor.writer
+        processor.writer = writer
+        sent = defaultdict(deque)  # stroke key -> END_SHAPE times
+        latencies = []
+        done = asyncio.Event()
+
+        def on_message(text):
+            message = json.loads(text)
+            if message.get("type") != "shape_result":
+                return
+            k = key(message["points"])
+            counts[k] += 1
+            if counts[k] % args.clients == 0 and sent[k]:
+                latencies.append(time.perf_counter() - sent[k].popleft())
+                if len(latencies) == len(strokes):
+                    loop.call_soon_threadsafe(done.set)
+
+        counts = defaultdict(int)
+        for _ in range(args.clients):
+            broadcaster.register(FakeWebSocket(on_message))
+
+        listener = SerialListener(port="bench", loop=loop, device_id="bench")
+        expected = {key(s) for s in strokes}
+
+        def feed():
+            with ReplayTransport(capture_path, timeout=0.01) as transport:
+                reader = LineReader(transport)
+                seen = 0
+                while seen < len(strokes):
+                    for line in reader.read_lines():
+                        if line.startswith(b"END_SHAPE"):
+                            listener.last_shape_time = 0  # replay faster than the 1 s debounce
+                            if listener._buffer and key(listener._buffer) in expected:
+                                sent[key(listener._buffer)].append(time.perf_counter())
+                            seen += 1
+                        listener.handle_line(line)
+
+        try:
+            start = time.perf_counter()
+            await asyncio.to_thread(feed)
+            await asyncio.wait_for(done.wait(), timeout=60 + len(strokes))
+            elapsed = time.perf_counter() - start
+        finally:
+            await writer.stop()
+            processor.writer = shared_writer
+            for ws in list(broadcaster.channels):
+                await broadcaster.unregister(ws)
+        return summarize(latencies, elapsed, len(latencies))
+
+    with tempfile.TemporaryDirectory() as directory:
+        capture_path = os.path.join(directory, "capture.serial")
+        with open(capture_path, "wb") as f:
+            for stroke in strokes:
+                f.writelines(serial_lines(stroke))
+        with contextlib.redirect_stdout(io.StringIO()):  # the pipeline logs every shape
+            return asyncio.run(run(directory, capture_path))
+
+
+BENCHES = {
+    "parse": bench_parse,
+    "normalize": bench_normalize,
+    "predict": bench_predict,
+    "persist": bench_persist,
+    "broadcast": bench_broadcast,
+    "e2e": bench_e2e,
+}
+
+
+# --- baseline comparison ---
+def compare(results, baseline, tolerance):
+    """Regression messages for stages slower than ``baseline`` by more than ``tolerance``."""
+    failures = []
+    for stage, current in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        if base["throughput_per_s"] and current["throughput_per_s"] < base["throughput_per_s"] * (1 - tolerance):
+            failures.append(f"{stage}: throughput {current['throughput_per_s']:,.1f}/s "
+                            f"< baseline {base['throughput_per_s']:,.1f}/s")
+        p99, base_p99 = current["latency_ms"]["p99"], base["latency_ms"]["p99"]
+        if p99 is not None and base_p99 and p99 > base_p99 * (1 + tolerance) and p99 - base_p99 > P99_NOISE_MS:
+            failures.append(f"{stage}: p99 {p99:.3f} ms > baseline {base_p99:.3f} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--corpus", nargs="+", choices=sorted(CORPORA), default=sorted(CORPORA))
+    parser.add_argument("--limit", type=int, default=None, help="use only the first N strokes")
+    parser.add_argument("--clients", type=int, default=8, help="fake WebSocket clients")
+    parser.add_argument("--seq-len", type=int, default=64, help="resampled length for the normalize stage")
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", default=None,
+                        help="fail if slower than this results file (default: benchmarks/baseline.json if recorded)")
+    parser.add_argument("--no-baseline", action="store_true", help="only measure, compare against nothing")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, default=None,
+                        help="record this run as the baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+    skipped = False
+    if args.save_baseline or args.no_baseline:
+        args.baseline = None  # establishing a baseline, or only measuring
+    elif args.baseline is None:
+        skipped = not os.path.exists(DEFAULT_BASELINE)
+        args.baseline = None if skipped else DEFAULT_BASELINE
+    elif not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}: record one with --save-baseline, or pass --no-baseline")
+
+    strokes = load_corpus(args.corpus, args.limit)
+    print(f"Corpus: {len(strokes)} strokes, {sum(len(s) for s in strokes)} points ({', '.join(args.corpus)})")
+    results = {
+        "meta": {
+            "time": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "corpus": args.corpus,
+            "strokes": len(strokes),
+            "clients": args.clients,
+        },
+        "stages": {},
+    }
+    print(f"  {'stage':10s}{'items/s':>12s}{'p50 ms':>10s}{'p90 ms':>10s}{'p99 ms':>10s}")
+    for stage in args.stages:
+        result = BENCHES[stage](strokes, args)
+        results["stages"][stage] = result
+        lat = result["latency_ms"]
+        print(f"  {stage:10s}{result['throughput_per_s']:>12,.1f}{lat['p50']:>10.3f}{lat['p90']:>10.3f}{lat['p99']:>10.3f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d_%H%M%S") + ".json")
+    for path in filter(None, (output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"  ✅ No stage regressed by more than {args.tolerance:.0%}")
+    elif skipped:
+        print(f"  ⏭️ Baseline check skipped: no {DEFAULT_BASELINE} on this machine, "
+              f"record one with --save-baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Replay the recorded backend/shapes/*.json captures as serial lines and
+compare the old decode + json.loads path with app.protocol.parse_line.
+
+    cd backend && python -m benchmarks.bench_protocol [--repeat 5]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from app.protocol import parse_line, format_point, POINT
+
+SHAPES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shapes")
+
+
+def recorded_lines(shapes_dir=SHAPES_DIR):
+    """Every stored capture as the raw bytes the Arduino would have sent."""
+    lines = []
+    for path in sorted(glob.glob(os.path.join(shapes_dir, "*.json"))):
+        with open(path) as f:
+            points = json.load(f)["points"]
+        lines.append(b"START_SHAPE\r\n")
+        lines.extend((format_point(p["x"], p["y"], p["t"], p["c"]) + "\r\n").encode() for p in points)
+        lines.append(b"END_SHAPE\r\n")
+    return lines
+
+
+def parse_with_json(lines):
+    points = 0
+    for raw in lines:
+        line = raw.decode(errors="ignore").strip()
+        if line in ("START_SHAPE", "END_SHAPE", "CLEARED") or not line:
+            continue
+        try:
+            json.loads(line)
+            points += 1
+        except json.JSONDecodeError:
+            pass
+    return points
+
+
+def parse_with_protocol(lines):
+    points = 0
+    for raw in lines:
+        if parse_line(raw)[0] == POINT:
+            points += 1
+    return points
+
+
+def _best_of(fn, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn(lines)
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes-dir", default=SHAPES_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = recorded_lines(args.shapes_dir)
+    print(f"Replaying {len(lines)} lines from {args.shapes_dir}")
+    results = {}
+    for name, fn in (("json.loads", parse_with_json), ("parse_line", parse_with_protocol)):
+        points, elapsed = _best_of(fn, lines, args.repeat)
+        results[name] = elapsed
+        print(f"  {name:12s}: {points} points in {elapsed * 1000:8.2f} ms "
+              f"({len(lines) / elapsed:,.0f} lines/s)")
+    print(f"  speedup     : {results['json.loads'] / results['parse_line']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
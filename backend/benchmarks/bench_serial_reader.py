@@ -0,0 +1,98 @@
+"""Throughput of readline()-per-line vs chunked LineReader ingestion, without hardware.
+
+The recorded backend/shapes captures are replayed as Arduino serial output
+through a stand-in transport and every line goes through parse_line.
+
+    cd backend && python -m benchmarks.bench_serial_reader [--transport replay|loop|pty]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app.protocol import parse_line
+from app.transport import LineReader, ReplayTransport, open_pty_pair, open_transport
+from benchmarks.bench_protocol import recorded_lines
+
+
+def _line_mode(transport, expected):
+    seen = 0
+    while seen < expected:
+        line = transport.readline()
+        if line:
+            parse_line(line)
+            seen += 1
+
+
+def _chunk_mode(transport, expected):
+    reader = LineReader(transport)
+    seen = 0
+    while seen < expected:
+        for line in reader.read_lines():
+            parse_line(line)
+            seen += 1
+
+
+def _with_replay(data, fn, expected):
+    with tempfile.NamedTemporaryFile(suffix=".serial", delete=False) as f:
+        f.write(data)
+    try:
+        with ReplayTransport(f.name, timeout=0.01) as transport:
+            fn(transport, expected)
+    finally:
+        os.unlink(f.name)
+
+
+def _with_loop(data, fn, expected):
+    transport = open_transport("loop://", timeout=0.01)
+    writer = threading.Thread(target=transport.write, args=(data,))
+    writer.start()
+    try:
+        fn(transport, expected)
+    finally:
+        writer.join()
+        transport.close()
+
+
+def _with_pty(data, fn, expected):
+    master_fd, path = open_pty_pair()
+    transport = open_transport(path, timeout=0.01)
+
+    def write():
+        view = memoryview(data)
+        while view:
+            view = view[os.write(master_fd, view[:4096]):]
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        fn(transport, expected)
+    finally:
+        writer.join()
+        transport.close()
+        os.close(master_fd)
+
+
+TRANSPORTS = {"replay": _with_replay, "loop": _with_loop, "pty": _with_pty}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default="replay")
+    args = parser.parse_args()
+
+    lines = recorded_lines()
+    data = b"".join(lines)
+    run = TRANSPORTS[args.transport]
+    print(f"Replaying {len(lines)} lines ({len(data) / 1024:.0f} KiB) over {args.transport}")
+    for name, fn in (("readline", _line_mode), ("chunked", _chunk_mode)):
+        wall, cpu = time.perf_counter(), time.process_time()
+        run(data, fn, len(lines))
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"  {name:9s}: {wall * 1000:8.1f} ms wall, {cpu * 1000:8.1f} ms CPU "
+              f"({len(lines) / wall:,.0f} lines/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start time and memory of the backend, per TFLite runtime.
+
+Every measurement runs in a fresh interpreter so nothing is already imported:
+
+- ``import``: ``import app.main``, all the lazy backend pays before it serves
+  (the model then loads in the background warm-up)
+- ``eager``:  import plus loading the model, what startup cost when importing
+  app.ml.ml loaded the model
+- ``load``:   import plus loading the model and one inference (first shape / warm-up)
+
+Each runtime ends with how much sooner the lazy backend starts serving than
+an eager one.
+
+    cd backend && python -m benchmarks.bench_startup [--runs 3] [--runtime auto tensorflow ...]
+
+Runtimes that aren't installed are skipped.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, os, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        return None
+
+start = time.perf_counter()
+import app.main
+result = {"import_s": time.perf_counter() - start, "import_rss_mb": rss_mb()}
+if sys.argv[1] in ("eager", "load"):
+    from app.ml import ml
+    interp = ml.load_model()
+    result.update(eager_s=time.perf_counter() - start, eager_rss_mb=rss_mb(), runtime=ml.RUNTIME)
+if sys.argv[1] == "load":
+    import numpy as np
+    ml.run_inference(interp, np.zeros((1, ml.seq_len, ml.feat_dim), dtype=np.float32), cache=None)
+    result.update(load_s=time.perf_counter() - start, load_rss_mb=rss_mb())
+print("BENCH " + json.dumps(result))
+"""
+
+
+def measure(phase, runtime):
+    env = dict(os.environ, SKETCH2FORM_TFLITE_RUNTIME=runtime)
+    proc = subprocess.run([sys.executable, "-c", CHILD, phase], env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    last = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+    raise RuntimeError(last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--runtime", nargs="+", default=["auto", "tflite_runtime", "tensorflow"])
+    args = parser.parse_args()
+
+    print(f"{'runtime':<22}{'phase':<8}{'time (s)':>10}{'RSS (MB)':>10}")
+    for runtime in args.runtime:
+        medians = {}
+        for phase in ("import", "eager", "load"):
+            try:
+                samples = [measure(phase, runtime) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"{runtime:<22}{phase:<8}  skipped: {e}")
+                break
+            seconds = medians[phase] = statistics.median(s[f"{phase}_s"] for s in samples)
+            rss = [s[f"{phase}_rss_mb"] for s in samples if s[f"{phase}_rss_mb"] is not None]
+            label = f"{runtime}->{samples[0]['runtime']}" if phase != "import" and runtime == "auto" else runtime
+            print(f"{label:<22}{phase:<8}{seconds:>10.3f}{(statistics.median(rss) if rss else float('nan')):>10.1f}")
+        if "eager" in medians:
+            print(f"{'':<22}serving after {medians['import']:.3f} s lazily vs {medians['eager']:.3f} s eagerly "
+                  f"({medians['eager'] / medians['import']:.1f}x sooner)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Accuracy and latency of the geometric fast path cascaded in front of the model.
+
+Classifies every stroke of two corpora with the geometric classifier and
+with the model, timing both:
+
+- ``raw``: the hand-labelled recordings in dataset_collection/raw_data/.
+- ``captures``: the production captures in backend/shapes/, labelled by the
+  deployed model rather than a person, split in time order. The earlier
+  ``--tune-fraction`` is a tuning set like ``raw``; the rest is held out.
+
+The thresholds and SKETCH2FORM_FASTPATH_LABELS were tuned on ``raw`` and the
+earlier captures only, so only the held-out block says how the fast path
+will do. For each threshold it reports how many strokes the fast path would
+answer, how often those answers match the corpus label and the model, and
+the accuracy and mean latency of the cascade against the model alone. Then,
+at SKETCH2FORM_FASTPATH_THRESHOLD, it breaks agreement with the corpus label
+down per geometric label (answered ones marked *) and lists the commonest
+model -> fast path disagreements. Check the held-out block before enabling
+SKETCH2FORM_FASTPATH or adding labels:
+
+    cd backend && python -m benchmarks.eval_fastpath
+    cd backend && python -m benchmarks.eval_fastpath --corpus captures --thresholds 0.9 0.95 0.98
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from app import config
+from app.ml import ml
+from app.ml.geometry import GeometricClassifier
+from app.ml.preprocess import Preprocessor
+from app.ml.registry import load_version
+from benchmarks.eval_simplify import BACKEND_DIR, RAW_DIR, load_labelled
+
+CAPTURES_DIR = os.path.join(BACKEND_DIR, "shapes")
+
+
+def _timed(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def evaluate(name, samples, version, model, fast, args):
+    rows = []  # (label, model label, model s, fast label, fast confidence, fast s)
+    for label, stroke in samples:
+        (model_label, _), model_s = _timed(model, stroke, args.repeat)
+        (fast_label, confidence), fast_s = _timed(fast, stroke, args.repeat)
+        rows.append((label, model_label, model_s, fast_label, confidence, fast_s))
+
+    labels = np.array([r[0] for r in rows])
+    model_labels = np.array([r[1] for r in rows])
+    model_ms = np.array([r[2] for r in rows]) * 1000.0
+    fast_labels = np.array([r[3] or "" for r in rows])
+    confidence = np.array([r[4] for r in rows])
+    fast_ms = np.array([r[5] for r in rows]) * 1000.0
+
+    answerable = np.isin(fast_labels, args.labels) & np.isin(fast_labels, version.labels)
+    print(f"{name}: {len(rows)} strokes")
+    print(f"  model only: accuracy {np.mean(model_labels == labels):.3f}, "
+          f"mean {model_ms.mean():.3f} ms; geometric features mean {fast_ms.mean():.3f} ms")
+    print(f"  {'threshold':>9}{'hits':>6}{'hit rate':>10}{'hit acc':>9}{'agree':>8}{'cascade acc':>13}"
+          f"{'mean ms':>9}{'speed-up':>10}")
+    for threshold in args.thresholds:
+        hit = (confidence >= threshold) & answerable
+        answered = np.where(hit, fast_labels, model_labels)
+        # a miss pays for the features and then the model
+        cascade_ms = fast_ms + np.where(hit, 0.0, model_ms)
+        hit_acc = f"{np.mean(fast_labels[hit] == labels[hit]):.3f}" if hit.any() else "-"
+        agree = f"{np.mean(fast_labels[hit] == model_labels[hit]):.3f}" if hit.any() else "-"
+        print(f"  {threshold:>9.2f}{int(hit.sum()):>6}{hit.mean():>10.1%}{hit_acc:>9}{agree:>8}"
+              f"{np.mean(answered == labels):>13.3f}{cascade_ms.mean():>9.3f}"
+              f"{model_ms.mean() / cascade_ms.mean():>9.2f}x")
+
+    confident = confidence >= config.FASTPATH_THRESHOLD
+    by_label = []
+    for label in sorted(set(fast_labels[confident]) - {""}):
+        picked = confident & (fast_labels == label)
+        mark = "*" if label in args.labels else ""
+        by_label.append(f"{label}{mark} {int(np.sum(labels[picked] == label))}/{int(picked.sum())}")
+    print(f"  agrees with label at {config.FASTPATH_THRESHOLD:.2f}: " + (", ".join(by_label) or "-"))
+    hit = confident & answerable
+    changed = Counter(zip(model_labels[hit], fast_labels[hit]))
+    disagreements = sorted(((n, pair) for pair, n in changed.items() if pair[0] != pair[1]), reverse=True)
+    if disagreements:
+        print(f"  model -> fast path at {config.FASTPATH_THRESHOLD:.2f}: "
+              + ", ".join(f"{old}->{new} {n}" for n, (old, new) in disagreements[:5]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--thresholds", type=float, nargs="+",
+                        default=sorted({0.5, 0.7, 0.8, 0.9, 0.95, config.FASTPATH_THRESHOLD}))
+    parser.add_argument("--model", default=ml.MODEL_PATH)
+    parser.add_argument("--corpus", nargs="+", choices=("raw", "captures"), default=["raw", "captures"])
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--captures-dir", default=CAPTURES_DIR)
+    parser.add_argument("--tune-fraction", type=float, default=0.5,
+                        help="leading share of the captures used for tuning, the rest is held out")
+    parser.add_argument("--labels", nargs="+", default=list(config.FASTPATH_LABELS),
+                        help="labels the fast path may answer")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per stroke (best is kept)")
+    args = parser.parse_args()
+
+    version = load_version(args.model)
+    interp = version.create_interpreter()
+    preprocess = Preprocessor(version.seq_len)
+    geometric = GeometricClassifier(enabled=True)
+
+    def model(stroke):
+        return version.run(interp, preprocess(stroke.view()), cache=None)
+
+    def fast(stroke):
+        return geometric.score(stroke.view())
+
+    print(version.name)
+    print(f"answering: {', '.join(args.labels)}")
+    for key in args.corpus:
+        directory = args.raw_dir if key == "raw" else args.captures_dir
+        samples = load_labelled(directory)  # sorted by file name, i.e. capture time
+        if not samples:
+            sys.exit(f"No labelled recordings in {directory}")
+        if key == "raw":
+            evaluate("raw (hand labels, tuning set)", samples, version, model, fast, args)
+            continue
+        split = int(len(samples) * args.tune_fraction)
+        if split:
+            evaluate(f"captures 1-{split} (model labels, tuning set)", samples[:split],
+                     version, model, fast, args)
+        if split < len(samples):
+            evaluate(f"captures {split + 1}-{len(samples)} (model labels, held out)", samples[split:],
+                     version, model, fast, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Accuracy, size and latency of float and quantized model variants on held-out data.
+
+Runs every model over the rows of dataset_collection/processed/shapes_X.npy
+that the notebook (and shape_classifier_model/export_tflite.py) held out for
+testing. Rows go through the same quantize/dequantize path as production
+inference. For each model it reports accuracy, agreement with the first
+model, file size and per-inference latency, then names the fastest variant
+whose accuracy stays within ``--tolerance`` of the first model:
+
+    cd backend && python -m benchmarks.eval_quantized
+    cd backend && python -m benchmarks.eval_quantized app/ml/shape_classifier.tflite \\
+        app/ml/shape_classifier_int8.tflite --tolerance 0.02
+
+Without model arguments it compares the deployed model with every exported
+``shape_classifier_*.tflite`` variant in the model directory.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+from app import config
+from app.ml import ml
+from app.ml.registry import load_version
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSED_DIR = os.path.join(BACKEND_DIR, "..", "dataset_collection", "processed")
+
+
+def held_out(processed_dir, all_rows=False):
+    X = np.load(os.path.join(processed_dir, "shapes_X.npy")).astype(np.float32)
+    y = np.load(os.path.join(processed_dir, "shapes_y.npy"))
+    if all_rows:
+        return X, y
+    try:
+        from sklearn.model_selection import train_test_split
+    except ImportError:
+        sys.exit("The held-out split needs scikit-learn (pip install scikit-learn), or pass --all")
+    # the notebook's split, so rows the model was trained on are not scored
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    return X_test, y_test
+
+
+def evaluate(path, X, repeat):
+    """(version, predicted labels, seconds per inference) for one model file."""
+    version = load_version(path)
+    interp = version.create_interpreter()
+    predicted, seconds = [], []
+    for row in X:
+        x = row[None]
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            label, _ = ml.run_inference(interp, x, cache=None, labels=version.labels)
+            best = min(best, time.perf_counter() - start)
+        predicted.append(label)
+        seconds.append(best)
+    return version, np.array(predicted), np.array(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("models", nargs="*", help="model files; the first is the reference")
+    parser.add_argument("--processed-dir", default=PROCESSED_DIR)
+    parser.add_argument("--all", action="store_true", help="score every row, not only the held-out split")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="accuracy a variant may lose")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per row (best is kept)")
+    args = parser.parse_args()
+
+    models = args.models or [ml.MODEL_PATH] + sorted(
+        glob.glob(os.path.join(config.MODEL_DIR, "shape_classifier_*.tflite")))
+    X, y = held_out(args.processed_dir, args.all)
+    truth = np.array(ml.LABELS)[y]
+    print(f"{len(X)} {'rows' if args.all else 'held-out rows'} from {args.processed_dir}")
+
+    results = []  # (path, variant, size KB, accuracy, agreement, mean ms, p99 ms)
+    reference = None
+    for path in models:
+        version, predicted, seconds = evaluate(path, X, args.repeat)
+        if reference is None:
+            reference = predicted
+        ms = seconds * 1000.0
+        results.append((path, version.variant or version.dtype, os.path.getsize(path) / 1024,
+                        np.mean(predicted == truth), np.mean(predicted == reference),
+                        ms.mean(), np.percentile(ms, 99)))
+
+    print(f"  {'model':<40}{'variant':>9}{'size KB':>9}{'accuracy':>10}{'agree':>8}{'mean ms':>9}{'p99 ms':>9}")
+    for path, variant, size, accuracy, agree, mean_ms, p99_ms in results:
+        print(f"  {os.path.basename(path):<40}{variant:>9}{size:>9.1f}{accuracy:>10.3f}{agree:>8.3f}"
+              f"{mean_ms:>9.3f}{p99_ms:>9.3f}")
+
+    floor = results[0][3] - args.tolerance
+    eligible = [r for r in results if r[3] >= floor]
+    best = min(eligible, key=lambda r: r[5])
+    print(f"Fastest within {args.tolerance:.3f} of {os.path.basename(results[0][0])}'s accuracy: "
+          f"{os.path.basename(best[0])} ({best[1]}, {best[5]:.3f} ms, accuracy {best[3]:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Check that ingest simplification leaves classification unchanged.
+
+Classifies every labelled recording in dataset_collection/raw_data/ once as
+recorded and once per simplification setting, then reports the share of
+points kept, accuracy against the recorded label and agreement with the
+unsimplified prediction. The exit status is 1 if any setting loses more than
+``--tolerance`` accuracy:
+
+    cd backend && python -m benchmarks.eval_simplify
+    cd backend && python -m benchmarks.eval_simplify --mode rdp --epsilon 0.5 1 2
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+from app import config
+from app.ml import ml
+from app.ml.preprocess import Preprocessor
+from app.ml.registry import load_version
+from app.simplify import MODES, Simplifier
+from app.stroke import Stroke
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DIR = os.path.join(BACKEND_DIR, "..", "dataset_collection", "raw_data")
+
+
+def load_labelled(raw_dir=RAW_DIR):
+    """(label, Stroke) for every recording that has both."""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(raw_dir, "*.json"))):
+        with open(path) as f:
+            data = json.load(f)
+        stroke = Stroke.from_dicts(data.get("points", []))
+        if data.get("label") and stroke:
+            samples.append((data["label"], stroke))
+    return samples
+
+
+def evaluate(samples, simplifier, classify):
+    """Kept-point ratio, accuracy and agreement with the unsimplified predictions."""
+    correct = agreed = points_in = points_out = 0
+    for label, stroke, reference in samples:
+        reduced = simplifier(stroke)
+        predicted, _ = classify(reduced)
+        points_in += len(stroke)
+        points_out += len(reduced)
+        correct += predicted == label
+        agreed += predicted == reference
+    return {
+        "kept": points_out / points_in if points_in else 1.0,
+        "accuracy": correct / len(samples),
+        "agreement": agreed / len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, default=config.SIMPLIFY)
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[config.SIMPLIFY_EPSILON],
+                        help="RDP tolerance(s) in pixels to compare (rdp mode)")
+    parser.add_argument("--model", default=ml.MODEL_PATH)
+    parser.add_argument("--raw-dir", default=RAW_DIR)
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="accuracy that may be lost before failing (0.01 = one point)")
+    args = parser.parse_args()
+
+    samples = load_labelled(args.raw_dir)
+    if not samples:
+        sys.exit(f"No labelled recordings in {args.raw_dir}")
+    version = load_version(args.model)
+    interp = version.create_interpreter()
+    preprocess = Preprocessor(version.seq_len)
+
+    def classify(stroke):
+        return version.run(interp, preprocess(stroke.view()), cache=None)
+
+    references = [classify(stroke)[0] for _, stroke in samples]
+    baseline = sum(ref == label for ref, (label, _) in zip(references, samples)) / len(samples)
+    samples = [(label, stroke, ref) for (label, stroke), ref in zip(samples, references)]
+    print(f"{len(samples)} labelled strokes, {version.name}: accuracy as recorded {baseline:.3f}")
+    print(f"  {'setting':<16}{'kept':>8}{'accuracy':>10}{'agreement':>11}")
+
+    settings = [(args.mode, eps) for eps in args.epsilon] if args.mode == "rdp" else [(args.mode, 0.0)]
+    failed = False
+    for mode, epsilon in settings:
+        result = evaluate(samples, Simplifier(mode, epsilon), classify)
+        name = f"{mode} {epsilon:g}px" if mode == "rdp" else mode
+        lost = baseline - result["accuracy"] > args.tolerance
+        failed |= lost
+        print(f"  {name:<16}{result['kept']:>8.1%}{result['accuracy']:>10.3f}{result['agreement']:>11.3f}"
+              + ("  ❌ accuracy dropped" if lost else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""Synthetic tablets and /ws clients for stress-testing a running backend.
+
+Starts the backend with ``--tablets`` emulated Arduinos attached. Each one speaks
+the protocol of arduino/sketch2Form_final.ino: ``START_SHAPE``, one
+``{"x":..,"y":..,"t":millis(),"c":..}`` line per point, ``END_SHAPE``, and
+``CLEARED`` every ``--clear-every`` shapes, all terminated by ``\\r\\n``.
+Tablets draw strokes recorded in backend/shapes at ``--point-rate`` points per
+second. Shapes are picked by ``--mix`` label weights and replayed as recorded or
+perturbed (``--mode perturb``: random scale, rotation, offset and jitter).
+At the same time ``--clients`` /ws connections, ``--binary-share`` of them on
+the binary encoding, receive every broadcast. For each delivery the generator
+measures the latency from the shape's first point being written to the
+shape_result arriving, and from END_SHAPE to the shape_result arriving.
+
+Transports:
+
+- ``pty`` (POSIX): one pseudo-terminal per tablet. The backend is a uvicorn
+  subprocess reading them through SKETCH2FORM_SERIAL_PORTS, exactly as it
+  reads real tablets.
+- ``inproc``: the backend runs in a thread of this process on pyserial
+  ``loop://`` ports. It works on any OS, but the clients and the server then
+  share one interpreter, so its latencies read higher.
+
+    cd backend && python -m benchmarks.loadgen --tablets 8 --clients 200 --duration 60
+    cd backend && python -m benchmarks.loadgen --transport inproc --mode perturb --mix circle=2,square=1
+
+The backend keeps its history in a temporary directory. Shapes are at least
+``--pause`` seconds apart per tablet because SerialListener ignores an
+END_SHAPE within 1 s of the previous one. At 9600 baud a real tablet manages
+about 25 points/s, the default rate.
+Needs websockets and uvicorn (backend/requirements.txt).
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from app.protocol import format_point
+from app.transport import open_pty_pair
+from app.utils.wire import SHAPE_RESULT, SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON, decode_shape_result
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSPORTS = ("pty", "inproc")
+HOST = "127.0.0.1"
+SCREEN = (320, 480)  # the sketch's TFT, see arduino/sketch2Form_final.ino
+PERTURB_SCALE = 0.15  # +/- relative size
+PERTURB_ROTATION = np.radians(15.0)  # +/- around the stroke's centre
+PERTURB_SHIFT = 20.0  # +/- pixels
+MESSAGE_CACHE = 4096  # distinct payloads remembered, see Receiver.on_message
+
+_stdout = sys.stdout  # progress still reaches the terminal while the in-process backend's output is redirected
+
+
+def log(*args):
+    print("[LoadGen]", *args, file=_stdout, flush=True)
+
+
+# --- tablets ---
+class Corpus:
+    """Recorded strokes by label; ``draw`` picks one following the mix."""
+
+    def __init__(self, shapes_dir, mix=None, mode="replay", jitter=1.5):
+        self.mode = mode
+        self.jitter = jitter
+        self.strokes = defaultdict(list)
+        for path in sorted(glob.glob(os.path.join(shapes_dir, "*.json"))):
+            with open(path) as f:
+                data = json.load(f)
+            points = data.get("points") or []
+            if points:
+                rows = [(p["x"], p["y"], p["t"], p.get("c", 0)) for p in points]
+                self.strokes[data.get("label")].append(np.array(rows, dtype=np.int64))
+        if not self.strokes:
+            sys.exit(f"No recorded strokes in {shapes_dir}")
+        weights = mix or {label: len(strokes) for label, strokes in self.strokes.items()}
+        missing = sorted(set(weights) - set(self.strokes))
+        if missing:
+            sys.exit(f"No recorded {', '.join(missing)} strokes in {shapes_dir} "
+                     f"(have {', '.join(sorted(map(str, self.strokes)))})")
+        self.labels = list(weights)
+        total = float(sum(weights.values()))
+        self.weights = [weights[label] / total for label in self.labels]
+
+    def __len__(self):
+        return sum(len(strokes) for strokes in self.strokes.values())
+
+    def draw(self, rng):
+        strokes = self.strokes[self.labels[rng.choice(len(self.labels), p=self.weights)]]
+        rows = strokes[rng.integers(len(strokes))]
+        return self.perturb(rows, rng) if self.mode == "perturb" else rows
+
+    def perturb(self, rows, rng):
+        xy = rows[:, :2].astype(np.float64)
+        centre = xy.mean(axis=0)
+        angle = rng.uniform(-PERTURB_ROTATION, PERTURB_ROTATION)
+        cos, sin = np.cos(angle), np.sin(angle)
+        scale = rng.uniform(1 - PERTURB_SCALE, 1 + PERTURB_SCALE)
+        xy = (xy - centre) @ (scale * np.array([[cos, sin], [-sin, cos]])) + centre
+        xy += rng.uniform(-PERTURB_SHIFT, PERTURB_SHIFT, 2) + rng.normal(0.0, self.jitter, xy.shape)
+        out = rows.copy()
+        out[:, 0] = np.clip(np.rint(xy[:, 0]), 0, SCREEN[0] - 1)
+        out[:, 1] = np.clip(np.rint(xy[:, 1]), 0, SCREEN[1] - 1)
+        return out
+
+
+class Tablet(threading.Thread):
+    """One emulated Arduino: draws shapes at ``point_rate`` and writes their serial lines."""
+
+    def __init__(self, device_id, write, corpus, receiver, args, seed):
+        super().__init__(name=f"tablet-{device_id}", daemon=True)
+        self.device_id = device_id
+        self.write = write
+        self.corpus = corpus
+        self.receiver = receiver
+        self.interval = 1.0 / args.point_rate
+        self.pause = args.pause
+        self.clear_every = args.clear_every
+        self.max_shapes = args.shapes
+        self.rng = np.random.default_rng(seed)
+        self.booted = time.perf_counter() - self.rng.uniform(1.0, 60.0)  # t is millis() since power-on
+        self.stopping = threading.Event()
+        self.shapes = self.points = self.clears = 0
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stopping.is_set() and (not self.max_shapes or self.shapes < self.max_shapes):
+                self.draw(self.corpus.draw(self.rng))
+                self.stopping.wait(self.pause)
+        except OSError as e:  # the backend went away
+            self.error = str(e)
+
+    def draw(self, rows):
+        self.write(b"START_SHAPE\r\n")
+        start = time.perf_counter()
+        key = None
+        i = 0
+        while i < len(rows):
+            now = time.perf_counter()
+            due = start + i * self.interval
+            if due > now:
+                time.sleep(due - now)
+                now = time.perf_counter()
+            # every point due by now goes out in one write, as the UART would have them queued
+            lines = []
+            while i < len(rows) and start + i * self.interval <= now:
+                x, y, _, c = rows[i].tolist()
+                t = int((start + i * self.interval - self.booted) * 1000)
+                lines.append(format_point(x, y, t, c) + "\r\n")
+                if key is None:
+                    key = (self.device_id, t)
+                    self.receiver.sent[key] = [time.perf_counter(), None]
+                i += 1
+            self.write("".join(lines).encode())
+        self.write(b"END_SHAPE\r\n")
+        self.receiver.sent[key][1] = time.perf_counter()
+        self.points += len(rows)
+        self.shapes += 1
+        if self.clear_every and self.shapes % self.clear_every == 0:
+            self.write(b"CLEARED\r\n")
+            self.clears += 1
+
+
+def _write_fd(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+# --- backend under test ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def _backend_env(workdir, ports):
+    """History in ``workdir``, so a load test never lands in the real shapes/."""
+    return {
+        "SKETCH2FORM_SERIAL_PORTS": ",".join(f"{device_id}={port}" for device_id, port in ports),
+        "SKETCH2FORM_SHAPES_DIR": workdir,
+        "SKETCH2FORM_SEGMENT_DIR": os.path.join(workdir, "segments"),
+        "SKETCH2FORM_STORE_PATH": os.path.join(workdir, "shapes.db"),
+    }
+
+
+class PtyBackend:
+    """uvicorn subprocess reading one pseudo-terminal per tablet."""
+
+    def __init__(self, device_ids, workdir, log_path=None):
+        import tty
+
+        self.port = _free_port()
+        self.masters = {}
+        ports = []
+        for device_id in device_ids:
+            master_fd, path = open_pty_pair()
+            tty.setraw(master_fd)  # no echo or newline translation before the backend opens it
+            self.masters[device_id] = master_fd
+            ports.append((device_id, path))
+        self.log = open(log_path or os.devnull, "w")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", HOST, "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env={**os.environ, **_backend_env(workdir, ports)},
+            stdout=self.log, stderr=subprocess.STDOUT)
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def writer(self, device_id):
+        fd = self.masters[device_id]
+        return lambda data: _write_fd(fd, data)
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        for fd in self.masters.values():
+            os.close(fd)
+        self.log.close()
+
+
+class InProcessBackend:
+    """The backend app on a uvicorn thread, with a pyserial loop:// port per tablet."""
+
+    def __init__(self, device_ids, workdir, log_path=None):
+        os.environ.update(_backend_env(workdir, [(device_id, "loop://") for device_id in device_ids]))
+        import uvicorn
+        from app import main as backend  # after the environment: app.config reads it at import
+
+        self.backend = backend
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(backend.app, host=HOST, port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="backend", daemon=True)
+        self.thread.start()
+
+    def alive(self):
+        return self.thread.is_alive()
+
+    def writer(self, device_id):
+        devices = self.backend.devices
+        return lambda data: devices.devices[device_id].transport.write(data)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=15)
+
+
+BACKENDS = {"pty": PtyBackend, "inproc": InProcessBackend}
+
+
+def _get_json(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):  # HTTPError (503 while warming up) included
+        return None
+
+
+async def wait_ready(backend, base_url, device_ids, timeout):
+    """Until the model is loaded and every tablet's port is open."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not backend.alive():
+            sys.exit("The backend exited during startup (see --server-log)")
+        health = await asyncio.to_thread(_get_json, f"{base_url}/health")
+        devices = await asyncio.to_thread(_get_json, f"{base_url}/devices") if health else None
+        if health and health.get("ready") and devices is not None:
+            connected = {dev["device"] for dev in devices if dev["connected"]}
+            if connected >= set(device_ids):
+                return
+        await asyncio.sleep(0.2)
+    sys.exit(f"The backend was not ready after {timeout:.0f}s")
+
+
+# --- /ws clients ---
+class Receiver:
+    """Matches every shape_result the clients get to the tablet shape that produced it.
+
+    Ingest simplification keeps a stroke's first point, and its ``t`` is unique
+    per tablet, so (device, first t) identifies a shape in both encodings."""
+
+    def __init__(self):
+        self.sent = {}  # (device, first t) -> [first point written, END_SHAPE written], filled by tablets
+        self.deliveries = Counter()
+        self.from_first, self.from_end = [], []  # seconds, one per delivery
+        self.received = Counter()  # message type -> count
+        self.unmatched = 0
+        self.connected = 0
+        self.failed = 0
+        self.last_arrival = None
+        self._keys = {}
+
+    def _key(self, data):
+        if isinstance(data, bytes):
+            if data[:1] != bytes([SHAPE_RESULT]):
+                return "binary", None
+            message = decode_shape_result(data)
+        else:
+            message = json.loads(data)
+        kind = message.get("type")
+        if kind != "shape_result" or not message.get("points"):
+            return kind, None
+        return kind, (message.get("device"), message["points"][0]["t"])
+
+    def on_message(self, data, now):
+        # all clients get the same payload, so each distinct one is decoded only once
+        cached = self._keys.get(data)
+        if cached is None:
+            if len(self._keys) >= MESSAGE_CACHE:
+                self._keys.clear()
+            cached = self._keys[data] = self._key(data)
+        kind, key = cached
+        self.received[kind] += 1
+        if kind != "shape_result":
+            return
+        times = self.sent.get(key)
+        if times is None:
+            self.unmatched += 1
+            return
+        self.deliveries[key] += 1
+        self.from_first.append(now - times[0])
+        self.from_end.append(now - times[1])
+        self.last_arrival = now
+
+
+async def run_client(url, binary, receiver, handshakes):
+    import websockets
+
+    subprotocol = SUBPROTOCOL_BINARY if binary else SUBPROTOCOL_JSON
+    try:
+        async with handshakes:
+            ws = await websockets.connect(url, subprotocols=[subprotocol], max_size=None,
+                                          open_timeout=60, ping_interval=None)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+        receiver.failed += 1
+        log(f"⚠️ /ws connect failed: {e}")
+        return
+    receiver.connected += 1
+    try:
+        async for data in ws:
+            receiver.on_message(data, time.perf_counter())
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        receiver.connected -= 1
+        await ws.close()
+
+
+# --- run ---
+def parse_mix(spec):
+    """"circle=2,square=1" -> {"circle": 2.0, "square": 1.0}."""
+    mix = {}
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        label, _, weight = item.partition("=")
+        mix[label] = float(weight or 1)
+    return mix or None
+
+
+async def run(args, workdir):
+    device_ids = [f"tablet{i:02d}" for i in range(args.tablets)]
+    corpus = Corpus(args.shapes_dir, parse_mix(args.mix), args.mode, args.jitter)
+    log(f"{len(corpus)} recorded strokes, mix {', '.join(f'{label}={w:.2f}' for label, w in zip(corpus.labels, corpus.weights))}, "
+        f"{args.mode} mode")
+    backend = BACKENDS[args.transport](device_ids, workdir, args.server_log)
+    from benchmarks.bench_pipeline import summarize  # imports app.config: only once the backend set the environment
+
+    base_url = f"http://{HOST}:{backend.port}"
+    receiver = Receiver()
+    clients = []
+    try:
+        await wait_ready(backend, base_url, device_ids, args.startup_timeout)
+        handshakes = asyncio.Semaphore(64)
+        binary_clients = round(args.clients * args.binary_share)
+        clients = [asyncio.create_task(run_client(f"ws://{HOST}:{backend.port}/ws", i < binary_clients,
+                                                  receiver, handshakes))
+                   for i in range(args.clients)]
+        while receiver.connected + receiver.failed < args.clients:
+            await asyncio.sleep(0.05)
+        audience = receiver.connected
+        log(f"✅ Backend ready on {base_url} ({args.transport}); {audience} /ws clients connected, "
+            f"{binary_clients} binary")
+
+        tablets = [Tablet(device_id, backend.writer(device_id), corpus, receiver, args, args.seed + i)
+                   for i, device_id in enumerate(device_ids)]
+        start = time.perf_counter()
+        for tablet in tablets:
+            tablet.start()
+        last_report = start
+        while time.perf_counter() - start < args.duration and any(t.is_alive() for t in tablets):
+            await asyncio.sleep(0.25)
+            now = time.perf_counter()
+            if now - last_report >= 5.0:
+                last_report = now
+                lat = summarize(receiver.from_end[-10000:], 1, 0)["latency_ms"]
+                log(f"{now - start:5.0f}s | {sum(t.shapes for t in tablets):,} shapes sent | "
+                    f"{sum(receiver.deliveries.values()):,} delivered | END_SHAPE -> /ws p50 "
+                    f"{lat['p50'] or 0:.1f} ms, p99 {lat['p99'] or 0:.1f} ms")
+        for tablet in tablets:
+            tablet.stopping.set()
+        await asyncio.to_thread(lambda: [tablet.join() for tablet in tablets])
+        sending = time.perf_counter() - start
+
+        deadline = time.perf_counter() + args.drain
+        while time.perf_counter() < deadline and any(
+                receiver.deliveries[key] < audience for key in list(receiver.sent)):
+            await asyncio.sleep(0.05)
+        elapsed = (receiver.last_arrival or time.perf_counter()) - start
+        broadcast = await asyncio.to_thread(_get_json, f"{base_url}/broadcast/stats") or {}
+        broadcast.pop("per_client", None)
+        devices = await asyncio.to_thread(_get_json, f"{base_url}/devices") or []
+    finally:
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        backend.stop()
+
+    shapes = len(receiver.sent)
+    delivered = sum(receiver.deliveries.values())
+    points = sum(t.points for t in tablets)
+    return {
+        "meta": {
+            "time": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "transport": args.transport,
+            "tablets": args.tablets,
+            "point_rate": args.point_rate,
+            "mode": args.mode,
+            "mix": dict(zip(corpus.labels, corpus.weights)),
+            "clients": args.clients,
+            "binary_clients": binary_clients,
+            "connected_clients": audience,
+        },
+        "sent": {
+            "shapes": shapes,
+            "points": points,
+            "clears": sum(t.clears for t in tablets),
+            "seconds": sending,
+            "shapes_per_s": shapes / sending if sending else None,
+            "points_per_s_per_tablet": points / sending / args.tablets if sending else None,
+            "errors": {t.device_id: t.error for t in tablets if t.error},
+        },
+        "delivered": {
+            "deliveries": delivered,
+            "expected": shapes * audience,
+            "shapes_complete": sum(1 for key in receiver.sent if receiver.deliveries[key] >= audience),
+            "shapes_lost": sum(1 for key in receiver.sent if not receiver.deliveries[key]),
+            "unmatched": receiver.unmatched,
+            "messages": dict(receiver.received),
+        },
+        "first_point_to_ws": summarize(receiver.from_first, elapsed, delivered),
+        "end_shape_to_ws": summarize(receiver.from_end, elapsed, delivered),
+        "backend": {"broadcast": broadcast, "devices": devices},
+    }
+
+
+def report(results):
+    meta, sent, delivered = results["meta"], results["sent"], results["delivered"]
+    broadcast = results["backend"]["broadcast"]
+    log(f"{meta['tablets']} tablets x {meta['point_rate']:g} points/s, {meta['connected_clients']} /ws clients "
+        f"({meta['binary_clients']} binary), {meta['transport']} transport")
+    print(f"  sent        {sent['shapes']:,} shapes, {sent['clears']:,} clears in {sent['seconds']:.1f}s "
+          f"({sent['shapes_per_s'] or 0:.2f} shapes/s, {sent['points_per_s_per_tablet'] or 0:.1f} points/s per tablet)")
+    print(f"  delivered   {delivered['deliveries']:,} / {delivered['expected']:,} "
+          f"({delivered['deliveries'] / max(delivered['expected'], 1):.1%}), "
+          f"{results['end_shape_to_ws']['throughput_per_s'] or 0:,.1f}/s; "
+          f"{delivered['shapes_lost']} shapes never arrived")
+    print(f"  {'latency':<22}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, label in (("first_point_to_ws", "first point -> /ws"), ("end_shape_to_ws", "END_SHAPE -> /ws")):
+        lat = results[name]["latency_ms"]
+        if lat["p50"] is not None:
+            print(f"  {label:<22}{lat['p50']:>10.1f}{lat['p90']:>10.1f}{lat['p99']:>10.1f}{lat['max']:>10.1f}")
+    if broadcast:
+        print(f"  broadcaster published {broadcast.get('published', 0):,}, "
+              f"dropped {broadcast.get('dropped_total', 0):,}, evicted {broadcast.get('evicted', 0):,}")
+    for device_id, error in sent["errors"].items():
+        print(f"  ❌ {device_id}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=TRANSPORTS, default="pty" if os.name == "posix" else "inproc")
+    parser.add_argument("--tablets", type=int, default=4)
+    parser.add_argument("--point-rate", type=float, default=25.0, help="points/s per tablet (9600 baud ~ 25)")
+    parser.add_argument("--mix", default=None, help='label weights, e.g. "circle=2,square=1" (default: as recorded)')
+    parser.add_argument("--mode", choices=("replay", "perturb"), default="replay")
+    parser.add_argument("--jitter", type=float, default=1.5, help="perturb: per-point noise in pixels")
+    parser.add_argument("--pause", type=float, default=1.1, help="seconds between shapes (END_SHAPE debounce is 1 s)")
+    parser.add_argument("--clear-every", type=int, default=5, help="CLEARED after every N shapes (0 = never)")
+    parser.add_argument("--clients", type=int, default=100, help="concurrent /ws clients")
+    parser.add_argument("--binary-share", type=float, default=0.5, help="fraction of clients on the binary encoding")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of drawing")
+    parser.add_argument("--shapes", type=int, default=0, help="stop each tablet after N shapes (0 = --duration)")
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds to wait for the last broadcasts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shapes-dir", default=os.path.join(BACKEND_DIR, "shapes"))
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--server-log", default=None, help="backend output (default: discarded)")
+    parser.add_argument("--output", default=None, help="save the results as JSON")
+    args = parser.parse_args()
+    if args.transport == "pty" and os.name != "posix":
+        sys.exit("The pty transport needs a POSIX system; use --transport inproc")
+
+    with tempfile.TemporaryDirectory(prefix="sketch2form-load-") as workdir:
+        server_log = open(args.server_log or os.devnull, "a") if args.transport == "inproc" else None
+        # the in-process backend logs every shape; keep that out of the report
+        with contextlib.redirect_stdout(server_log) if server_log else contextlib.nullcontext():
+            results = asyncio.run(run(args, workdir))
+        if server_log:
+            server_log.close()
+    report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
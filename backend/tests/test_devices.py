@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import serial_listener
+from app.devices import DeviceManager
+from app.transport import ReplayTransport
+
+SHAPE = b'START_SHAPE\n{"x":1,"y":2,"t":3,"c":0}\n{"x":4,"y":5,"t":6,"c":0}\nEND_SHAPE\n'
+
+
+class UnpluggedTransport(ReplayTransport):
+    """Fails the way a vanished Windows COM port does."""
+
+    @property
+    def in_waiting(self):
+        raise RuntimeError("device unplugged")
+
+
+@pytest.fixture
+def shapes(monkeypatch):
+    received = []
+
+    async def process_shape(stroke, device_id=None, received_at=None):
+        received.append(device_id)
+
+    monkeypatch.setattr(serial_listener, "process_shape", process_shape)
+    monkeypatch.setattr(serial_listener.config, "LIVE_CLASSIFICATION", False)
+    return received
+
+
+def _run(transports, shapes):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    manager = DeviceManager(loop=loop, reconnect_interval=60, transports=transports)
+    manager.start()
+    try:
+        deadline = time.monotonic() + 5
+        while "good" not in shapes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return manager.thread.is_alive(), {dev["device"]: dev for dev in manager.stats()}
+    finally:
+        manager.stop()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def _good(tmp_path):
+    path = tmp_path / "good.txt"
+    path.write_bytes(SHAPE)
+    # the good tablet's shape only arrives after the other device has been read
+    return ReplayTransport(path, bytes_per_sec=len(SHAPE) * 4, timeout=0.01)
+
+
+def test_overflowing_point_does_not_stop_other_devices(tmp_path, shapes):
+    bad = tmp_path / "bad.txt"
+    bad.write_bytes(b'START_SHAPE\n{"x":99999999999999999999,"y":1,"t":1,"c":0}\nEND_SHAPE\n')
+    alive, stats = _run({"bad": ReplayTransport(bad, timeout=0.01), "good": _good(tmp_path)}, shapes)
+    assert alive and shapes == ["good"]
+    assert stats["bad"]["invalid"] == 1 and stats["bad"]["connected"]
+    assert stats["good"]["shapes"] == 1
+
+
+def test_failing_device_only_drops_itself(tmp_path, shapes):
+    bad = tmp_path / "bad.txt"
+    bad.write_bytes(SHAPE)
+    alive, stats = _run({"bad": UnpluggedTransport(bad, timeout=0.01), "good": _good(tmp_path)}, shapes)
+    assert alive and shapes == ["good"]
+    assert stats["bad"]["errors"] == 1 and not stats["bad"]["connected"]
+    assert stats["good"]["errors"] == 0 and stats["good"]["connected"]
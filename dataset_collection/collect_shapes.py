@@ -4,14 +4,21 @@ Collects raw shape data from Arduino and saves with manual labels.
 """
 
 import os
+import sys
 import json
 import serial
 import time
 from datetime import datetime
 
+# Reuse the backend's parser for the Arduino serial protocol
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.protocol import parse_line, POINT, START_SHAPE, END_SHAPE  # noqa: E402
+from app.transport import LineReader  # noqa: E402
+
 # Configuration
 SERIAL_PORT = "COM3"  # Change to your Arduino port
 BAUDRATE = 9600
+DEBUG_RAW = False  # Print every raw serial line (slow, for debugging only)
 RAW_DATA_DIR = "dataset_collection/raw_data"
 
 # Ensure directory exists
@@ -44,9 +51,9 @@ def get_shape_label():
         
         print("❌ Invalid choice. Please enter 1-4 or 'q' to quit.")
 
-def collect_shape_data(ser, label):
+def collect_shape_data(reader, label):
     """
-    Listen to serial port and collect one complete shape.
+    Listen to serial port (through a LineReader) and collect one complete shape.
     Returns the collected points as a list.
     """
     print("\n" + "="*50)
@@ -61,50 +68,49 @@ def collect_shape_data(ser, label):
     
     while True:
         try:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                # 🔍 DEBUG: Print EVERY line received
-                print(f"[RAW] {line}")
-                if not line:
+            # Blocks in bulk reads (up to the port timeout) instead of busy-polling in_waiting
+            raw = reader.readline()
+            if not raw:
+                continue
+            if DEBUG_RAW:
+                print(f"[RAW] {raw!r}")
+            kind, payload = parse_line(raw)
+
+            # If collecting, keep the parsed point
+            if kind == POINT:
+                if collecting:
+                    x, y, t, c = payload
+                    points.append({"x": x, "y": y, "t": t, "c": c})
+                    # Print progress every 10 points
+                    if len(points) % 10 == 0:
+                        print(f"  📍 Collected {len(points)} points...")
+                continue
+
+            # Check for start marker
+            if kind == START_SHAPE:
+                if collecting:
+                    print("⚠️  Warning: Received START_SHAPE while already collecting. Resetting.")
+                collecting = True
+                points = []
+                print("\n🟢 STARTSHAPE detected - collecting points...")
+                continue
+
+            # Check for end marker
+            if kind == END_SHAPE:
+                if not collecting:
+                    print("⚠️  Warning: Received ENDSHAPE without START_SHAPE. Ignoring.")
                     continue
-                
-                # Check for start marker
-                if line == "START_SHAPE":
-                    if collecting:
-                        print("⚠️  Warning: Received START_SHAPE while already collecting. Resetting.")
-                    collecting = True
-                    points = []
-                    print("\n🟢 STARTSHAPE detected - collecting points...")
+
+                if len(points) == 0:
+                    print("⚠️  Warning: No points collected. Try drawing again.")
+                    collecting = False
                     continue
-                
-                # Check for end marker
-                if line == "END_SHAPE":
-                    if not collecting:
-                        print("⚠️  Warning: Received ENDSHAPE without START_SHAPE. Ignoring.")
-                        continue
-                    
-                    if len(points) == 0:
-                        print("⚠️  Warning: No points collected. Try drawing again.")
-                        collecting = False
-                        continue
-                    
-                    print(f"🔴 ENDSHAPE detected - collected {len(points)} points")
-                    return points  # Successfully collected shape
-                
-                # If collecting, try to parse as JSON point
-                if collecting:
-                    try:
-                        point = json.loads(line)
-                        # Validate point has required fields
-                        if "x" in point and "y" in point and "t" in point:
-                            points.append(point)
-                            # Print progress every 10 points
-                            if len(points) % 10 == 0:
-                                print(f"  📍 Collected {len(points)} points...")
-                    except json.JSONDecodeError:
-                        # Ignore non-JSON lines during collection
-                        pass
-        
+
+                print(f"🔴 ENDSHAPE detected - collected {len(points)} points")
+                return points  # Successfully collected shape
+
+            # Anything else (CLEARED, noise) is ignored
+    
         except KeyboardInterrupt:
             print("\n\n⚠️  Collection interrupted by user.")
             return None
@@ -146,6 +152,7 @@ def main():
         # Connect to serial port
         print("\n🔌 Connecting to Arduino...")
         ser = serial.Serial(SERIAL_PORT, BAUDRATE, timeout=1)
+        reader = LineReader(ser)
         time.sleep(2)  # Wait for Arduino to initialize
         print("✅ Connected successfully!")
         
@@ -159,7 +166,7 @@ def main():
                 break
             
             # Step 2: Collect shape data from serial
-            points = collect_shape_data(ser, label)
+            points = collect_shape_data(reader, label)
             
             if points is None:
                 print("⚠️  Collection cancelled. Returning to label selection...\n")
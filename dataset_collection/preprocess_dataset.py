@@ -1,13 +1,40 @@
+"""
+Dataset preprocessing for Sketch2Form.
+
+Turns raw recordings into (N, SEQ_LEN, FEAT_DIM) training tensors, incrementally:
+every source file is parsed in a process pool once, and the manifest remembers
+it by path, mtime and size so later runs only process new or changed
+recordings. New rows are appended as additional shards, so nothing already
+processed is rewritten:
+
+    processed/manifest.json
+    processed/shards/shard_00000_X.npy   (rows, SEQ_LEN, FEAT_DIM) float32
+    processed/shards/shard_00000_y.npy   (rows,) int64
+
+Shards are plain .npy files, so training can np.load(..., mmap_mode='r') them
+(see load_shards / iter_batches) and stream datasets larger than RAM.
+shapes_X.npy / shapes_y.npy are still exported for the notebook.
+
+    python preprocess_dataset.py [--captures] [--min-confidence 0.9] [--workers 8] [--rebuild]
+
+--captures also ingests the backend's production captures (backend/shapes/*.json
+and the segment files), labelled by the deployed model rather than by hand.
+"""
 import os
 import json
+import argparse
 import numpy as np
 from glob import glob
+from concurrent.futures import ProcessPoolExecutor
 
 RAW_DATA_DIR = 'raw_data'
 PROCESSED_DIR = 'processed'
+CAPTURES_DIR = os.path.join('..', 'backend', 'shapes')
 LABELS = ['square', 'rectangle', 'triangle', 'circle']
 SEQ_LEN = 64
 FEAT_DIM = 5
+SHARD_ROWS = 50000  # rows per shard before a new one is started
+MANIFEST_VERSION = 1
 
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
@@ -35,30 +62,221 @@ def normalize_and_resample(points, seq_len=SEQ_LEN):
 
     return resampled.astype(np.float32)
 
-def process_all():
-    files = glob(os.path.join(RAW_DATA_DIR, '*.json'))
-    X = []
-    y = []
+# --- sources ---
+def source_files(raw_dir=RAW_DATA_DIR, captures_dir=None):
+    """(path, kind) for every recording: hand-labelled raw JSON, then optional captures."""
+    files = [(f, 'raw') for f in sorted(glob(os.path.join(raw_dir, '*.json')))]
+    if captures_dir:
+        files += [(f, 'capture') for f in sorted(glob(os.path.join(captures_dir, '*.json')))]
+        files += [(f, 'segment') for f in sorted(glob(os.path.join(captures_dir, 'segments', 'segment_*.jsonl')))]
+    return files
 
-    for f in files:
-        with open(f, 'r') as fp:
-            data = json.load(fp)
-        label = data['label'].lower()
-        if label not in LABELS:
+
+def _records(path, kind):
+    if kind != 'segment':
+        with open(path, 'r') as fp:
+            yield json.load(fp)
+        return
+    # backend write-behind segments: one record per line, points as [x, y, t, c] rows
+    with open(path, 'rb') as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line while the backend is writing
+            record['points'] = [{'x': x, 'y': y, 't': t, 'c': c} for x, y, t, c in record['points']]
+            yield record
+
+
+def process_file(job):
+    """Worker: all usable samples in one source file as (X, y) arrays."""
+    path, kind, min_confidence = job
+    X, y = [], []
+    for data in _records(path, kind):
+        label = (data.get('label') or '').lower()
+        if label not in LABELS or not data.get('points'):
+            continue
+        if kind != 'raw' and (data.get('confidence') or 0.0) < min_confidence:
             continue
-        label_idx = LABELS.index(label)
-        points = data['points']
-        arr = normalize_and_resample(points)
-        X.append(arr)
-        y.append(label_idx)
-
-    X = np.stack(X, axis=0) # shape (N, 64, 5)
-    y = np.array(y, dtype=np.int64) # shape (N,)
-    np.save(os.path.join(PROCESSED_DIR, 'shapes_X.npy'), X)
-    np.save(os.path.join(PROCESSED_DIR, 'shapes_y.npy'), y)
-    print(f'Dataset saved: {X.shape=} {y.shape=}')
-    for idx, lbl in enumerate(LABELS):
-        print(f'Class "{lbl}": {(y==idx).sum()} samples')
+        X.append(normalize_and_resample(data['points']))
+        y.append(LABELS.index(label))
+    if not X:
+        return np.empty((0, SEQ_LEN, FEAT_DIM), dtype=np.float32), np.empty(0, dtype=np.int64)
+    return np.stack(X, axis=0), np.array(y, dtype=np.int64)
+
+
+# --- manifest and shards ---
+def _manifest_path(processed_dir):
+    return os.path.join(processed_dir, 'manifest.json')
+
+
+def _shard_paths(processed_dir, name):
+    base = os.path.join(processed_dir, 'shards', name)
+    return base + '_X.npy', base + '_y.npy'
+
+
+def load_manifest(processed_dir=PROCESSED_DIR, min_confidence=None):
+    """The cache manifest; a changed ``min_confidence`` invalidates the capture and segment entries."""
+    try:
+        with open(_manifest_path(processed_dir), 'r') as fp:
+            manifest = json.load(fp)
+    except FileNotFoundError:
+        manifest = None
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION or \
+            manifest.get('seq_len') != SEQ_LEN or manifest.get('labels') != LABELS:
+        manifest = {'version': MANIFEST_VERSION, 'seq_len': SEQ_LEN, 'feat_dim': FEAT_DIM,
+                    'labels': LABELS, 'min_confidence': min_confidence, 'next_shard': 0, 'shards': {}, 'files': {}}
+    if min_confidence is not None and manifest.get('min_confidence') != min_confidence:
+        # which captures pass the filter changed: only hand-labelled raw rows are still valid
+        manifest['files'] = {path: entry for path, entry in manifest['files'].items() if entry['kind'] == 'raw'}
+        manifest['min_confidence'] = min_confidence
+    return manifest
+
+
+def save_manifest(manifest, processed_dir=PROCESSED_DIR):
+    tmp = _manifest_path(processed_dir) + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(manifest, fp, indent=1)
+    os.replace(tmp, _manifest_path(processed_dir))
+
+
+def _write_shard(manifest, processed_dir, pending):
+    """Save buffered (path, X, y) results as the next shard and point the manifest at it."""
+    name = f"shard_{manifest['next_shard']:05d}"
+    manifest['next_shard'] += 1
+    X = np.concatenate([x for _, x, _ in pending], axis=0)
+    y = np.concatenate([labels for _, _, labels in pending], axis=0)
+    x_path, y_path = _shard_paths(processed_dir, name)
+    np.save(x_path, X)
+    np.save(y_path, y)
+    manifest['shards'][name] = len(y)
+    row = 0
+    for path, x, _ in pending:
+        manifest['files'][path].update(shard=name, start=row, count=len(x))
+        row += len(x)
+
+
+def _live_rows(manifest):
+    """shard name -> sorted row indexes still owned by a current source file."""
+    live = {}
+    for entry in manifest['files'].values():
+        if entry.get('count'):
+            live.setdefault(entry['shard'], []).extend(range(entry['start'], entry['start'] + entry['count']))
+    return {name: np.array(sorted(rows), dtype=np.int64) for name, rows in live.items()}
+
+
+def load_shards(processed_dir=PROCESSED_DIR):
+    """[(X, y, rows)] per shard: memory-mapped arrays plus the indexes of their live rows."""
+    manifest = load_manifest(processed_dir)
+    shards = []
+    for name, rows in sorted(_live_rows(manifest).items()):
+        x_path, y_path = _shard_paths(processed_dir, name)
+        shards.append((np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r'), rows))
+    return shards
+
+
+def iter_batches(batch_size=256, processed_dir=PROCESSED_DIR, shuffle=False, seed=None):
+    """Stream (X, y) batches from the shards without loading the dataset into memory."""
+    rng = np.random.default_rng(seed)
+    shards = load_shards(processed_dir)
+    order = rng.permutation(len(shards)) if shuffle else range(len(shards))
+    for i in order:
+        X, y, rows = shards[i]
+        if shuffle:
+            rows = rng.permutation(rows)
+        for start in range(0, len(rows), batch_size):
+            idx = np.sort(rows[start:start + batch_size]) if shuffle else rows[start:start + batch_size]
+            yield np.asarray(X[idx]), np.asarray(y[idx])
+
+
+def export_arrays(processed_dir=PROCESSED_DIR):
+    """Write every live row to shapes_X.npy / shapes_y.npy (what the training notebook loads)."""
+    shards = load_shards(processed_dir)
+    total = sum(len(rows) for _, _, rows in shards)
+    X_out = np.lib.format.open_memmap(os.path.join(processed_dir, 'shapes_X.npy'), mode='w+',
+                                      dtype=np.float32, shape=(total, SEQ_LEN, FEAT_DIM))
+    y_out = np.empty(total, dtype=np.int64)
+    row = 0
+    for X, y, rows in shards:
+        X_out[row:row + len(rows)] = X[rows]
+        y_out[row:row + len(rows)] = y[rows]
+        row += len(rows)
+    X_out.flush()
+    del X_out
+    np.save(os.path.join(processed_dir, 'shapes_y.npy'), y_out)
+    return total, y_out
+
+
+def process_all(raw_dir=RAW_DATA_DIR, processed_dir=PROCESSED_DIR, captures_dir=None,
+                min_confidence=0.0, workers=None, rebuild=False, export=True):
+    os.makedirs(os.path.join(processed_dir, 'shards'), exist_ok=True)
+    manifest = load_manifest(processed_dir, min_confidence)
+    if rebuild:
+        manifest['files'] = {}
+
+    # only new or modified recordings are parsed again
+    current = {}
+    todo = []
+    for path, kind in source_files(raw_dir, captures_dir):
+        stat = os.stat(path)
+        current[path] = True
+        entry = manifest['files'].get(path)
+        if entry is None or entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+            manifest['files'][path] = {'kind': kind, 'mtime': stat.st_mtime, 'size': stat.st_size, 'count': 0}
+            todo.append((path, kind, min_confidence))
+    removed = [path for path in manifest['files'] if path not in current]
+    for path in removed:
+        del manifest['files'][path]
+    print(f'{len(current)} source files: {len(todo)} new or changed, {len(removed)} removed')
+
+    pending, buffered, added = [], 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (path, _, _), (X, y) in zip(todo, pool.map(process_file, todo, chunksize=16)):
+            if not len(y):
+                continue
+            pending.append((path, X, y))
+            buffered += len(y)
+            added += len(y)
+            if buffered >= SHARD_ROWS:
+                _write_shard(manifest, processed_dir, pending)
+                pending, buffered = [], 0
+    if pending:
+        _write_shard(manifest, processed_dir, pending)
+
+    # shards whose rows all belong to removed or re-processed files
+    live = _live_rows(manifest)
+    for name in [name for name in manifest['shards'] if name not in live]:
+        for path in _shard_paths(processed_dir, name):
+            if os.path.exists(path):
+                os.remove(path)
+        del manifest['shards'][name]
+    save_manifest(manifest, processed_dir)
+
+    total = sum(len(rows) for rows in live.values())
+    print(f'Added {added} samples; dataset has {total} samples in {len(live)} shard(s)')
+    if export:
+        total, y = export_arrays(processed_dir)
+        print(f'Dataset saved: X.shape={(total, SEQ_LEN, FEAT_DIM)} y.shape={y.shape}')
+        for idx, lbl in enumerate(LABELS):
+            print(f'Class "{lbl}": {(y==idx).sum()} samples')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocess recorded shapes into training shards.')
+    parser.add_argument('--raw-dir', default=RAW_DATA_DIR)
+    parser.add_argument('--processed-dir', default=PROCESSED_DIR)
+    parser.add_argument('--captures', nargs='?', const=CAPTURES_DIR, default=None,
+                        help=f'also ingest backend captures (default dir: {CAPTURES_DIR})')
+    parser.add_argument('--min-confidence', type=float, default=0.0,
+                        help='skip captures the model labelled with lower confidence')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rebuild', action='store_true', help='ignore the cache and reprocess everything')
+    parser.add_argument('--no-export', dest='export', action='store_false',
+                        help='skip writing shapes_X.npy / shapes_y.npy')
+    args = parser.parse_args()
+    process_all(args.raw_dir, args.processed_dir, args.captures, args.min_confidence,
+                args.workers, args.rebuild, args.export)
+
 
 if __name__ == '__main__':
-    process_all()
+    main()
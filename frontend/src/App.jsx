@@ -6,20 +6,34 @@ import { useWebSocket } from './hooks/useWebSocket';
 import './App.css';
 
 function App() {
-  const { isConnected, lastMessage } = useWebSocket('ws://localhost:8000/ws');
+  const { isConnected, lastMessage } = useWebSocket('ws://localhost:8000/ws', { format: 'binary' });
   const [currentShape, setCurrentShape] = useState(null);
 
+  const [partialShape, setPartialShape] = useState(null);
+
   // Update current shape when new message arrives
   useEffect(() => {
-    if (lastMessage && lastMessage.type === 'shape_result') {
+    if (!lastMessage) return;
+    if (lastMessage.type === 'shape_result') {
+      setPartialShape(null);
       setCurrentShape({
         label: lastMessage.label,
         confidence: lastMessage.confidence,
         points: lastMessage.points,
       });
+    } else if (lastMessage.type === 'shape_partial') {
+      // Provisional guess while the stroke is still being drawn
+      setPartialShape({
+        label: lastMessage.label,
+        confidence: lastMessage.confidence,
+      });
+    } else if (lastMessage.type === 'clear') {
+      setPartialShape(null);
     }
   }, [lastMessage]);
 
+  const shownShape = partialShape || currentShape;
+
   return (
     <div className="app">
       {/* Connection Status */}
@@ -27,12 +41,13 @@ function App() {
 
       {/* Shape Info Panel */}
       <ShapeInfo 
-        label={currentShape?.label} 
-        confidence={currentShape?.confidence} 
+        label={shownShape?.label} 
+        confidence={shownShape?.confidence} 
+        provisional={Boolean(partialShape)}
       />
 
       {/* 3D Canvas */}
-      <Canvas3D shapeData={currentShape} />
+      <Canvas3D shapeData={currentShape} provisionalShape={partialShape} />
 
       {/* Instructions */}
       <div className="instructions">
@@ -3,8 +3,11 @@ import { Canvas } from '@react-three/fiber';
 import { OrbitControls, Grid, Box, Sphere, Cone } from '@react-three/drei';
 import { shapeMapper, convertColor } from '../utils/shapeMapper';
 
+// Where the provisional (still being drawn) shape is previewed
+const PROVISIONAL_POSITION = [0, 2, 0];
+
 // Individual 3D Shape Component with animation
-const Shape3D = ({ shapeData, position }) => {
+const Shape3D = ({ shapeData, position, provisional = false }) => {
   const meshRef = useRef();
   const [scale, setScale] = useState(0);
 
@@ -37,22 +40,26 @@ const Shape3D = ({ shapeData, position }) => {
 
   const { type, args } = shapeMapper[shapeData.label] || shapeMapper.circle;
   const color = shapeData.color || '#00bfff';
+  // Provisional guesses are drawn as a translucent wireframe until DONE
+  const material = provisional
+    ? { color, wireframe: true, transparent: true, opacity: 0.35 + 0.5 * (shapeData.confidence || 0) }
+    : { color, metalness: 0.3, roughness: 0.4 };
 
   return (
     <group position={position} scale={[scale, scale, scale]}>
       {type === 'box' && (
         <Box ref={meshRef} args={args}>
-          <meshStandardMaterial color={color} metalness={0.3} roughness={0.4} />
+          <meshStandardMaterial {...material} />
         </Box>
       )}
       {type === 'sphere' && (
         <Sphere ref={meshRef} args={args}>
-          <meshStandardMaterial color={color} metalness={0.3} roughness={0.4} />
+          <meshStandardMaterial {...material} />
         </Sphere>
       )}
       {type === 'cone' && (
         <Cone ref={meshRef} args={args}>
-          <meshStandardMaterial color={color} metalness={0.3} roughness={0.4} />
+          <meshStandardMaterial {...material} />
         </Cone>
       )}
     </group>
@@ -60,7 +67,8 @@ const Shape3D = ({ shapeData, position }) => {
 };
 
 // Main Canvas Component
-export const Canvas3D = ({ shapeData }) => {
+// provisionalShape: live { label, confidence } guess from shape_partial messages
+export const Canvas3D = ({ shapeData, provisionalShape }) => {
   const [shapes, setShapes] = useState([]);
 
   // Add new shape when data arrives - SINGLE useEffect
@@ -129,6 +137,16 @@ export const Canvas3D = ({ shapeData }) => {
         <Shape3D key={shape.id} shapeData={shape} position={shape.position} />
       ))}
 
+      {/* Provisional shape: keyed by label, so it re-spawns (morphs) whenever the guess changes */}
+      {provisionalShape?.label && (
+        <Shape3D
+          key={`provisional-${provisionalShape.label}`}
+          shapeData={provisionalShape}
+          position={PROVISIONAL_POSITION}
+          provisional
+        />
+      )}
+
       {/* Camera Controls */}
       <OrbitControls
         enablePan={true}
@@ -1,6 +1,6 @@
 import React from 'react';
 
-export const ShapeInfo = ({ label, confidence }) => {
+export const ShapeInfo = ({ label, confidence, provisional = false }) => {
   if (!label) return null;
 
   return (
@@ -10,7 +10,7 @@ export const ShapeInfo = ({ label, confidence }) => {
       left: '20px',
       padding: '15px 20px',
       background: 'rgba(0, 0, 0, 0.7)',
-      border: '2px solid #00bfff',
+      border: provisional ? '2px dashed #ffaa00' : '2px solid #00bfff',
       borderRadius: '8px',
       color: '#fff',
       fontFamily: 'monospace',
@@ -18,8 +18,8 @@ export const ShapeInfo = ({ label, confidence }) => {
       zIndex: 1000,
       minWidth: '200px',
     }}>
-      <div style={{ marginBottom: '10px', color: '#00bfff', fontSize: '12px' }}>
-        DETECTED SHAPE
+      <div style={{ marginBottom: '10px', color: provisional ? '#ffaa00' : '#00bfff', fontSize: '12px' }}>
+        {provisional ? 'DRAWING…' : 'DETECTED SHAPE'}
       </div>
       <div style={{ fontSize: '18px', fontWeight: 'bold', marginBottom: '8px' }}>
         {label.toUpperCase()}
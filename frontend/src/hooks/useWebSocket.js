@@ -1,45 +1,141 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 
-export const useWebSocket = (url) => {
+// Subprotocols understood by the backend's /ws endpoint
+const BINARY_PROTOCOL = 'sketch2form.binary';
+const JSON_PROTOCOL = 'sketch2form.json';
+const SHAPE_RESULT = 1;
+
+// Inverse of backend/app/utils/wire.py: varints, zigzag deltas, colour runs
+export const decodeBinaryMessage = (buffer) => {
+  const bytes = new Uint8Array(buffer);
+  const view = new DataView(buffer);
+  let pos = 0;
+
+  const uvarint = () => {
+    let result = 0;
+    let scale = 1;
+    let byte;
+    do {
+      byte = bytes[pos++];
+      result += (byte & 0x7f) * scale; // arithmetic, not bit ops: values can exceed 32 bits
+      scale *= 128;
+    } while (byte & 0x80);
+    return result;
+  };
+  const svarint = () => {
+    const n = uvarint();
+    return n % 2 ? -(n + 1) / 2 : n / 2;
+  };
+  const text = (length) => {
+    const value = new TextDecoder().decode(bytes.subarray(pos, pos + length));
+    pos += length;
+    return value;
+  };
+
+  const kind = bytes[pos++];
+  if (kind !== SHAPE_RESULT) {
+    throw new Error(`Unknown binary message kind ${kind}`);
+  }
+  const seq = uvarint() || null;
+  const id = uvarint();
+  const confidence = view.getFloat32(pos, true);
+  pos += 4;
+  const label = text(uvarint());
+  const deviceLength = uvarint();
+  const device = deviceLength ? text(deviceLength - 1) : null;
+
+  const count = uvarint();
+  const points = new Array(count);
+  let x = 0;
+  let y = 0;
+  let t = 0;
+  for (let i = 0; i < count; i++) {
+    x += svarint();
+    y += svarint();
+    t += svarint();
+    points[i] = { x, y, t, c: 0 };
+  }
+  const runs = uvarint();
+  for (let run = 0, i = 0; run < runs; run++) {
+    const length = uvarint();
+    const c = svarint();
+    for (const end = i + length; i < end; i++) {
+      points[i].c = c;
+    }
+  }
+  return { type: 'shape_result', seq, id, label, confidence, device, points };
+};
+
+// format: 'json' (default) or 'binary' (compact shape_result frames).
+// Reconnects on its own and resumes from the last seq it saw, so shapes drawn
+// while disconnected are replayed once and never twice.
+export const useWebSocket = (url, { format = 'json', reconnectDelay = 1000 } = {}) => {
   const [isConnected, setIsConnected] = useState(false);
   const [lastMessage, setLastMessage] = useState(null);
   const ws = useRef(null);
+  const lastSeq = useRef(null);
 
   useEffect(() => {
-    // Create WebSocket connection
-    ws.current = new WebSocket(url);
+    let stopped = false;
+    let retry = null;
 
-    ws.current.onopen = () => {
-      console.log('✅ WebSocket connected');
-      setIsConnected(true);
-    };
+    const connect = () => {
+      // Create WebSocket connection, resuming after the last event we saw
+      const since = lastSeq.current;
+      const target = since === null ? url : `${url}${url.includes('?') ? '&' : '?'}since=${since}`;
+      const socket = new WebSocket(target, format === 'binary' ? [BINARY_PROTOCOL] : [JSON_PROTOCOL]);
+      socket.binaryType = 'arraybuffer';
+      ws.current = socket;
 
-    ws.current.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data);
-        console.log('📩 Received:', data);
-        setLastMessage(data);
-      } catch (error) {
-        console.error('Failed to parse message:', error);
-      }
-    };
+      socket.onopen = () => {
+        console.log(`✅ WebSocket connected (${socket.protocol || 'json'})`);
+        setIsConnected(true);
+      };
 
-    ws.current.onerror = (error) => {
-      console.error('❌ WebSocket error:', error);
-    };
+      socket.onmessage = (event) => {
+        try {
+          // binary clients still receive small messages (clear, shape_partial) as JSON text
+          const data = typeof event.data === 'string'
+            ? JSON.parse(event.data)
+            : decodeBinaryMessage(event.data);
+          if (data.type === 'snapshot') {
+            // a gap we cannot fill: start over from the snapshot that follows
+            if (!data.complete) lastSeq.current = null;
+            return;
+          }
+          if (data.seq != null) {
+            if (lastSeq.current !== null && data.seq <= lastSeq.current) return;
+            lastSeq.current = data.seq;
+          }
+          console.log('📩 Received:', data);
+          setLastMessage(data);
+        } catch (error) {
+          console.error('Failed to parse message:', error);
+        }
+      };
+
+      socket.onerror = (error) => {
+        console.error('❌ WebSocket error:', error);
+      };
 
-    ws.current.onclose = () => {
-      console.log('🔌 WebSocket disconnected');
-      setIsConnected(false);
+      socket.onclose = () => {
+        console.log('🔌 WebSocket disconnected');
+        setIsConnected(false);
+        if (!stopped) retry = setTimeout(connect, reconnectDelay);
+      };
     };
 
+    connect();
+
     // Cleanup on unmount
     return () => {
+      stopped = true;
+      clearTimeout(retry);
       if (ws.current) {
         ws.current.close();
       }
     };
-  }, [url]);
+  }, [url, format, reconnectDelay]);
 
   const sendMessage = useCallback((message) => {
     if (ws.current && ws.current.readyState === WebSocket.OPEN) {
@@ -0,0 +1,135 @@
+"""
+Export the shape classifier as float and quantized TFLite variants.
+
+The notebook only converts the float model. This script converts the same
+Keras model into every variant the backend can run:
+
+    float     plain conversion, what the notebook ships
+    dynamic   dynamic-range quantization: int8 weights, float activations
+    float16   float16 weights, float32 inputs and outputs
+    int8      full-integer: int8 weights, activations, inputs and outputs,
+              calibrated on training rows of the processed shapes_X.npy
+
+Each variant is written as shape_classifier_<variant>.tflite with a JSON
+sidecar (labels, seq_len, feat_dim, variant) into backend/app/ml, where the
+model registry picks them up (POST /admin/models/load). The backend quantizes
+inputs and dequantizes outputs using each model's scale and zero point, so the
+variants are drop-in. Compare them with
+`cd backend && python -m benchmarks.eval_quantized`.
+
+    python export_tflite.py --keras shape_classifier_model.h5
+    python export_tflite.py --train                  # retrain as the notebook does first
+    python export_tflite.py --keras shape_classifier_model.h5 --variants int8 float16
+
+Needs tensorflow and scikit-learn (as the notebook does).
+"""
+import os
+import json
+import argparse
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROCESSED_DIR = os.path.join(HERE, '..', 'dataset_collection', 'processed')
+OUT_DIR = os.path.join(HERE, '..', 'backend', 'app', 'ml')
+LABELS = ['square', 'rectangle', 'triangle', 'circle']
+VARIANTS = ('float', 'dynamic', 'float16', 'int8')
+
+
+def load_dataset(processed_dir=PROCESSED_DIR):
+    X = np.load(os.path.join(processed_dir, 'shapes_X.npy')).astype(np.float32)
+    y = np.load(os.path.join(processed_dir, 'shapes_y.npy'))
+    return X, y
+
+
+def split(X, y):
+    """The notebook's train/test split, so the held-out rows stay held out."""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+
+def build_model(input_shape, num_classes):
+    from tensorflow.keras import layers, models
+    return models.Sequential([
+        layers.Conv1D(64, kernel_size=3, activation='relu', input_shape=input_shape),
+        layers.MaxPooling1D(pool_size=2),
+        layers.Conv1D(128, kernel_size=3, activation='relu'),
+        layers.MaxPooling1D(pool_size=2),
+        layers.Flatten(),
+        layers.Dense(128, activation='relu'),
+        layers.Dropout(0.5),
+        layers.Dense(num_classes, activation='softmax')
+    ])
+
+
+def train(X_train, y_train, epochs=51):
+    model = build_model(X_train.shape[1:], len(LABELS))
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    model.fit(X_train, y_train, epochs=epochs, batch_size=16, validation_split=0.1)
+    return model
+
+
+def representative_dataset(X, samples=200, seed=0):
+    """Calibration rows for full-integer quantization, one (1, seq_len, feat_dim) batch at a time."""
+    rows = np.random.default_rng(seed).permutation(len(X))[:samples]
+
+    def generate():
+        for i in rows:
+            yield [X[i:i + 1]]
+    return generate
+
+
+def convert(model, variant, X_calibration=None, samples=200):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant != 'float':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'int8':
+        converter.representative_dataset = representative_dataset(X_calibration, samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export float and quantized TFLite variants of the shape classifier.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--keras', help='trained Keras model (the notebook saves shape_classifier_model.h5)')
+    source.add_argument('--train', action='store_true', help='train the notebook model on shapes_X.npy first')
+    parser.add_argument('--epochs', type=int, default=51)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--processed-dir', default=PROCESSED_DIR)
+    parser.add_argument('--out-dir', default=OUT_DIR)
+    parser.add_argument('--prefix', default='shape_classifier')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.processed_dir)
+    X_train, X_test, y_train, y_test = split(X, y)
+    print(f"Dataset: {X.shape} | train {len(X_train)} | held out {len(X_test)}")
+
+    if args.train:
+        model = train(X_train, y_train, args.epochs)
+        keras_path = os.path.join(HERE, 'shape_classifier_model.h5')
+        model.save(keras_path)
+        print(f"✅ Keras model saved: {keras_path}")
+    else:
+        import tensorflow as tf
+        model = tf.keras.models.load_model(args.keras)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for variant in args.variants:
+        tflite_model = convert(model, variant, X_train, args.calibration_samples)
+        path = os.path.join(args.out_dir, f"{args.prefix}_{variant}.tflite")
+        with open(path, 'wb') as f:
+            f.write(tflite_model)
+        with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+            json.dump({'labels': LABELS, 'seq_len': int(X.shape[1]), 'feat_dim': int(X.shape[2]),
+                       'variant': variant}, f, indent=2)
+        print(f"✅ {variant:<8} {path} ({len(tflite_model) / 1024:.2f} KB)")
+
+
+if __name__ == '__main__':
+    main()